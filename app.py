@@ -2,13 +2,24 @@
 # --- 最終、完整、可運行的整合版 app.py ---
 # --- v2: 已將 query.get() 更新為 db.session.get() ---
 # ----------------------------------------------------------------
-from flask import Flask, jsonify, render_template, request, redirect, url_for
+from flask import Flask, jsonify, render_template, request, redirect, url_for, g, has_request_context
 from flask_cors import CORS
-from flask_socketio import SocketIO
-from werkzeug.utils import secure_filename
+from flask_socketio import SocketIO, join_room
+from werkzeug.utils import secure_filename, send_from_directory
+from werkzeug.security import safe_join
+from werkzeug.http import parse_content_range_header
+from werkzeug.exceptions import NotFound
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event, insert, update, bindparam
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload, load_only, selectinload
 from flask_migrate import Migrate
+from eventlet import tpool, GreenPool
+from eventlet.event import Event
+from socketio_broker import BrokerManager
+from metrics import Registry, DEFAULT_SIZE_BUCKETS, CONTENT_TYPE as METRICS_CONTENT_TYPE
 from functools import wraps
 import jwt
 import datetime
@@ -16,22 +27,301 @@ import os
 import json
 import uuid
 import stat
+import mimetypes
+import hashlib
+import hmac
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import base64
+import threading
+import time
+import re
+import bisect
+from collections import Counter, OrderedDict, namedtuple
+from zoneinfo import ZoneInfo
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # 未安裝 Pillow 時不產生尺寸版本，展示頁沿用原始檔案
+    Image = None
 
 # --- 應用程式與資料庫設定 ---
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'your-very-secret-and-secure-key-that-no-one-knows'
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///mq_cms.db'
+# 多節點部署時所有工作程序必須指向同一個資料庫
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///mq_cms.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
+def _engine_options(database_uri):
+    """eventlet 未 monkey patch，連線池等待空閒連線時會以真正的鎖阻塞整個事件迴圈；
+    持有連線的 greenlet 可能正在讓出 (例如等待執行緒池)，因此池不設上限，永遠不等待。
+    記憶體中的 SQLite 使用 StaticPool (單一連線)，不接受連線池大小參數。
+    """
+    url = make_url(database_uri)
+    if url.get_backend_name() == 'sqlite' and (url.database in (None, '', ':memory:') or url.query.get('mode') == 'memory'):
+        return {}
+    return {'pool_size': 10, 'max_overflow': -1}
+
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = _engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
+# 廣播合併：安靜期內的連續變更合併成一次通知，但從第一筆變更起最多延遲 BROADCAST_MAX_LATENCY 秒
+app.config['BROADCAST_QUIET_WINDOW'] = 0.25
+app.config['BROADCAST_MAX_LATENCY'] = 1.0
+
 db = SQLAlchemy(app)
 migrate = Migrate(app, db)
+
+# SQLite 正式環境設定：WAL 讓讀取不阻塞寫入，busy_timeout 讓寫入衝突時等待而非立即回報 database is locked。
+# 每個新連線都會套用；設為空 dict 則沿用 SQLite 預設值。
+SQLITE_PRODUCTION_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'busy_timeout': 5000,  # 毫秒
+    'synchronous': 'NORMAL',  # WAL 模式下只在檢查點同步，斷電最多遺失最後幾筆交易，不會損毀資料庫
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64000,  # 負值單位為 KiB，約 64 MB
+    'temp_store': 'MEMORY'
+}
+app.config['SQLITE_PRAGMAS'] = SQLITE_PRODUCTION_PRAGMAS
+
+def apply_sqlite_pragmas(dbapi_connection, pragmas):
+    """在 DB-API 連線上執行 PRAGMA 設定"""
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+    finally:
+        cursor.close()
+
+def _on_sqlite_connect(dbapi_connection, connection_record):
+    apply_sqlite_pragmas(dbapi_connection, app.config['SQLITE_PRAGMAS'] or {})
+
+with app.app_context():
+    if db.engine.dialect.name == 'sqlite':
+        event.listen(db.engine, 'connect', _on_sqlite_connect)
 CORS(app)
-socketio = SocketIO(app, async_mode='eventlet', cors_allowed_origins="*")
+
+# 多節點部署：設定訊息佇列後，任一工作程序的 socketio.emit 都會經由佇列送到所有節點上的展示頁。
+#   redis://host:6379/0  使用 Redis (需安裝 redis 套件，且 eventlet 必須 monkey patch socket，例如 gunicorn -k eventlet)
+#   broker://host:port   使用 socketio_broker.py 的本機訊息代理 (開發與測試用，不需 monkey patch)
+SOCKETIO_MESSAGE_QUEUE = os.environ.get('SOCKETIO_MESSAGE_QUEUE')
+SOCKETIO_CHANNEL = 'mq-cms'
+
+def _socketio_queue_options(url):
+    if not url:
+        return {}
+    if url.startswith('broker://'):
+        return {'client_manager': BrokerManager(url, channel=SOCKETIO_CHANNEL)}
+    return {'message_queue': url, 'channel': SOCKETIO_CHANNEL}
+
+socketio = SocketIO(app, async_mode='eventlet', cors_allowed_origins="*", **_socketio_queue_options(SOCKETIO_MESSAGE_QUEUE))
+# 多個節點共用內容版本 (存於 cache_version 資料表)，讓各節點的快照、ETag 與增量更新的版本一致
+app.config['CONTENT_VERSION_SHARED'] = bool(SOCKETIO_MESSAGE_QUEUE)
+app.config['CONTENT_VERSION_CHECK_INTERVAL'] = 1.0
+
+# --- 效能指標 ---
+# /metrics 以 Prometheus 文字格式輸出；數值由每個工作程序各自累計，多程序部署時需分別抓取。
+# 設定 METRICS_TOKEN 後必須以 Authorization: Bearer <token> 存取。
+app.config['METRICS_ENABLED'] = os.environ.get('METRICS_ENABLED', '1') != '0'
+app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN')
+# 慢查詢記錄：執行超過此秒數的 SQL 語句連同參數與查詢計畫印出；設為 None 關閉
+app.config['SLOW_QUERY_THRESHOLD'] = float(os.environ.get('SLOW_QUERY_THRESHOLD', '0.1'))
+# 回應附加 X-Query-Count 與 Server-Timing 標頭，方便在瀏覽器開發者工具找出查詢過多的頁面；除錯模式下一律開啟
+app.config['SQL_PROFILE_HEADERS'] = False
+
+metrics_registry = Registry()
+REQUEST_DURATION = metrics_registry.histogram(
+    'mqcms_http_request_duration_seconds', 'HTTP 請求處理時間', ['method', 'route', 'status'])
+RESPONSE_SIZE = metrics_registry.histogram(
+    'mqcms_http_response_size_bytes', 'HTTP 回應大小', ['route'], buckets=DEFAULT_SIZE_BUCKETS)
+REQUEST_STATEMENTS = metrics_registry.histogram(
+    'mqcms_db_statements_per_request', '每個 HTTP 請求執行的 SQL 語句數', ['route'],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89, 144))
+REQUEST_DB_TIME = metrics_registry.histogram(
+    'mqcms_db_time_per_request_seconds', '每個 HTTP 請求花在 SQL 語句的時間', ['route'])
+STATEMENT_DURATION = metrics_registry.histogram(
+    'mqcms_db_statement_duration_seconds', '單一 SQL 語句的執行時間，依來源路由與語句種類區分', ['route', 'operation'])
+SOCKETIO_CONNECTIONS = metrics_registry.gauge(
+    'mqcms_socketio_connections', '目前的 Socket.IO 連線數')
+SOCKETIO_EMITS = metrics_registry.counter(
+    'mqcms_socketio_emits_total', '送出的 Socket.IO 事件數', ['event'])
+SOCKETIO_EMIT_DURATION = metrics_registry.histogram(
+    'mqcms_socketio_emit_duration_seconds', '送出 Socket.IO 事件 (分送到房間或訊息佇列) 的時間', ['event'])
+UPLOAD_BYTES = metrics_registry.counter(
+    'mqcms_upload_bytes_total', '成功接收的上傳位元組數', ['kind'])
+UPLOAD_DURATION = metrics_registry.histogram(
+    'mqcms_upload_duration_seconds', '上傳請求的處理時間；吞吐量為 bytes_total / duration_sum', ['kind'])
+SNAPSHOT_REQUESTS = metrics_registry.counter(
+    'mqcms_snapshot_cache_requests_total', '播放清單快照快取的查詢次數', ['key', 'result'])
+SNAPSHOT_BUILD = metrics_registry.histogram(
+    'mqcms_snapshot_build_seconds', '快照重建時間，分為查詢組裝 (build) 與序列化 (serialize)', ['key', 'phase'])
+
+# 上傳端點與其指標類別；以請求本文大小計算，不需要在各路由內另外記錄
+UPLOAD_ENDPOINT_KINDS = {
+    'upload_material': 'material',
+    'upload_group_images': 'group',
+    'upload_images_to_group_legacy': 'group',
+    'upload_session_chunk': 'resumable'
+}
+UNMATCHED_ROUTE = '<unmatched>'
+BACKGROUND_ROUTE = '<background>'  # 排程器、廣播合併器等不在請求內執行的查詢
+
+def _metrics_route():
+    """以路由樣板 (例如 /api/groups/<group_id>) 作為標籤，避免每個 id 各自成為一組時間序列"""
+    if not has_request_context():
+        return BACKGROUND_ROUTE
+    return request.url_rule.rule if request.url_rule is not None else UNMATCHED_ROUTE
+
+def _explain_statement(conn, statement, parameters):
+    """以獨立的 DB-API cursor 取得查詢計畫，不會再觸發引擎事件；SQLite 只取計畫說明欄位"""
+    sqlite = conn.dialect.name == 'sqlite'
+    cursor = conn.connection.cursor()
+    try:
+        cursor.execute(('EXPLAIN QUERY PLAN ' if sqlite else 'EXPLAIN ') + statement, parameters)
+        return [str(row[3]) if sqlite else ' | '.join(str(value) for value in row) for row in cursor.fetchall()]
+    finally:
+        cursor.close()
+
+def _log_slow_query(conn, statement, parameters, executemany, elapsed, route):
+    print(f"慢查詢 {elapsed * 1000:.1f}ms [{route}]: {statement}")
+    print(f"  參數: {parameters!r}")
+    if executemany:
+        # 批次執行的語句相同，以第一組參數取得查詢計畫
+        parameters = parameters[0] if parameters else ()
+    try:
+        for line in _explain_statement(conn, statement, parameters):
+            print(f"  查詢計畫: {line}")
+    except Exception as e:
+        print(f"  無法取得查詢計畫: {e}")
+
+# 開始時間存在每個語句各自的執行內容 (context) 上；執行失敗的語句不會觸發 after_cursor_execute，
+# 若存在連線上會殘留在連線池中，讓之後的語句取到錯誤的開始時間
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._query_started = time.perf_counter()
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, '_query_started', None)
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else 'OTHER'
+    route = _metrics_route()
+    STATEMENT_DURATION.observe(elapsed, route=route, operation=operation)
+    sql_stats = g.get('sql_stats') if has_request_context() else None
+    if sql_stats is not None:
+        sql_stats['count'] += 1
+        sql_stats['duration'] += elapsed
+    threshold = app.config['SLOW_QUERY_THRESHOLD']
+    if threshold is not None and elapsed >= threshold and operation != 'EXPLAIN':
+        _log_slow_query(conn, statement, parameters, executemany, elapsed, route)
+
+with app.app_context():
+    event.listen(db.engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(db.engine, 'after_cursor_execute', _after_cursor_execute)
+
+@app.before_request
+def _start_request_metrics():
+    g.request_started = time.perf_counter()
+    g.sql_stats = {'count': 0, 'duration': 0.0}
+
+@app.after_request
+def _record_request_metrics(response):
+    started = g.get('request_started')
+    if started is None:
+        return response
+    elapsed = time.perf_counter() - started
+    route = _metrics_route()
+    REQUEST_DURATION.observe(elapsed, method=request.method, route=route, status=response.status_code)
+    if response.content_length is not None:
+        RESPONSE_SIZE.observe(response.content_length, route=route)
+    REQUEST_STATEMENTS.observe(g.sql_stats['count'], route=route)
+    REQUEST_DB_TIME.observe(g.sql_stats['duration'], route=route)
+
+    kind = UPLOAD_ENDPOINT_KINDS.get(request.endpoint)
+    if kind and response.status_code < 400 and request.content_length:
+        UPLOAD_BYTES.inc(request.content_length, kind=kind)
+        UPLOAD_DURATION.observe(elapsed, kind=kind)
+
+    if app.debug or app.config['SQL_PROFILE_HEADERS']:
+        sql_stats = g.sql_stats
+        response.headers['X-Query-Count'] = str(sql_stats['count'])
+        response.headers['Server-Timing'] = (
+            f'db;dur={sql_stats["duration"] * 1000:.1f};desc="{sql_stats["count"]} queries", '
+            f'app;dur={elapsed * 1000:.1f}')
+    return response
+
+def emit_event(event_name, data, to):
+    """送出 Socket.IO 事件並記錄次數與分送時間；所有伺服器端的廣播都應經由此函式"""
+    started = time.perf_counter()
+    socketio.emit(event_name, data, to=to)
+    SOCKETIO_EMITS.inc(event=event_name)
+    SOCKETIO_EMIT_DURATION.observe(time.perf_counter() - started, event=event_name)
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Prometheus 抓取端點"""
+    if not app.config['METRICS_ENABLED']:
+        raise NotFound()
+    token = app.config['METRICS_TOKEN']
+    if token:
+        auth_header = request.headers.get('Authorization', '')
+        if not hmac.compare_digest(auth_header.encode('utf-8'), f'Bearer {token}'.encode('utf-8')):
+            return jsonify({'success': False, 'message': '缺少或無效的指標存取權杖'}), 401
+    return app.response_class(metrics_registry.render(), mimetype=None,
+                              headers={'Content-Type': METRICS_CONTENT_TYPE, 'Cache-Control': 'no-store'})
 
 # --- 常數設定 ---
 UPLOAD_FOLDER = 'static/uploads'
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'mp4', 'mov', 'avi'}
+IMAGE_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
+
+# 可續傳上傳：暫存檔放在 instance 目錄下，不會被靜態路由公開
+app.config['UPLOAD_SESSION_FOLDER'] = os.path.join(app.instance_path, 'upload_sessions')
+app.config['UPLOAD_SESSION_TTL'] = 24 * 60 * 60  # 未完成的上傳保留秒數
+app.config['MAX_RESUMABLE_UPLOAD_SIZE'] = 8 * 1024 * 1024 * 1024
+UPLOAD_STREAM_CHUNK_SIZE = 1024 * 1024
+# 群組圖片批次上傳：同時寫入與雜湊的檔案數、單張圖片的大小上限
+app.config['GROUP_UPLOAD_CONCURRENCY'] = 4
+app.config['MAX_GROUP_IMAGE_SIZE'] = 50 * 1024 * 1024
+
+# 展示頁各區塊的版面尺寸 (以 1080px 寬的設計稿為準，見 display.css)
+RENDITION_PROFILES = {
+    'header': (1080, 620),
+    'carousel': (540, 554),
+    'footer': (1080, 192)
+}
+SECTION_RENDITION_PROFILES = {
+    'header_video': 'header',
+    'carousel_top_left': 'carousel',
+    'carousel_top_right': 'carousel',
+    'carousel_bottom_left': 'carousel',
+    'carousel_bottom_right': 'carousel',
+    'footer_content': 'footer'
+}
+RENDITION_EXTENSIONS = {'png', 'jpg', 'jpeg'}  # GIF 可能是動畫，保留原檔
+app.config['RENDITION_FORMAT'] = 'webp'  # 'webp' 或 'jpeg'
+app.config['RENDITION_QUALITY'] = 82
+app.config['RENDITION_WORKERS'] = 2  # 0 表示在請求中同步產生 (測試用)
+
+# 上傳檔案的檔名在寫入後不再改變 (內容雜湊或 UUID)，可讓播放器永久快取
+app.config['MEDIA_CACHE_MAX_AGE'] = 365 * 24 * 60 * 60
+# 交給前端代理傳送檔案：None (由應用程式傳送)、'x-sendfile' (Apache/lighttpd) 或 'x-accel-redirect' (nginx)
+app.config['MEDIA_SENDFILE'] = None
+app.config['MEDIA_ACCEL_REDIRECT_PREFIX'] = '/_protected_uploads/'
+
+# 已驗證 token 的快取：其他工作程序最多在 AUTH_CACHE_VERSION_CHECK_INTERVAL 秒後得知使用者變更
+app.config['AUTH_CACHE_MAX_ENTRIES'] = 1024
+app.config['AUTH_CACHE_TTL'] = 300
+app.config['AUTH_CACHE_VERSION_CHECK_INTERVAL'] = 2.0
+
+# 密碼雜湊、檔案雜湊與圖片處理改在 eventlet 執行緒池中執行 (池大小由環境變數 EVENTLET_THREADPOOL_SIZE 設定)
+app.config['CPU_OFFLOAD'] = True
+
+# 排程播放：每日時段與星期依 SCHEDULE_TIMEZONE (IANA 時區名稱，例如 'Asia/Taipei') 解讀，None 使用伺服器本地時區
+app.config['SCHEDULE_TIMEZONE'] = os.environ.get('SCHEDULE_TIMEZONE')
+app.config['SCHEDULE_HORIZON_DAYS'] = 8  # 時間軸索引預先展開的天數，到期時自動重建
+# 排程器在時段邊界主動推送內容切換；多節點部署時只需在一個節點啟用
+app.config['SCHEDULER_ENABLED'] = os.environ.get('SCHEDULER_ENABLED', '1') != '0'
+app.config['SCHEDULER_MAX_SLEEP'] = 300  # 秒；即使沒有收到喚醒也定期重新檢查
 
 
 AVAILABLE_SECTIONS = {
@@ -66,6 +356,11 @@ class GroupImageAssociation(db.Model):
     group_id = db.Column(db.String(36), db.ForeignKey('carousel_group.id'), primary_key=True)
     material_id = db.Column(db.String(36), db.ForeignKey('material.id'), primary_key=True)
     order = db.Column(db.Integer, nullable=False)
+    __table_args__ = (
+        # 依順序載入群組圖片與查詢 max(order)；主鍵以 group_id 開頭，無法支援依 material_id 的級聯查詢
+        db.Index('ix_group_image_association_group_id_order', 'group_id', 'order'),
+        db.Index('ix_group_image_association_material_id', 'material_id'),
+    )
 
     material = db.relationship("Material", back_populates="group_associations")
     group = db.relationship("CarouselGroup", back_populates="image_associations")
@@ -79,16 +374,57 @@ class Setting(db.Model):
     def __repr__(self):
         return f'<Setting {self.key}={self.value}>'
 
+class CacheVersion(db.Model):
+    """跨工作程序共用的快取版本號。資料變更時遞增，各程序定期比對，不同時清空自己的快取"""
+    __tablename__ = 'cache_version'
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<CacheVersion {self.name}={self.version}>'
+
+class MediaBlob(db.Model):
+    """以 SHA-256 內容雜湊定址的實體檔案，內容相同的多筆素材共用同一個檔案"""
+    __tablename__ = 'media_blob'
+    sha256 = db.Column(db.String(64), primary_key=True)
+    filename = db.Column(db.String(255), unique=True, nullable=False)  # '<sha256>.<副檔名>'
+    size = db.Column(db.BigInteger, nullable=False)
+    ref_count = db.Column(db.Integer, nullable=False, default=0)  # 引用此檔案的素材數量
+
+    renditions = db.relationship('MediaRendition', backref='blob', cascade='all, delete-orphan')
+
+    def __repr__(self):
+        return f'<MediaBlob {self.filename} refs={self.ref_count}>'
+
+class MediaRendition(db.Model):
+    """依展示區塊尺寸縮小並重新編碼的圖片版本"""
+    __tablename__ = 'media_rendition'
+    id = db.Column(db.Integer, primary_key=True)
+    content_hash = db.Column(db.String(64), db.ForeignKey('media_blob.sha256'), nullable=False)
+    profile = db.Column(db.String(20), nullable=False)  # RENDITION_PROFILES 的鍵
+    filename = db.Column(db.String(255), unique=True, nullable=False)
+    width = db.Column(db.Integer, nullable=False)
+    height = db.Column(db.Integer, nullable=False)
+    size = db.Column(db.BigInteger, nullable=False)
+    sha256 = db.Column(db.String(64), nullable=True)  # 版本檔案本身的雜湊，供展示頁驗證下載
+    __table_args__ = (db.UniqueConstraint('content_hash', 'profile'),)
+
+    @property
+    def url(self):
+        return f"/{UPLOAD_FOLDER}/renditions/{self.filename}"
+
 class Material(db.Model):
     """儲存媒體素材資訊"""
     __tablename__ = 'material'
     id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     original_filename = db.Column(db.String(255), nullable=False)
-    filename = db.Column(db.String(255), unique=True, nullable=False)
+    filename = db.Column(db.String(255), nullable=False)  # 共用同一個 blob 的素材會有相同的檔名
     type = db.Column(db.String(10), nullable=False)  # 'image' or 'video'
     url = db.Column(db.String(255), nullable=False)
-    source = db.Column(db.String(20), default='global') # 'global' or 'group_specific'
+    source = db.Column(db.String(20), default='global', index=True) # 'global' or 'group_specific'
+    content_hash = db.Column(db.String(64), db.ForeignKey('media_blob.sha256'), nullable=True)  # 舊資料為 None
     
+    blob = db.relationship('MediaBlob')
     assignments = db.relationship('Assignment', backref='material', lazy=True, cascade="all, delete-orphan")
     group_associations = db.relationship('GroupImageAssociation', back_populates='material', cascade="all, delete-orphan")
 
@@ -101,23 +437,65 @@ class CarouselGroup(db.Model):
     id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     name = db.Column(db.String(100), nullable=False)
     
-    image_associations = db.relationship('GroupImageAssociation', back_populates='group', lazy='dynamic', order_by='GroupImageAssociation.order', cascade="all, delete-orphan")
+    image_associations = db.relationship('GroupImageAssociation', back_populates='group', lazy='select', order_by='GroupImageAssociation.order', cascade="all, delete-orphan")
     assignments = db.relationship('Assignment', backref='carousel_group', lazy=True, cascade="all, delete-orphan")
 
     def __repr__(self):
         return f'<CarouselGroup {self.name}>' 
 
+class DisplayGroup(db.Model):
+    """展示螢幕群組 (例如同一間門市或同一個區域)，可對群組內所有螢幕覆寫區塊指派"""
+    __tablename__ = 'display_group'
+    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    name = db.Column(db.String(100), nullable=False)
+
+    displays = db.relationship('Display', backref='group', lazy=True)
+    assignments = db.relationship('Assignment', backref='display_group', lazy=True, cascade="all, delete-orphan")
+
+    def __repr__(self):
+        return f'<DisplayGroup {self.name}>'
+
+class Display(db.Model):
+    """已登記的展示螢幕。id 即展示頁網址 /display?display=<id> 使用的識別碼"""
+    __tablename__ = 'display'
+    id = db.Column(db.String(64), primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    group_id = db.Column(db.String(36), db.ForeignKey('display_group.id'), nullable=True, index=True)
+
+    assignments = db.relationship('Assignment', backref='display', lazy=True, cascade="all, delete-orphan")
+
+    def __repr__(self):
+        return f'<Display {self.id}>'
+
 class Assignment(db.Model):
-    """儲存區塊內容指派"""
+    """儲存區塊內容指派。
+
+    display_id 與 display_group_id 皆為 None 時是全域指派；指定其中之一時只覆寫該螢幕或該螢幕群組的區塊。
+    """
     __tablename__ = 'assignment'
     id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
-    section_key = db.Column(db.String(50), nullable=False)
+    section_key = db.Column(db.String(50), nullable=False, index=True)
     content_source_type = db.Column(db.String(20), nullable=False) # 'single_media' or 'group_reference'
     offset = db.Column(db.Integer, default=0)
     
     # 外鍵
-    media_id = db.Column(db.String(36), db.ForeignKey('material.id'), nullable=True)
-    group_id = db.Column(db.String(36), db.ForeignKey('carousel_group.id'), nullable=True)
+    media_id = db.Column(db.String(36), db.ForeignKey('material.id'), nullable=True, index=True)
+    group_id = db.Column(db.String(36), db.ForeignKey('carousel_group.id'), nullable=True, index=True)
+    display_group_id = db.Column(db.String(36), db.ForeignKey('display_group.id'), nullable=True, index=True)
+    display_id = db.Column(db.String(64), db.ForeignKey('display.id'), nullable=True, index=True)
+
+    # 排程 (皆為 None 時全天候播放)：starts_at / ends_at 為 UTC 時間；
+    # weekdays 為星期位元遮罩 (星期一為 1 << 0)；daily_start / daily_end 為當地時間自午夜起的分鐘數，結束早於開始表示跨午夜
+    starts_at = db.Column(db.DateTime, nullable=True)
+    ends_at = db.Column(db.DateTime, nullable=True)
+    weekdays = db.Column(db.Integer, nullable=True)
+    daily_start = db.Column(db.Integer, nullable=True)
+    daily_end = db.Column(db.Integer, nullable=True)
+
+    @property
+    def is_scheduled(self):
+        return any(value is not None for value in
+                   (self.starts_at, self.ends_at, self.weekdays, self.daily_start, self.daily_end))
 
     def __repr__(self):
         return f'<Assignment {self.section_key}>'
@@ -131,6 +509,1237 @@ def allowed_file(filename):
     extension = filename.rsplit('.', 1)[1].lower()
     return extension in ALLOWED_EXTENSIONS
 
+# --- CPU 密集工作 ---
+def run_cpu_bound(func, *args, **kwargs):
+    """在 eventlet 執行緒池中執行 CPU 密集的函式並返回結果 (例外會原樣拋出)。
+
+    呼叫的 greenlet 等待結果時，事件迴圈仍會繼續處理 WebSocket 心跳與其他請求。
+    hashlib 的 scrypt/pbkdf2/sha256 與 Pillow 的縮放、編碼在執行期間都會釋放 GIL，因此能真正平行。
+    """
+    if app.config['CPU_OFFLOAD'] and socketio.async_mode == 'eventlet':
+        return tpool.execute(func, *args, **kwargs)
+    return func(*args, **kwargs)
+
+def hash_password(password):
+    return run_cpu_bound(generate_password_hash, password)
+
+def verify_password(password_hash, password):
+    return run_cpu_bound(check_password_hash, password_hash, password)
+
+# --- 內容定址的上傳儲存 ---
+def _write_and_hash(f, digest, chunk):
+    digest.update(chunk)
+    f.write(chunk)
+
+def _store_upload_stream(stream):
+    """將上傳內容串流寫入上傳目錄中的暫存檔，同時計算 SHA-256。
+
+    Returns:
+        tuple: (sha256, size, temp_path)
+    """
+    folder = app.config['UPLOAD_FOLDER']
+    os.makedirs(folder, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    fd, temp_path = tempfile.mkstemp(dir=folder, suffix='.uploading')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            while True:
+                # 讀取請求內容必須留在事件迴圈中，雜湊與寫檔交給執行緒池
+                chunk = stream.read(UPLOAD_STREAM_CHUNK_SIZE)
+                if not chunk:
+                    break
+                run_cpu_bound(_write_and_hash, f, digest, chunk)
+                size += len(chunk)
+    except Exception:
+        os.remove(temp_path)
+        raise
+    return digest.hexdigest(), size, temp_path
+
+def _copy_and_hash(stream, folder, max_size=None):
+    """把表單解析器已暫存在本機的上傳檔複製到上傳目錄中的暫存檔並計算 SHA-256，整段在執行緒池中執行。
+
+    Returns:
+        tuple: (sha256, size, temp_path)
+
+    Raises:
+        ValueError: 檔案超過 max_size，暫存檔會被刪除。
+    """
+    digest = hashlib.sha256()
+    size = 0
+    fd, temp_path = tempfile.mkstemp(dir=folder, suffix='.uploading')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            while True:
+                chunk = stream.read(UPLOAD_STREAM_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if max_size is not None and size > max_size:
+                    raise ValueError(f'檔案超過大小上限 ({max_size} 位元組)')
+                digest.update(chunk)
+                f.write(chunk)
+    except Exception:
+        os.remove(temp_path)
+        raise
+    return digest.hexdigest(), size, temp_path
+
+def _store_uploaded_files(files, max_size=None):
+    """同時把多個上傳檔寫入上傳目錄，同時處理的數量由 GROUP_UPLOAD_CONCURRENCY 限制。
+
+    Returns:
+        list: 與 files 一一對應，成功時為 (sha256, size, temp_path)，失敗時為拋出的例外。
+    """
+    folder = app.config['UPLOAD_FOLDER']
+    os.makedirs(folder, exist_ok=True)
+
+    def store(file):
+        try:
+            return run_cpu_bound(_copy_and_hash, file.stream, folder, max_size)
+        except Exception as e:
+            return e
+
+    pool = GreenPool(app.config['GROUP_UPLOAD_CONCURRENCY'])
+    return list(pool.imap(store, files))
+
+def _hash_file(path):
+    """計算既有檔案的 SHA-256，返回 (sha256, size)。在事件迴圈中請透過 run_cpu_bound 呼叫"""
+    digest = hashlib.sha256()
+    size = 0
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(UPLOAD_STREAM_CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+            size += len(chunk)
+    return digest.hexdigest(), size
+
+def _acquire_blob(sha256, size, temp_path, extension):
+    """為一筆新素材登記內容參照，不執行 db.session.commit()。
+
+    內容已存在時只增加參照計數並刪除暫存檔；否則先在 savepoint 中新增 blob 記錄，成功後才將暫存檔
+    移到以雜湊命名的正式位置。兩個請求同時上傳相同內容時，較慢的一方新增記錄會違反主鍵，
+    此時改為沿用先提交的記錄，不會覆寫或清除對方的檔案。
+
+    Returns:
+        tuple: (blob, created_path)。created_path 為本次新增 blob 記錄時建立的檔案路徑，
+        只有此記錄未能提交時才可清除；沿用既有記錄時為 None。
+    """
+    folder = app.config['UPLOAD_FOLDER']
+    blob = db.session.get(MediaBlob, sha256)
+    if blob is None:
+        blob = MediaBlob(sha256=sha256, filename=f"{sha256}.{extension}", size=size, ref_count=1)
+        try:
+            with db.session.begin_nested():
+                db.session.add(blob)
+        except IntegrityError:
+            # 另一個請求已先提交相同的內容
+            blob = db.session.get(MediaBlob, sha256)
+        else:
+            created_path = os.path.join(folder, blob.filename)
+            os.replace(temp_path, created_path)
+            return blob, created_path
+
+    blob_path = os.path.join(folder, blob.filename)
+    if os.path.exists(blob_path):
+        os.remove(temp_path)
+    else:
+        # 實體檔案遺失時以這次上傳的內容補回；檔案已由既有記錄引用，提交失敗時也保留
+        os.replace(temp_path, blob_path)
+    blob.ref_count = MediaBlob.ref_count + 1
+    return blob, None
+
+def _insert_new_blobs(stored, counts):
+    """在 savepoint 中新增尚未存在的 blob 記錄，返回 (existing, new_rows)。
+
+    新增時違反主鍵表示另一個請求剛提交了相同內容，重新查詢一次後只新增仍不存在的記錄。
+    """
+    for attempt in range(2):
+        existing = dict(db.session.query(MediaBlob.sha256, MediaBlob.filename)
+                        .filter(MediaBlob.sha256.in_(list(counts))).all())
+        new_rows = {}
+        for sha256, size, _temp_path, extension in stored:
+            if sha256 not in existing and sha256 not in new_rows:
+                new_rows[sha256] = {'sha256': sha256, 'filename': f"{sha256}.{extension}",
+                                    'size': size, 'ref_count': counts[sha256]}
+        if not new_rows:
+            return existing, new_rows
+        try:
+            with db.session.begin_nested():
+                db.session.execute(insert(MediaBlob), list(new_rows.values()))
+            return existing, new_rows
+        except IntegrityError:
+            if attempt:
+                raise
+
+def _acquire_blobs(stored):
+    """_acquire_blob 的批次版本：以一次查詢找出既有內容，批次新增 blob 並更新參照計數，不執行 db.session.commit()。
+
+    與 _acquire_blob 相同，只有新增記錄成功後才移動暫存檔，created_paths 只包含本次新增記錄的檔案。
+
+    Args:
+        stored (list): (sha256, size, temp_path, extension)，同一份內容可以出現多次。
+
+    Returns:
+        tuple: (filenames, created_paths, new_blobs)。filenames 為 sha256 對應的 blob 檔名；
+        new_blobs 為本次新建立的 (sha256, filename)。
+    """
+    folder = app.config['UPLOAD_FOLDER']
+    counts = Counter(sha256 for sha256, _size, _temp_path, _extension in stored)
+    existing, new_rows = _insert_new_blobs(stored, counts)
+
+    filenames = dict(existing)
+    filenames.update((sha256, row['filename']) for sha256, row in new_rows.items())
+    created_paths = []
+    for sha256, _size, temp_path, _extension in stored:
+        blob_path = os.path.join(folder, filenames[sha256])
+        if sha256 in new_rows and blob_path not in created_paths:
+            os.replace(temp_path, blob_path)
+            created_paths.append(blob_path)
+        elif os.path.exists(blob_path):
+            os.remove(temp_path)
+        else:
+            # 實體檔案遺失時以這次上傳的內容補回；檔案已由既有記錄引用，提交失敗時也保留
+            os.replace(temp_path, blob_path)
+
+    if existing:
+        blob_table = MediaBlob.__table__
+        db.session.execute(
+            update(blob_table)
+            .where(blob_table.c.sha256 == bindparam('blob_sha256'))
+            .values(ref_count=blob_table.c.ref_count + bindparam('added_refs')),
+            [{'blob_sha256': sha256, 'added_refs': counts[sha256]} for sha256 in existing]
+        )
+    return filenames, created_paths, [(sha256, row['filename']) for sha256, row in new_rows.items()]
+
+def _release_material_file(material):
+    """解除素材對實體檔案的參照，不執行 db.session.commit()。
+
+    Returns:
+        list: 最後一個參照消失時，應在提交成功後刪除的檔案路徑 (含各尺寸版本)。
+    """
+    folder = app.config['UPLOAD_FOLDER']
+    if material.content_hash is None:
+        # 內容定址之前上傳的素材各自擁有檔案
+        return [os.path.join(folder, material.filename)] if material.filename else []
+
+    blob = db.session.get(MediaBlob, material.content_hash)
+    if blob is None:
+        return []
+    db.session.refresh(blob, ['ref_count'])
+    if blob.ref_count <= 1:
+        paths = [os.path.join(folder, blob.filename)]
+        paths.extend(os.path.join(folder, 'renditions', r.filename) for r in blob.renditions)
+        db.session.delete(blob)
+        return paths
+    blob.ref_count = MediaBlob.ref_count - 1
+    return []
+
+def _remove_files(paths):
+    """刪除提交後不再被引用的實體檔案"""
+    for filepath in paths:
+        if filepath and os.path.exists(filepath):
+            try:
+                os.remove(filepath)
+                print(f"已成功刪除實體檔案: {filepath}")
+            except OSError as e:
+                print(f"刪除檔案時發生錯誤 {filepath}: {e}")
+
+# --- 播放清單快照快取 ---
+PlaylistSnapshot = namedtuple('PlaylistSnapshot', ['version', 'payload', 'body'])
+
+class PlaylistSnapshotCache:
+    """以內容版本為鍵的展示資料快照快取。
+
+    每個會影響展示內容的寫入路由在提交後都必須呼叫 bump()，讓版本號遞增並清空快照；
+    讀取時若快照版本與目前版本一致，直接回傳預先序列化好的 bytes，不再查詢資料庫。
+    版本號以啟動時的毫秒時間戳為起點，確保伺服器重啟後版本仍然單調遞增。
+
+    CONTENT_VERSION_SHARED 開啟時 (多節點部署)，版本號改存於資料庫的 'content' 版本，
+    各節點每隔 CONTENT_VERSION_CHECK_INTERVAL 秒比對一次，發現其他節點寫入時清空自己的快照。
+    """
+    VERSION_NAME = 'content'
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = int(time.time() * 1000)
+        self._snapshots = {}
+        self._checked_at = float('-inf')
+
+    @property
+    def version(self):
+        self._sync_shared_version()
+        return self._version
+
+    def _sync_shared_version(self):
+        if not app.config['CONTENT_VERSION_SHARED']:
+            return
+        now = time.monotonic()
+        if now - self._checked_at < app.config['CONTENT_VERSION_CHECK_INTERVAL']:
+            return
+        shared = db.session.query(CacheVersion.version).filter_by(name=self.VERSION_NAME).scalar() or 0
+        with self._lock:
+            self._checked_at = now
+            if shared != self._version:
+                self._version = shared
+                self._snapshots.clear()
+
+    def bump(self):
+        """遞增內容版本並使所有快照失效，返回新的版本號"""
+        if app.config['CONTENT_VERSION_SHARED']:
+            shared = bump_cache_version(self.VERSION_NAME)
+            with self._lock:
+                self._version = shared
+                self._snapshots.clear()
+                self._checked_at = time.monotonic()
+                return shared
+        with self._lock:
+            self._version += 1
+            self._snapshots.clear()
+            return self._version
+
+    def peek(self, key):
+        """返回目前版本的快照；不存在或已過期時返回 None，不會重建"""
+        snapshot = self._snapshots.get(key)
+        if snapshot is not None and snapshot.version == self.version:
+            return snapshot
+        return None
+
+    def get(self, key, builder, serialize=True):
+        """取得指定鍵的快照，若不存在或已過期則呼叫 builder() 重建。
+
+        Args:
+            key (str): 快照鍵，例如 'display'。
+            builder (callable): 無參數函式，返回要序列化的 dict。
+            serialize (bool): 只在伺服器內部使用的快照 (例如 'catalog') 不需要序列化，body 為 None。
+
+        Returns:
+            PlaylistSnapshot: (version, payload, body)
+        """
+        version = self.version
+        # 'manifest:<display_id>' 之類的鍵以前綴作為指標標籤，避免每個螢幕各自成為一組時間序列
+        metric_key = key.split(':', 1)[0]
+        snapshot = self._snapshots.get(key)
+        if snapshot is not None and snapshot.version == version:
+            SNAPSHOT_REQUESTS.inc(key=metric_key, result='hit')
+            return snapshot
+
+        SNAPSHOT_REQUESTS.inc(key=metric_key, result='miss')
+        started = time.perf_counter()
+        payload = builder()
+        # 讓客戶端知道自己持有的版本，以便套用增量更新時偵測版本缺口
+        payload['version'] = version
+        built = time.perf_counter()
+        SNAPSHOT_BUILD.observe(built - started, key=metric_key, phase='build')
+        body = None
+        if serialize:
+            body = app.json.dumps(payload).encode('utf-8')
+            SNAPSHOT_BUILD.observe(time.perf_counter() - built, key=metric_key, phase='serialize')
+        snapshot = PlaylistSnapshot(version, payload, body)
+        with self._lock:
+            # 建立期間若有其他寫入遞增了版本，這份快照可能已過期，不放入快取
+            if self._version == version:
+                self._snapshots[key] = snapshot
+        return snapshot
+
+playlist_cache = PlaylistSnapshotCache()
+
+def mark_content_changed():
+    """在影響展示內容的寫入成功提交後呼叫，使播放清單快照失效並返回新的內容版本"""
+    version = playlist_cache.bump()
+    daypart_scheduler.wake()
+    return version
+
+def _group_media_by_section(media_items):
+    """將扁平的媒體列表依 section_key 分組，保留各區塊內的播放順序"""
+    sections = {}
+    for item in media_items:
+        sections.setdefault(item['section_key'], []).append(item)
+    return sections
+
+def build_playlist_patch(previous_payload, current_payload):
+    """比較前後兩份展示資料，產生以區塊為單位的增量更新。
+
+    Returns:
+        dict: 只包含內容有變動的區塊 (整個區塊的新列表)、被清空的區塊，以及有變動時的播放設定。
+    """
+    previous_sections = _group_media_by_section(previous_payload['media'])
+    current_sections = _group_media_by_section(current_payload['media'])
+
+    patch = {
+        'from_version': previous_payload['version'],
+        'version': current_payload['version'],
+        'sections': {key: items for key, items in current_sections.items()
+                     if previous_sections.get(key) != items},
+        'removed_sections': [key for key in previous_sections if key not in current_sections]
+    }
+    if previous_payload['settings'] != current_payload['settings']:
+        patch['settings'] = current_payload['settings']
+    return patch
+
+class PlaylistPublisher:
+    """記錄最後一次推送時的指派目錄快照，並在內容變更後推送增量更新 (playlist_patch)。
+
+    未登記的展示頁共用全域內容：增量更新只送到內容有變動的區塊房間 (設定變更時送到所有展示頁)，
+    未受影響的展示頁不會被喚醒。已登記的螢幕各自解析內容，只在自己解析後的內容有變動時送到 display:<ID> 房間。
+    因為展示頁不一定收到每一份更新，patch 以 base_versions 標示每個變動區塊上一次變動時的版本：
+    展示頁持有的該區塊版本不低於 base 即可直接套用，否則才重新完整抓取。
+    """
+    SETTINGS_KEY = 'settings'
+
+    def __init__(self, cache):
+        self._cache = cache
+        self._lock = threading.Lock()
+        self._published = None
+        self._section_versions = {}  # (螢幕ID 或 None, 區塊或 SETTINGS_KEY) -> 最後一次變動的內容版本
+
+    def remember(self, snapshot):
+        """記錄展示頁已取得內容時的目錄快照，作為第一次推送增量更新時的比較基準"""
+        if self._published is None:
+            with self._lock:
+                if self._published is None:
+                    self._published = snapshot
+
+    @property
+    def has_baseline(self):
+        return self._published is not None
+
+    def reset(self):
+        """捨棄推送基準，例如資料庫整個重建之後"""
+        with self._lock:
+            self._published = None
+            self._section_versions.clear()
+
+    def publish(self):
+        """重建最新目錄並向每個內容有變動的對象推送差異，返回送出的 patch 列表。
+
+        本程序沒有比較基準時 (例如只處理過背景寫入的節點) 無法計算差異，改送 playlist_resync 給所有展示頁，
+        讓它們以條件請求重新抓取，並以最新目錄作為之後的基準。
+        """
+        current = self._cache.get('catalog', _build_display_catalog, serialize=False)
+        with self._lock:
+            previous = self._published
+            if previous is not None and previous.version >= current.version:
+                return []
+            self._published = current
+        if previous is None:
+            rooms = [DISPLAY_ROOM] + [display_room(display_id) for display_id in sorted(current.payload['displays'])]
+            emit_event('playlist_resync', {'version': current.version}, to=rooms)
+            return []
+
+        patches = []
+        for display_id in self._affected_audiences(previous.payload, current.payload):
+            patch = self._publish_to(display_id, previous, current)
+            if patch is not None:
+                patches.append(patch)
+        return patches
+
+    @staticmethod
+    def _changed_sections(previous_scopes, current_scopes):
+        """比較兩份目錄的各範圍，返回 {範圍: 內容有變動的區塊集合}。覆寫為空列表與沒有覆寫視為不同"""
+        changed = {}
+        for scope in set(previous_scopes) | set(current_scopes):
+            before, after = previous_scopes.get(scope, {}), current_scopes.get(scope, {})
+            keys = {key for key in set(before) | set(after) if before.get(key) != after.get(key)}
+            if keys:
+                changed[scope] = keys
+        return changed
+
+    def _affected_audiences(self, previous, current):
+        """列出解析後內容可能改變的推送對象：None 代表未登記的展示頁，其餘為已登記的螢幕ID。
+
+        只有設定變更、登記或所屬群組改變，或是自身解析用到的範圍 (全域中未被覆寫的區塊、所屬群組、自己)
+        有變動的螢幕才需要重新解析，成本與變更範圍有關，而非整個螢幕數量。
+        """
+        previous_displays, current_displays = previous['displays'], current['displays']
+        # 剛登記或剛刪除的螢幕在另一份目錄中以全域內容比較
+        display_ids = set(previous_displays) | set(current_displays)
+        if previous['settings'] != current['settings']:
+            return [None] + sorted(display_ids)
+
+        changed = self._changed_sections(previous['scopes'], current['scopes'])
+        global_changed = changed.pop(GLOBAL_SCOPE, set())
+        affected = {display_id for display_id in display_ids
+                    if display_id not in previous_displays or display_id not in current_displays
+                    or previous_displays[display_id] != current_displays[display_id]}
+        changed_groups = set()
+        for scope in changed:
+            kind, _, scope_id = scope.partition(':')
+            if kind == 'display' and scope_id in display_ids:
+                affected.add(scope_id)
+            elif kind == 'group':
+                changed_groups.add(scope_id)
+        if changed_groups or global_changed:
+            for display_id in display_ids - affected:
+                group_ids = {previous_displays.get(display_id), current_displays.get(display_id)} - {None}
+                if group_ids & changed_groups:
+                    affected.add(display_id)
+                elif global_changed:
+                    # 全域變動的區塊只要有一個沒有被群組或螢幕覆寫，就會反映到這個螢幕
+                    overridden = set()
+                    for scope in [f'group:{group_id}' for group_id in group_ids] + [f'display:{display_id}']:
+                        overridden.update(previous['scopes'].get(scope, {}), current['scopes'].get(scope, {}))
+                    if global_changed - overridden:
+                        affected.add(display_id)
+        return ([None] if global_changed else []) + sorted(affected)
+
+    def _publish_to(self, display_id, previous, current):
+        before = {**resolve_display_payload(previous.payload, display_id), 'version': previous.version}
+        after = {**resolve_display_payload(current.payload, display_id), 'version': current.version}
+        patch = build_playlist_patch(before, after)
+        changed = list(patch['sections']) + patch['removed_sections']
+        if 'settings' in patch:
+            changed.append(self.SETTINGS_KEY)
+        if not changed:
+            return None
+
+        with self._lock:
+            # 推送基準建立之前的變動無從得知，以基準版本保守地當作上一次變動
+            patch['base_versions'] = {key: self._section_versions.get((display_id, key), previous.version)
+                                      for key in changed}
+            for key in changed:
+                self._section_versions[(display_id, key)] = current.version
+
+        if display_id is not None:
+            patch['display_id'] = display_id
+            rooms = [display_room(display_id)]
+        else:
+            rooms = [section_room(key) for key in changed if key != self.SETTINGS_KEY]
+            if 'settings' in patch:
+                rooms.append(DISPLAY_ROOM)
+        emit_event('playlist_patch', patch, to=rooms)
+        return patch
+
+playlist_publisher = PlaylistPublisher(playlist_cache)
+
+@app.before_request
+def _capture_publish_baseline():
+    """寫入請求執行前記下目前的目錄作為推送基準，讓從未提供過展示內容的節點第一次寫入也能推送增量更新。
+    每個程序只需要一次，之後每次推送都會更新基準。修改內容的 API 都需要 token，未帶 token 的請求 (例如登入) 略過。"""
+    if (request.method in ('GET', 'HEAD', 'OPTIONS') or playlist_publisher.has_baseline
+            or not request.headers.get('Authorization')):
+        return
+    playlist_publisher.remember(display_catalog_snapshot())
+
+class BroadcastCoalescer:
+    """合併短時間內連續的內容變更廣播。
+
+    每次寫入只登記待發送的事件；當 BROADCAST_QUIET_WINDOW 秒內沒有新的變更，
+    或距離第一筆變更已達 BROADCAST_MAX_LATENCY 秒時，才一次送出：
+    一則帶有最終版本的 media_updated、合併後的 settings_updated，以及一份 playlist_patch。
+    安靜期設為 0 時立即同步送出。
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._first_change = None
+        self._last_change = None
+        self._messages = []
+        self._settings = {}
+
+    def schedule(self, event=None, data=None):
+        """登記一筆內容變更。event 為要通知後台的事件 ('media_updated' 或 'settings_updated')"""
+        now = time.monotonic()
+        with self._lock:
+            if event == 'media_updated':
+                self._messages.append(data.get('message') if data else None)
+            elif event == 'settings_updated':
+                self._settings.update(data or {})
+            self._last_change = now
+            start_task = self._first_change is None
+            if start_task:
+                self._first_change = now
+
+        if app.config['BROADCAST_QUIET_WINDOW'] <= 0:
+            self.flush()
+        elif start_task:
+            socketio.start_background_task(self._wait_and_flush)
+
+    def _wait_and_flush(self):
+        while True:
+            with self._lock:
+                if self._first_change is None:
+                    return
+                deadline = min(self._last_change + app.config['BROADCAST_QUIET_WINDOW'],
+                               self._first_change + app.config['BROADCAST_MAX_LATENCY'])
+            delay = deadline - time.monotonic()
+            if delay <= 0:
+                break
+            socketio.sleep(delay)
+        try:
+            with app.app_context():
+                self.flush()
+        except Exception as e:
+            print(f"送出合併廣播時發生錯誤: {e}")
+
+    def flush(self):
+        """立即送出所有待發送的廣播"""
+        with self._lock:
+            if self._first_change is None:
+                return
+            messages, settings = self._messages, self._settings
+            self._reset()
+
+        version = playlist_cache.version
+        if messages:
+            emit_event('media_updated', {'message': messages[-1], 'version': version, 'changes': len(messages)},
+                       to=ADMIN_ROOM)
+        if settings:
+            emit_event('settings_updated', settings, to=ADMIN_ROOM)
+        playlist_publisher.publish()
+
+broadcast_coalescer = BroadcastCoalescer()
+
+def broadcast_content_change(event=None, data=None):
+    """在 mark_content_changed() 之後呼叫，將變更通知交給廣播合併器"""
+    broadcast_coalescer.schedule(event, data)
+
+def _content_etag():
+    """以內容版本組成強式 ETag；帶查詢參數時加上其雜湊，區分同一資源的不同表示"""
+    # 排程時段已切換時先遞增版本，避免以舊的 ETag 回應 304
+    daypart_scheduler.transition_if_due()
+    etag = str(playlist_cache.version)
+    if request.query_string:
+        etag += '-' + hashlib.sha1(request.query_string).hexdigest()[:12]
+    return etag
+
+def conditional_on_content_version(f):
+    """讀取 API 的條件請求裝飾器。
+
+    以內容版本作為 ETag，當客戶端帶來的 If-None-Match 與目前版本相符時直接回應 304，
+    完全不查詢資料庫也不序列化；否則執行原本的路由並在成功的回應上附加 ETag。
+    """
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        etag = _content_etag()
+        if request.if_none_match.contains(etag):
+            response = app.response_class(status=304)
+        else:
+            response = app.make_response(f(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+        response.set_etag(etag)
+        # 允許快取，但每次使用前都必須向伺服器驗證
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+    return decorated
+
+# --- 排程播放 (Dayparting) ---
+# 排程指派只在時段內生效；同一範圍同一區塊有生效中的排程指派時，取代該區塊的全天候指派，
+# 沒有生效中的指派時整個區塊交給較寬的範圍 (例如螢幕的早餐時段覆寫結束後回到群組或全域內容)。
+# 指派目錄建立時一併展開時間軸索引，並記錄目錄的有效期限 (下一個時段邊界)；
+# 排程器在邊界時間遞增內容版本，展示頁隨即收到 playlist_patch，不需要輪詢。
+WEEKDAY_COUNT = 7
+MINUTES_PER_DAY = 24 * 60
+
+def _schedule_timezone():
+    name = app.config['SCHEDULE_TIMEZONE']
+    return ZoneInfo(name) if name else datetime.datetime.now().astimezone().tzinfo
+
+def _utc_timestamp(value):
+    """資料庫中不帶時區的 UTC 時間轉為 epoch 秒數"""
+    return value.replace(tzinfo=datetime.timezone.utc).timestamp()
+
+def _local_timestamp(day, minutes, tz):
+    """day 當地時間 minutes 分 (可超過一天，跨午夜的時段) 的 epoch 秒數。
+
+    以當地的牆上時間計算，不能以午夜加上分鐘數：日光節約切換當天的午夜到該時刻之間並不是 minutes 分鐘。
+    """
+    day += datetime.timedelta(days=minutes // MINUTES_PER_DAY)
+    minutes %= MINUTES_PER_DAY
+    return datetime.datetime.combine(day, datetime.time(minutes // 60, minutes % 60), tzinfo=tz).timestamp()
+
+def schedule_windows(assignment, start, end, tz):
+    """展開一筆排程指派在 [start, end) 內的播放區間 (epoch 秒數)，返回 [(開始, 結束), ...]"""
+    lo = max(start, _utc_timestamp(assignment.starts_at)) if assignment.starts_at else start
+    hi = min(end, _utc_timestamp(assignment.ends_at)) if assignment.ends_at else end
+    if lo >= hi:
+        return []
+    if assignment.weekdays is None and assignment.daily_start is None and assignment.daily_end is None:
+        return [(lo, hi)]
+
+    daily_start = assignment.daily_start or 0
+    daily_end = assignment.daily_end if assignment.daily_end is not None else MINUTES_PER_DAY
+    if daily_end <= daily_start:
+        daily_end += MINUTES_PER_DAY  # 跨午夜的時段屬於開始的那一天
+    # 從前一天開始展開，涵蓋前一天跨午夜延續過來的時段
+    day = datetime.datetime.fromtimestamp(lo, tz).date() - datetime.timedelta(days=1)
+    last_day = datetime.datetime.fromtimestamp(hi, tz).date()
+    windows = []
+    while day <= last_day:
+        if assignment.weekdays is None or assignment.weekdays & (1 << day.weekday()):
+            begin = max(lo, _local_timestamp(day, daily_start, tz))
+            finish = min(hi, _local_timestamp(day, daily_end, tz))
+            if begin < finish:
+                windows.append((begin, finish))
+        day += datetime.timedelta(days=1)
+    return windows
+
+class ScheduleIndex:
+    """排程指派的時間軸索引。
+
+    把每筆排程在 [start, end) 內的區間展開成排序好的邊界點，並預先算出每兩個相鄰邊界之間生效的指派集合；
+    查詢某個時間點生效的指派與下一次切換的時間都只需一次 bisect。
+    """
+    def __init__(self, assignments, start, end, tz):
+        self.start, self.end = start, end
+        events = {}  # 時間 -> [(指派ID, +1 或 -1)]
+        for assignment in assignments:
+            for begin, finish in schedule_windows(assignment, start, end, tz):
+                events.setdefault(begin, []).append((assignment.id, 1))
+                events.setdefault(finish, []).append((assignment.id, -1))
+
+        self.boundaries = sorted(set(events) | {start, end})
+        self.segments = []
+        counts = Counter()
+        for boundary in self.boundaries[:-1]:
+            for assignment_id, delta in events.get(boundary, ()):
+                counts[assignment_id] += delta
+            self.segments.append(frozenset(assignment_id for assignment_id, count in counts.items() if count > 0))
+
+    def covers(self, timestamp):
+        return self.start <= timestamp < self.end
+
+    def active_at(self, timestamp):
+        """返回該時間點生效的排程指派ID集合；timestamp 必須在索引範圍內"""
+        return self.segments[bisect.bisect_right(self.boundaries, timestamp) - 1]
+
+    def next_transition(self, timestamp):
+        """返回 timestamp 之後生效集合改變的第一個時間；索引範圍內沒有時返回 None"""
+        index = bisect.bisect_right(self.boundaries, timestamp) - 1
+        current = self.segments[index]
+        for position in range(index + 1, len(self.segments)):
+            if self.segments[position] != current:
+                return self.boundaries[position]
+        return None
+
+def build_schedule_index(assignments, start):
+    """為排程指派建立從 start 起 SCHEDULE_HORIZON_DAYS 天的時間軸索引"""
+    end = start + app.config['SCHEDULE_HORIZON_DAYS'] * 24 * 60 * 60
+    return ScheduleIndex([a for a in assignments if a.is_scheduled], start, end, _schedule_timezone())
+
+class DaypartScheduler:
+    """在排程時段的邊界遞增內容版本並廣播，讓展示頁在切換的當下收到增量更新。
+
+    目錄快照記錄自己的有效期限 (valid_until)；排程器睡到該時間為止，內容變更時會被喚醒重新計算。
+    排程器未啟用時，讀取 API 在期限過後的第一個請求也會觸發同樣的切換，只是不會主動推送。
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._started = False
+        self._wakeup = None
+
+    def start(self):
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        socketio.start_background_task(self._run)
+
+    def stop(self):
+        """停止排程器的背景迴圈 (目前的等待結束後離開)"""
+        self._started = False
+        self.wake()
+
+    def wake(self):
+        """內容變更後喚醒排程器，重新計算下一個邊界"""
+        wakeup = self._wakeup
+        if wakeup is not None and not wakeup.ready():
+            wakeup.send()
+
+    def transition_if_due(self):
+        """目前的目錄快照已超過有效期限時遞增內容版本並廣播，返回是否發生切換"""
+        snapshot = playlist_cache.peek('catalog')
+        valid_until = snapshot.payload['valid_until'] if snapshot is not None else None
+        if valid_until is None or time.time() < valid_until:
+            return False
+        with self._lock:
+            # 其他請求可能已經完成切換
+            if playlist_cache.peek('catalog') is not snapshot:
+                return False
+            mark_content_changed()
+        broadcast_content_change('media_updated', {'message': '排程時段已切換'})
+        return True
+
+    def _run(self):
+        while self._started:
+            self._wakeup = Event()
+            delay = app.config['SCHEDULER_MAX_SLEEP']
+            try:
+                with app.app_context():
+                    self.transition_if_due()
+                    valid_until = display_catalog_snapshot().payload['valid_until']
+                    if valid_until is not None:
+                        delay = min(delay, max(valid_until - time.time(), 0))
+            except Exception as e:
+                print(f"排程器檢查時段時發生錯誤: {e}")
+            self._wakeup.wait(delay)
+
+daypart_scheduler = DaypartScheduler()
+
+@app.before_request
+def _start_daypart_scheduler():
+    if app.config['SCHEDULER_ENABLED']:
+        daypart_scheduler.start()
+
+# --- 圖片尺寸版本 (背景產生) ---
+# 上傳後在工作程序池中把圖片縮到各區塊實際顯示的尺寸並重新編碼，展示頁改下載較小的版本。
+_rendition_executor = None
+
+def _render_image_renditions(source_path, output_dir, sha256, image_format, quality):
+    """在工作程序中為一張圖片產生各區塊尺寸的版本。只處理檔案，不存取資料庫。
+
+    Returns:
+        list: 產生成功的版本 {'profile', 'filename', 'width', 'height', 'size', 'sha256'}
+    """
+    is_webp = image_format == 'webp'
+    extension = 'webp' if is_webp else 'jpg'
+    source_size = os.path.getsize(source_path)
+
+    results = []
+    with Image.open(source_path) as original:
+        os.makedirs(output_dir, exist_ok=True)
+        # 先套用 EXIF 方向，另存時不帶任何中繼資料
+        image = ImageOps.exif_transpose(original)
+        if is_webp and image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if image.has_transparency_data else 'RGB')
+        elif not is_webp and image.mode != 'RGB':
+            image = image.convert('RGB')
+
+        for profile, (box_width, box_height) in RENDITION_PROFILES.items():
+            # 展示頁以 object-fit: cover 填滿區塊，縮到剛好能覆蓋區塊即可，不放大
+            scale = min(1.0, max(box_width / image.width, box_height / image.height))
+            size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+            resized = image.resize(size, Image.LANCZOS) if scale < 1 else image
+
+            filename = f"{sha256}.{profile}.{extension}"
+            path = os.path.join(output_dir, filename)
+            if is_webp:
+                resized.save(path, 'WEBP', quality=quality, method=4)
+            else:
+                resized.save(path, 'JPEG', quality=quality, optimize=True, progressive=True)
+
+            rendition_sha256, rendition_size = _hash_file(path)
+            if rendition_size >= source_size:
+                # 沒有比原檔小就沒有使用的價值
+                os.remove(path)
+                continue
+            results.append({'profile': profile, 'filename': filename, 'width': size[0],
+                            'height': size[1], 'size': rendition_size, 'sha256': rendition_sha256})
+    return results
+
+def _get_rendition_executor():
+    global _rendition_executor
+    if _rendition_executor is None:
+        # 以 spawn 啟動乾淨的工作程序，避免 fork 複製 eventlet 的事件迴圈與資料庫連線
+        _rendition_executor = ProcessPoolExecutor(max_workers=app.config['RENDITION_WORKERS'],
+                                                  mp_context=multiprocessing.get_context('spawn'))
+    return _rendition_executor
+
+def _rendition_job_args(sha256, filename):
+    folder = app.config['UPLOAD_FOLDER']
+    return (os.path.join(folder, filename), os.path.join(folder, 'renditions'), sha256,
+            app.config['RENDITION_FORMAT'], app.config['RENDITION_QUALITY'])
+
+def _needs_renditions(filename):
+    return Image is not None and filename.rsplit('.', 1)[1].lower() in RENDITION_EXTENSIONS
+
+def _generate_renditions_now(sha256, filename):
+    """在目前的執行緒中產生並記錄尺寸版本，返回產生的數量"""
+    try:
+        results = run_cpu_bound(_render_image_renditions, *_rendition_job_args(sha256, filename))
+    except Exception as e:
+        print(f"產生圖片尺寸版本時發生錯誤 {filename}: {e}")
+        return 0
+    _save_renditions(sha256, results)
+    return len(results)
+
+def schedule_renditions(sha256, filename):
+    """為新儲存的圖片排程產生尺寸版本，需在素材提交後呼叫。
+
+    縮圖交給工作程序池，請求的 greenlet 不必等待；RENDITION_WORKERS 為 0 時直接同步產生。
+    """
+    if not _needs_renditions(filename):
+        return
+    if app.config['RENDITION_WORKERS'] <= 0:
+        _generate_renditions_now(sha256, filename)
+        return
+
+    try:
+        future = _get_rendition_executor().submit(_render_image_renditions, *_rendition_job_args(sha256, filename))
+    except Exception as e:
+        # 工作程序池無法使用時只略過版本產生，不影響已完成的上傳
+        print(f"排程產生圖片尺寸版本時發生錯誤 {filename}: {e}")
+        return
+    socketio.start_background_task(_await_renditions, sha256, future)
+
+def _await_renditions(sha256, future):
+    """在背景 greenlet 中等待工作程序完成，以 socketio.sleep 輪詢而不阻塞事件迴圈"""
+    while not future.done():
+        socketio.sleep(0.1)
+    try:
+        results = future.result()
+    except Exception as e:
+        print(f"產生圖片尺寸版本時發生錯誤 {sha256}: {e}")
+        return
+    with app.app_context():
+        _save_renditions(sha256, results)
+
+def _save_renditions(sha256, results):
+    """記錄產生完成的版本，並讓展示頁的播放清單改用新的檔案"""
+    folder = os.path.join(app.config['UPLOAD_FOLDER'], 'renditions')
+    try:
+        blob = db.session.get(MediaBlob, sha256)
+        if blob is None:
+            # 產生期間最後一筆引用的素材已被刪除
+            _remove_files(os.path.join(folder, result['filename']) for result in results)
+            return
+        existing_profiles = {rendition.profile for rendition in blob.renditions}
+        for result in results:
+            if result['profile'] not in existing_profiles:
+                db.session.add(MediaRendition(content_hash=sha256, **result))
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        print(f"儲存圖片尺寸版本時發生錯誤 {sha256}: {e}")
+        return
+
+    if results:
+        mark_content_changed()
+        broadcast_content_change()
+
+def _display_url(material, section_key, renditions):
+    """返回素材在指定區塊最適合的網址：有對應尺寸的版本時使用該版本，否則使用原檔"""
+    profile = SECTION_RENDITION_PROFILES.get(section_key)
+    rendition = renditions.get((material.content_hash, profile))
+    return rendition.url if rendition else material.url
+
+@app.cli.command('generate-renditions')
+def generate_renditions_command():
+    """為尚未有尺寸版本的既有圖片補產生版本"""
+    for sha256, filename in db.session.query(MediaBlob.sha256, MediaBlob.filename).filter(~MediaBlob.renditions.any()).all():
+        if _needs_renditions(filename):
+            print(f"{filename}: 產生 {_generate_renditions_now(sha256, filename)} 個版本")
+
+# --- 列表 API 分頁與欄位投影 ---
+LIST_DEFAULT_LIMIT = 100
+LIST_MAX_LIMIT = 500
+
+def _encode_cursor(last_id):
+    """將最後一筆的 ID 編碼為不透明的分頁游標"""
+    return base64.urlsafe_b64encode(last_id.encode('utf-8')).decode('ascii').rstrip('=')
+
+def _decode_cursor(cursor):
+    padded = cursor + '=' * (-len(cursor) % 4)
+    return base64.b64decode(padded.encode('ascii'), altchars=b'-_', validate=True).decode('utf-8')
+
+def _parse_list_params(allowed_fields):
+    """解析列表 API 共用的 limit / cursor / fields 查詢參數。
+
+    Returns:
+        tuple: (limit, after_id, fields)。未帶 limit 和 cursor 時 limit 為 None，表示不分頁；
+        未帶 fields 時 fields 為 None，表示返回所有欄位。
+
+    Raises:
+        ValueError: 參數格式錯誤時，訊息可直接回傳給客戶端。
+    """
+    limit = request.args.get('limit')
+    cursor = request.args.get('cursor')
+    fields = request.args.get('fields')
+
+    if limit is not None:
+        try:
+            limit = int(limit)
+        except ValueError:
+            raise ValueError('limit 必須是整數')
+        if limit < 1 or limit > LIST_MAX_LIMIT:
+            raise ValueError(f'limit 必須介於 1 到 {LIST_MAX_LIMIT} 之間')
+    elif cursor is not None:
+        limit = LIST_DEFAULT_LIMIT
+
+    after_id = None
+    if cursor:
+        try:
+            after_id = _decode_cursor(cursor)
+        except (ValueError, UnicodeDecodeError):
+            raise ValueError('cursor 無效')
+
+    if fields is not None:
+        fields = [field.strip() for field in fields.split(',') if field.strip()]
+        unknown = [field for field in fields if field not in allowed_fields]
+        if unknown or not fields:
+            raise ValueError(f'不支援的欄位: {", ".join(unknown)}' if unknown else 'fields 不能為空')
+    return limit, after_id, fields
+
+def _fetch_page(query, id_column, limit, after_id):
+    """以 ID 排序的 keyset 分頁查詢，多取一筆用來判斷是否還有下一頁。
+
+    Returns:
+        tuple: (rows, next_cursor)，沒有下一頁時 next_cursor 為 None。
+    """
+    query = query.order_by(id_column)
+    if after_id is not None:
+        query = query.filter(id_column > after_id)
+    rows = query.limit(limit + 1).all()
+    if len(rows) > limit:
+        return rows[:limit], _encode_cursor(rows[limit - 1].id)
+    return rows, None
+
+def _list_response(items, fields, limit, next_cursor):
+    """組出列表 API 的回應，依 fields 投影欄位；分頁時附上 next_cursor"""
+    if fields is not None:
+        items = [{field: item[field] for field in fields if field in item} for item in items]
+    body = {'success': True, 'data': items}
+    if limit is not None:
+        body['next_cursor'] = next_cursor
+    return jsonify(body)
+
+# --- 群組圖片排序鍵 ---
+# 群組圖片的 order 以 GROUP_ORDER_GAP 為間隔遞增。移動單張圖片時取前後兩張的中間值，
+# 只改寫被移動的那一筆；間隔用盡時才重新編號整個群組。
+GROUP_ORDER_GAP = 1024
+
+def _next_group_order(group_id):
+    """群組末尾的下一個排序鍵"""
+    max_order = db.session.query(db.func.max(GroupImageAssociation.order)).filter_by(group_id=group_id).scalar()
+    return GROUP_ORDER_GAP if max_order is None else max_order + GROUP_ORDER_GAP
+
+def _group_order_bounds(group_id, material_id, anchor=None, place='after'):
+    """找出目標位置前後兩張圖片的排序鍵 (不含被移動的圖片本身)。
+
+    Args:
+        anchor (GroupImageAssociation): 參考圖片；None 表示放到群組開頭 (place='before') 或末尾 (place='after')。
+        place (str): 'before' 或 'after'。
+
+    Returns:
+        tuple: (lower, upper)，沒有相鄰圖片的一側為 None。
+    """
+    others = db.session.query(GroupImageAssociation.order).filter(
+        GroupImageAssociation.group_id == group_id,
+        GroupImageAssociation.material_id != material_id
+    )
+    if anchor is None:
+        if place == 'before':
+            return None, others.order_by(GroupImageAssociation.order).limit(1).scalar()
+        return others.order_by(GroupImageAssociation.order.desc()).limit(1).scalar(), None
+    if place == 'before':
+        lower = others.filter(GroupImageAssociation.order < anchor.order) \
+            .order_by(GroupImageAssociation.order.desc()).limit(1).scalar()
+        return lower, anchor.order
+    upper = others.filter(GroupImageAssociation.order > anchor.order) \
+        .order_by(GroupImageAssociation.order).limit(1).scalar()
+    return anchor.order, upper
+
+def _order_key_between(lower, upper):
+    """返回介於 lower 與 upper 之間的排序鍵；兩者之間已沒有空位時返回 None"""
+    if lower is None and upper is None:
+        return GROUP_ORDER_GAP
+    if lower is None:
+        return upper - GROUP_ORDER_GAP
+    if upper is None:
+        return lower + GROUP_ORDER_GAP
+    if upper - lower < 2:
+        return None
+    return (lower + upper) // 2
+
+def _longest_increasing_positions(keys):
+    """返回 keys 中一個最長嚴格遞增子序列的位置集合 (O(n log n))"""
+    tails, tail_positions, previous = [], [], [None] * len(keys)
+    for position, key in enumerate(keys):
+        length = bisect.bisect_left(tails, key)
+        if length == len(tails):
+            tails.append(key)
+            tail_positions.append(position)
+        else:
+            tails[length] = key
+            tail_positions[length] = position
+        previous[position] = tail_positions[length - 1] if length else None
+    result = set()
+    position = tail_positions[-1] if tail_positions else None
+    while position is not None:
+        result.add(position)
+        position = previous[position]
+    return result
+
+def _spread_order_keys(lower, upper, count):
+    """在 lower 與 upper 之間平均配置 count 個排序鍵；空位不足時返回 None"""
+    if lower is None and upper is None:
+        return [(index + 1) * GROUP_ORDER_GAP for index in range(count)]
+    if lower is None:
+        return [upper - (count - index) * GROUP_ORDER_GAP for index in range(count)]
+    if upper is None:
+        return [lower + (index + 1) * GROUP_ORDER_GAP for index in range(count)]
+    step = (upper - lower) // (count + 1)
+    if step < 1:
+        return None
+    return [lower + (index + 1) * step for index in range(count)]
+
+def plan_group_order(image_ids, current_orders):
+    """依新的圖片順序計算排序鍵，盡量保留既有的鍵。
+
+    目前順序中最長的遞增子序列維持原本的鍵，只有其餘圖片 (被移動或新加入的) 取得前後兩張之間的新鍵；
+    之間空位不足時才向兩側納入相鄰圖片一起重新編號。把一張圖片從開頭移到末尾只會改寫一筆。
+
+    Args:
+        image_ids (list): 新的圖片順序 (不重複)。
+        current_orders (dict): 群組中既有圖片的 {material_id: order}。
+
+    Returns:
+        dict: {material_id: order}，只包含需要寫入的圖片 (新加入或鍵有改變)。
+    """
+    existing = [image_id for image_id in image_ids if image_id in current_orders]
+    kept = {existing[position]
+            for position in _longest_increasing_positions([current_orders[image_id] for image_id in existing])}
+    keys = [current_orders[image_id] if image_id in kept else None for image_id in image_ids]
+
+    index = 0
+    while index < len(keys):
+        if keys[index] is not None:
+            index += 1
+            continue
+        start = end = index
+        while end < len(keys) and keys[end] is None:
+            end += 1
+        while True:
+            lower = keys[start - 1] if start > 0 else None
+            upper = keys[end] if end < len(keys) else None
+            spread = _spread_order_keys(lower, upper, end - start)
+            if spread is not None:
+                break
+            # 空位不足，向兩側各納入一張保留的圖片 (連同其後尚未配置的圖片) 重新編號
+            if start > 0:
+                start -= 1
+            if end < len(keys):
+                end += 1
+                while end < len(keys) and keys[end] is None:
+                    end += 1
+        keys[start:end] = spread
+        index = end
+
+    return {image_id: order for image_id, order in zip(image_ids, keys) if current_orders.get(image_id) != order}
+
+def renumber_group_images(group_id):
+    """依目前順序把群組的排序鍵重新編為等間隔，返回改寫的筆數 (由呼叫端提交)"""
+    rows = db.session.query(GroupImageAssociation.material_id, GroupImageAssociation.order) \
+        .filter_by(group_id=group_id) \
+        .order_by(GroupImageAssociation.order, GroupImageAssociation.material_id).all()
+    changes = [
+        {'group_id': group_id, 'material_id': material_id, 'order': (index + 1) * GROUP_ORDER_GAP}
+        for index, (material_id, order) in enumerate(rows)
+        if order != (index + 1) * GROUP_ORDER_GAP
+    ]
+    if changes:
+        db.session.execute(update(GroupImageAssociation), changes)
+    return len(changes)
+
+def schedule_group_renumber(group_id):
+    """在背景 greenlet 中重新編號群組，讓下一次移動仍有空位"""
+    socketio.start_background_task(_renumber_group_in_background, group_id)
+
+def _renumber_group_in_background(group_id):
+    with app.app_context():
+        try:
+            renumber_group_images(group_id)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"重新編號群組 {group_id} 的圖片順序時發生錯誤: {e}")
+
+# --- 認證主體快取 ---
+# 受保護的路由只需要使用者的 id、名稱、角色與啟用狀態，快取這份不可變的資料即可，
+# 不必讓 ORM 物件跨請求存活。
+AuthPrincipal = namedtuple('AuthPrincipal', ['id', 'username', 'role', 'is_active'])
+
+def bump_cache_version(name):
+    """遞增指定的跨程序快取版本並提交，返回新的版本號"""
+    updated = CacheVersion.query.filter_by(name=name).update({CacheVersion.version: CacheVersion.version + 1})
+    if not updated:
+        db.session.add(CacheVersion(name=name, version=1))
+    db.session.commit()
+    return db.session.query(CacheVersion.version).filter_by(name=name).scalar()
+
+class PrincipalCache:
+    """已驗證 JWT 與其使用者的 LRU/TTL 快取。
+
+    快取項目在 token 過期或 AUTH_CACHE_TTL 秒後失效，超過 AUTH_CACHE_MAX_ENTRIES 時淘汰最久未使用的項目。
+    修改使用者的路由提交後必須呼叫 invalidate()：清空本程序的快取，並遞增資料庫中的 'auth' 版本；
+    其他工作程序每隔 AUTH_CACHE_VERSION_CHECK_INTERVAL 秒以一次主鍵查詢比對版本，發現不同時清空快取。
+    """
+    VERSION_NAME = 'auth'
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # token -> (principal, expires_at)
+        self._version = None
+        self._checked_at = float('-inf')
+
+    def _check_version(self):
+        now = time.monotonic()
+        if now - self._checked_at < app.config['AUTH_CACHE_VERSION_CHECK_INTERVAL']:
+            return
+        version = db.session.query(CacheVersion.version).filter_by(name=self.VERSION_NAME).scalar() or 0
+        with self._lock:
+            self._checked_at = now
+            if version != self._version:
+                self._entries.clear()
+                self._version = version
+
+    def get(self, token):
+        """返回快取的 AuthPrincipal，未命中或已過期時返回 None"""
+        self._check_version()
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                return None
+            principal, expires_at = entry
+            if expires_at <= time.time():
+                del self._entries[token]
+                return None
+            self._entries.move_to_end(token)
+            return principal
+
+    def put(self, token, principal, token_expires_at):
+        expires_at = min(time.time() + app.config['AUTH_CACHE_TTL'], token_expires_at)
+        with self._lock:
+            self._entries[token] = (principal, expires_at)
+            self._entries.move_to_end(token)
+            while len(self._entries) > app.config['AUTH_CACHE_MAX_ENTRIES']:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """只清空本程序的快取"""
+        with self._lock:
+            self._entries.clear()
+            self._version = None
+            self._checked_at = float('-inf')
+
+    def invalidate(self):
+        """使用者資料變更後呼叫，讓所有工作程序的快取失效"""
+        version = bump_cache_version(self.VERSION_NAME)
+        with self._lock:
+            self._entries.clear()
+            self._version = version
+            self._checked_at = time.monotonic()
+
+principal_cache = PrincipalCache()
+
+def _authenticate_token(token):
+    """驗證 JWT 並返回對應的 AuthPrincipal；使用者不存在時返回 None，token 無效時拋出 jwt 例外"""
+    principal = principal_cache.get(token)
+    if principal is not None:
+        return principal
+
+    data = jwt.decode(token, app.config['SECRET_KEY'], algorithms=["HS256"])
+    user = User.query.filter_by(username=data['username']).first()
+    if not user:
+        return None
+    principal = AuthPrincipal(user.id, user.username, user.role, user.is_active)
+    principal_cache.put(token, principal, data.get('exp', float('inf')))
+    return principal
+
 # --- JWT 認證裝飾器 ---
 def token_required(f):
     """JWT 認證裝飾器，用於保護需要登入才能存取的 API 路由"""
@@ -142,8 +1751,7 @@ def token_required(f):
         if not token:
             return jsonify({'message': 'Token is missing!'}), 401
         try:
-            data = jwt.decode(token, app.config['SECRET_KEY'], algorithms=["HS256"])
-            current_user = User.query.filter_by(username=data['username']).first()
+            current_user = _authenticate_token(token)
             if not current_user:
                 return jsonify({'message': 'Token is invalid!'}), 401
         except Exception as e:
@@ -161,8 +1769,7 @@ def page_auth_required(f):
         if not token:
             return redirect(url_for('login_page'))
         try:
-            data = jwt.decode(token, app.config['SECRET_KEY'], algorithms=["HS256"])
-            current_user = User.query.filter_by(username=data['username']).first()
+            current_user = _authenticate_token(token)
             if not current_user:
                 return redirect(url_for('login_page'))
         except Exception as e:
@@ -181,6 +1788,41 @@ def admin_required(f):
         return f(current_user, *args, **kwargs)
     return decorated
 
+# --- 媒體檔案服務 ---
+# 比 Flask 預設的 /static/<path> 規則更具體，因此上傳檔案由這裡處理，既有的素材網址不需變更。
+@app.route(f'/{UPLOAD_FOLDER}/<path:filename>')
+def serve_media(filename):
+    """提供上傳的媒體檔案，支援 Range 請求 (影片拖曳播放) 並設定永久快取"""
+    directory = os.path.join(app.root_path, app.config['UPLOAD_FOLDER'])
+    mode = app.config['MEDIA_SENDFILE']
+
+    if mode == 'x-accel-redirect':
+        # nginx 會自行處理 Range 與條件請求，應用程式只需確認檔案存在
+        path = safe_join(directory, filename)
+        if path is None or not os.path.isfile(path):
+            return jsonify({'success': False, 'message': '找不到檔案'}), 404
+        response = app.response_class(mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream')
+        response.headers['X-Accel-Redirect'] = app.config['MEDIA_ACCEL_REDIRECT_PREFIX'] + filename
+    else:
+        # 未使用代理時，WSGI 伺服器提供 wsgi.file_wrapper (例如 gunicorn) 即會以 sendfile 傳送整個檔案
+        try:
+            response = send_from_directory(
+                directory, filename, request.environ,
+                conditional=True,
+                max_age=app.config['MEDIA_CACHE_MAX_AGE'],
+                use_x_sendfile=(mode == 'x-sendfile'),
+                response_class=app.response_class
+            )
+        except NotFound:
+            return jsonify({'success': False, 'message': '找不到檔案'}), 404
+        # Werkzeug 只在收到 Range 請求時才加上此標頭，播放器需要先知道可以分段讀取
+        response.accept_ranges = 'bytes'
+
+    response.cache_control.public = True
+    response.cache_control.max_age = app.config['MEDIA_CACHE_MAX_AGE']
+    response.cache_control.immutable = True
+    return response
+
 # --- 頁面渲染路由 ---
 @app.route('/')
 def login_page():
@@ -210,7 +1852,7 @@ def admin_page():
 
     # 獲取所有素材和群組，並轉換為字典格式以相容舊的前端邏輯
     all_materials = Material.query.all()
-    all_groups = CarouselGroup.query.all()
+    all_groups = CarouselGroup.query.options(selectinload(CarouselGroup.image_associations)).all()
     all_assignments = Assignment.query.all()
 
     # 轉換為類似 media.json 的結構，以最大限度地減少對 admin.html 的更改
@@ -225,12 +1867,12 @@ def admin_page():
             "source": m.source
         })
     
-    for g in all_groups:
+    for group in all_groups:
         media_items.append({
-            "id": g.id,
-            "name": g.name,
+            "id": group.id,
+            "name": group.name,
             "type": 'carousel_group',
-            "image_ids": [assoc.material_id for assoc in g.image_associations]
+            "image_ids": [assoc.material_id for assoc in group.image_associations]
         })
 
     for a in all_assignments:
@@ -254,7 +1896,7 @@ def login():
     if not auth or not auth.get('username') or not auth.get('password'):
         return jsonify({'message': 'Could not verify'}), 401
     user = User.query.filter_by(username=auth.get('username')).first()
-    if not user or not check_password_hash(user.password_hash, auth.get('password')):
+    if not user or not verify_password(user.password_hash, auth.get('password')):
         return jsonify({'message': '帳號或密碼錯誤'}), 401
     
     # 檢查帳戶是否啟用
@@ -265,6 +1907,80 @@ def login():
     return jsonify({'access_token': token})
 
 # --- 受保護的管理 API ---
+SCHEDULE_FIELDS = ('starts_at', 'ends_at', 'weekdays', 'daily_start', 'daily_end')
+
+def _parse_schedule_datetime(value, field):
+    """ISO 8601 時間轉為資料庫使用的 UTC 時間；未帶時區時以 SCHEDULE_TIMEZONE 解讀"""
+    if value in (None, ''):
+        return None
+    try:
+        parsed = datetime.datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'{field} 必須是 ISO 8601 格式的時間')
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=_schedule_timezone())
+    return parsed.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+
+def _parse_daily_minutes(value, field):
+    """'HH:MM' 轉為自午夜起的分鐘數，結束時間可為 '24:00'"""
+    if value in (None, ''):
+        return None
+    match = re.fullmatch(r'(\d{1,2}):(\d{2})', str(value))
+    minutes = int(match.group(1)) * 60 + int(match.group(2)) if match and int(match.group(2)) < 60 else None
+    if minutes is None or minutes > MINUTES_PER_DAY or (minutes == MINUTES_PER_DAY and field != 'daily_end'):
+        raise ValueError(f'{field} 必須是 HH:MM 格式的時間')
+    return minutes
+
+def _parse_schedule(data):
+    """解析指派的排程欄位，只返回 data 中出現的欄位；值為空代表清除該條件。
+
+    Raises:
+        ValueError: 格式錯誤時，訊息可直接回傳給客戶端。
+    """
+    values = {}
+    for field in ('starts_at', 'ends_at'):
+        if field in data:
+            values[field] = _parse_schedule_datetime(data.get(field), field)
+    for field in ('daily_start', 'daily_end'):
+        if field in data:
+            values[field] = _parse_daily_minutes(data.get(field), field)
+    if 'weekdays' in data:
+        raw = data.get('weekdays')
+        if raw in (None, ''):
+            values['weekdays'] = None
+        else:
+            try:
+                days = {int(day) for day in (raw.split(',') if isinstance(raw, str) else raw)}
+            except (TypeError, ValueError):
+                days = set()
+            if not days or any(day < 0 or day >= WEEKDAY_COUNT for day in days):
+                raise ValueError('weekdays 必須是 0 (星期一) 到 6 (星期日) 的整數列表')
+            values['weekdays'] = sum(1 << day for day in days)
+    return values
+
+def _validate_schedule(assignment):
+    if assignment.starts_at and assignment.ends_at and assignment.starts_at >= assignment.ends_at:
+        raise ValueError('ends_at 必須晚於 starts_at')
+    if assignment.daily_start is not None and assignment.daily_start == assignment.daily_end:
+        raise ValueError('每日時段的開始與結束不能相同')
+
+def _schedule_data(assignment):
+    """指派排程的 API 表示；全天候播放的指派返回 None"""
+    if not assignment.is_scheduled:
+        return None
+    def iso(value):
+        return value.replace(tzinfo=datetime.timezone.utc).isoformat() if value else None
+    def clock(minutes):
+        return f'{minutes // 60:02d}:{minutes % 60:02d}' if minutes is not None else None
+    return {
+        'starts_at': iso(assignment.starts_at),
+        'ends_at': iso(assignment.ends_at),
+        'weekdays': [day for day in range(WEEKDAY_COUNT) if assignment.weekdays & (1 << day)]
+                    if assignment.weekdays is not None else None,
+        'daily_start': clock(assignment.daily_start),
+        'daily_end': clock(assignment.daily_end)
+    }
+
 def _create_assignment_record(data):
     """內部輔助函式，用於建立指派記錄。不執行 db.session.commit()。
 
@@ -276,13 +1992,30 @@ def _create_assignment_record(data):
     """
     section_key = data.get('section_key')
     content_type = data.get('type')
+    # 覆寫範圍：未指定時為全域指派
+    display_id = data.get('display_id') or None
+    display_group_id = data.get('display_group_id') or None
 
     if not section_key or not content_type:
         return False, '缺少必要參數'
+    if display_id and display_group_id:
+        return False, '只能指定展示螢幕或展示群組其中之一'
+    if display_id and not db.session.get(Display, display_id):
+        return False, '找不到指定的展示螢幕'
+    if display_group_id and not db.session.get(DisplayGroup, display_group_id):
+        return False, '找不到指定的展示群組'
+    scope = {'display_id': display_id, 'display_group_id': display_group_id}
+    try:
+        schedule = _parse_schedule(data)
+        _validate_schedule(Assignment(**schedule))
+    except ValueError as e:
+        return False, str(e)
+    scope.update(schedule)
 
-    # 只有在指派輪播組時，才執行覆蓋性刪除
-    if content_type == 'group_reference':
-        Assignment.query.filter_by(section_key=section_key).delete()
+    # 只有在指派全天候的輪播組時，才執行覆蓋性刪除 (只取代同一範圍內的全天候指派；排程指派與它們並存)
+    if content_type == 'group_reference' and not any(value is not None for value in schedule.values()):
+        Assignment.query.filter_by(section_key=section_key, display_id=display_id, display_group_id=display_group_id,
+                                   **{field: None for field in SCHEDULE_FIELDS}).delete()
 
     if content_type == 'group_reference':
         group_id = data.get('carousel_group_id')
@@ -294,7 +2027,8 @@ def _create_assignment_record(data):
             section_key=section_key,
             content_source_type='group_reference',
             group_id=group_id,
-            offset=offset
+            offset=offset,
+            **scope
         )
         db.session.add(new_assignment)
         return True, new_assignment
@@ -307,7 +2041,8 @@ def _create_assignment_record(data):
         new_assignment = Assignment(
             section_key=section_key,
             content_source_type='single_media',
-            media_id=media_id
+            media_id=media_id,
+            **scope
         )
         db.session.add(new_assignment)
         return True, new_assignment
@@ -325,7 +2060,8 @@ def create_assignment(current_user):
             return jsonify({'success': False, 'message': result}), 400
 
         db.session.commit()
-        socketio.emit('media_updated', {'message': '內容已成功指派！'})
+        mark_content_changed()
+        broadcast_content_change('media_updated', {'message': '內容已成功指派！'})
         return jsonify({'success': True, 'message': '指派成功'})
 
     except Exception as e:
@@ -333,22 +2069,33 @@ def create_assignment(current_user):
         print(f"建立指派時發生錯誤: {e}")
         return jsonify({'success': False, 'message': '建立指派時發生伺服器錯誤。'}), 500
 
+MATERIAL_LIST_FIELDS = ('id', 'original_filename', 'filename', 'type', 'url', 'source')
+
 @app.route('/api/materials', methods=['GET'])
+@conditional_on_content_version
 def get_materials():
-    """獲取所有媒體素材"""
+    """獲取所有媒體素材。支援 limit / cursor 分頁與 fields 欄位投影。"""
     try:
-        materials = Material.query.all()
+        limit, after_id, fields = _parse_list_params(MATERIAL_LIST_FIELDS)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+
+    try:
+        query = Material.query
+        if fields is not None:
+            query = query.options(load_only(*[getattr(Material, field) for field in fields]))
+        next_cursor = None
+        if limit is None:
+            materials = query.all()
+        else:
+            materials, next_cursor = _fetch_page(query, Material.id, limit, after_id)
+
         materials_data = []
         for material in materials:
             materials_data.append({
-                'id': material.id,
-                'original_filename': material.original_filename,
-                'filename': material.filename,
-                'type': material.type,
-                'url': material.url,
-                'source': material.source
+                field: getattr(material, field) for field in (fields or MATERIAL_LIST_FIELDS)
             })
-        return jsonify({'success': True, 'data': materials_data})
+        return _list_response(materials_data, fields, limit, next_cursor)
     except Exception as e:
         print(f"獲取素材時發生錯誤: {e}")
         return jsonify({'success': False, 'message': '獲取素材時發生伺服器錯誤。'}), 500
@@ -405,22 +2152,12 @@ def upload_material(current_user):
     if file.filename == '' or not allowed_file(file.filename):
         return jsonify({'success': False, 'message': '檔案類型不支援或未選擇檔案'}), 400
 
+    created_path = None
     try:
         original_display_filename = file.filename
         file_extension = original_display_filename.rsplit('.', 1)[1].lower()
-        media_type = 'image' if file_extension in {'png', 'jpg', 'jpeg', 'gif'} else 'video'
-        
-        # 統一使用一個 UUID 作為 ID 和檔名基礎
+        media_type = 'image' if file_extension in IMAGE_EXTENSIONS else 'video'
         material_id = str(uuid.uuid4())
-        unique_filename = f"{material_id}.{file_extension}"
-
-        new_material = Material(
-            id=material_id,
-            original_filename=original_display_filename,
-            filename=unique_filename,
-            type=media_type,
-            url=f"/{UPLOAD_FOLDER}/{unique_filename}"
-        )
 
         # 檢查是否需要同時建立指派
         section_key = request.form.get('section_key')
@@ -428,23 +2165,33 @@ def upload_material(current_user):
             assignment_data = {
                 'section_key': section_key,
                 'type': 'single_media',
-                'media_id': new_material.id  # 現在這裡有值了
+                'media_id': material_id
             }
             success, result_or_message = _create_assignment_record(assignment_data)
             if not success:
                 # 指派失敗，直接返回錯誤，不儲存任何東西
                 return jsonify({'success': False, 'message': f'素材上傳成功，但指派失敗: {result_or_message}'}), 400
 
-        # 將素材加入資料庫 session
-        db.session.add(new_material)
+        # 邊寫入邊計算雜湊，內容相同的檔案只保留一份
+        sha256, size, temp_path = _store_upload_stream(file.stream)
+        blob, created_path = _acquire_blob(sha256, size, temp_path, file_extension)
 
-        # 儲存實體檔案
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], new_material.filename)
-        os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
-        file.save(filepath)
+        new_material = Material(
+            id=material_id,
+            original_filename=original_display_filename,
+            filename=blob.filename,
+            type=media_type,
+            url=f"/{UPLOAD_FOLDER}/{blob.filename}",
+            content_hash=blob.sha256
+        )
+        db.session.add(new_material)
 
-        # 一次性提交所有變更 (素材和指派)
+        # 一次性提交所有變更 (素材、檔案參照和指派)
         db.session.commit()
+        if created_path:
+            # 檔案已由提交的記錄引用，之後發生錯誤也不可清除
+            created_path = None
+            schedule_renditions(new_material.content_hash, new_material.filename)
 
         material_data = {
             'id': new_material.id,
@@ -455,11 +2202,13 @@ def upload_material(current_user):
             'source': new_material.source
         }
 
-        socketio.emit('media_updated', {'message': '素材已成功上傳！'})
+        mark_content_changed()
+        broadcast_content_change('media_updated', {'message': '素材已成功上傳！'})
         return jsonify({'success': True, 'message': '上傳成功', 'data': material_data}), 201
 
     except Exception as e:
         db.session.rollback()
+        _remove_files([created_path])
         print(f"上傳素材時發生錯誤: {e}")
         return jsonify({'success': False, 'message': '上傳素材時發生伺服器錯誤。'}), 500
 
@@ -473,21 +2222,16 @@ def delete_material(current_user, item_id_to_delete):
         if not material_to_delete:
             return jsonify({'success': False, 'message': '找不到要刪除的素材'}), 404
 
-        # 刪除實體檔案
-        if material_to_delete.filename:
-            filepath = os.path.join(app.config['UPLOAD_FOLDER'], material_to_delete.filename)
-            if os.path.exists(filepath):
-                try:
-                    os.remove(filepath)
-                    print(f"已成功刪除實體檔案: {filepath}")
-                except OSError as e:
-                    print(f"刪除檔案時發生錯誤 {filepath}: {e}")
-        
+        # 解除檔案參照，只有最後一個參照消失時才刪除實體檔案
+        orphaned_paths = _release_material_file(material_to_delete)
+
         # 刪除資料庫記錄 (關聯的 Assignment 和 GroupImageAssociation 會自動級聯刪除)
         db.session.delete(material_to_delete)
         db.session.commit()
+        _remove_files(orphaned_paths)
 
-        socketio.emit('media_updated', {'message': '素材已刪除!'})
+        mark_content_changed()
+        broadcast_content_change('media_updated', {'message': '素材已刪除!'})
         return jsonify({'success': True, 'message': '刪除成功'})
 
     except Exception as e:
@@ -495,11 +2239,260 @@ def delete_material(current_user, item_id_to_delete):
         print(f"刪除素材時發生錯誤: {e}")
         return jsonify({'success': False, 'message': '刪除素材時發生伺服器錯誤。'}), 500
 
+# --- 可續傳的分段上傳 API ---
+# 流程：POST /api/uploads 建立上傳 → PUT /api/uploads/<id> 搭配 Content-Range 分段傳送
+# → GET /api/uploads/<id> 查詢已寫入的位移 → POST /api/uploads/<id>/complete 建立素材
+
+def _upload_session_paths(upload_id):
+    """返回上傳工作階段的 (中繼資料檔, 暫存資料檔) 路徑"""
+    folder = app.config['UPLOAD_SESSION_FOLDER']
+    return os.path.join(folder, f'{upload_id}.json'), os.path.join(folder, f'{upload_id}.part')
+
+def _load_upload_session(upload_id, current_user):
+    """讀取目前使用者建立的上傳工作階段。
+
+    不存在、ID 格式不正確或由其他使用者建立時都返回 None，不透露其他人的上傳是否存在。
+    """
+    try:
+        uuid.UUID(upload_id)
+    except ValueError:
+        return None
+    meta_path, part_path = _upload_session_paths(upload_id)
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path, 'r', encoding='utf-8') as f:
+        session = json.load(f)
+    if session.get('created_by') != current_user.username:
+        return None
+    session['offset'] = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    return session
+
+def _discard_upload_session(upload_id):
+    for path in _upload_session_paths(upload_id):
+        if os.path.exists(path):
+            os.remove(path)
+
+def _purge_expired_upload_sessions():
+    """清除超過保留時間仍未完成的上傳"""
+    folder = app.config['UPLOAD_SESSION_FOLDER']
+    expire_before = time.time() - app.config['UPLOAD_SESSION_TTL']
+    for name in os.listdir(folder):
+        path = os.path.join(folder, name)
+        if name.endswith('.json') and os.path.getmtime(path) < expire_before:
+            _discard_upload_session(name[:-len('.json')])
+
+def _upload_session_data(session):
+    return {
+        'upload_id': session['id'],
+        'filename': session['filename'],
+        'size': session['size'],
+        'offset': session['offset']
+    }
+
+@app.route('/api/uploads', methods=['POST'])
+@token_required
+def create_upload_session(current_user):
+    """建立可續傳的上傳工作階段，適合大型影片"""
+    data = request.get_json(silent=True)
+    if not data:
+        return jsonify({'success': False, 'message': '請求資料不能為空'}), 400
+
+    filename = data.get('filename')
+    size = data.get('size')
+    if not filename or not allowed_file(filename):
+        return jsonify({'success': False, 'message': '檔案類型不支援或未提供檔名'}), 400
+    if not isinstance(size, int) or size <= 0 or size > app.config['MAX_RESUMABLE_UPLOAD_SIZE']:
+        return jsonify({'success': False, 'message': '檔案大小無效'}), 400
+
+    try:
+        os.makedirs(app.config['UPLOAD_SESSION_FOLDER'], exist_ok=True)
+        _purge_expired_upload_sessions()
+
+        session = {
+            'id': str(uuid.uuid4()),
+            'filename': filename,
+            'size': size,
+            'section_key': data.get('section_key'),
+            'created_by': current_user.username
+        }
+        meta_path, part_path = _upload_session_paths(session['id'])
+        with open(meta_path, 'w', encoding='utf-8') as f:
+            json.dump(session, f)
+        open(part_path, 'wb').close()
+        session['offset'] = 0
+
+        response = jsonify({'success': True, 'message': '上傳工作階段已建立', 'data': _upload_session_data(session)})
+        response.headers['Location'] = url_for('get_upload_session', upload_id=session['id'])
+        return response, 201
+    except Exception as e:
+        print(f"建立上傳工作階段時發生錯誤: {e}")
+        return jsonify({'success': False, 'message': '建立上傳工作階段時發生伺服器錯誤。'}), 500
+
+@app.route('/api/uploads/<upload_id>', methods=['GET'])
+@token_required
+def get_upload_session(current_user, upload_id):
+    """查詢上傳工作階段目前已寫入的位移，用於中斷後續傳"""
+    session = _load_upload_session(upload_id, current_user)
+    if not session:
+        return jsonify({'success': False, 'message': '找不到指定的上傳'}), 404
+    return jsonify({'success': True, 'data': _upload_session_data(session)})
+
+@app.route('/api/uploads/<upload_id>', methods=['PUT'])
+@token_required
+def upload_session_chunk(current_user, upload_id):
+    """寫入一段檔案內容，需以 Content-Range: bytes <start>-<end>/<size> 標示位置。
+
+    起始位置不可超過目前已寫入的位移；允許與已寫入的範圍重疊，方便客戶端重送逾時的分段。
+    """
+    session = _load_upload_session(upload_id, current_user)
+    if not session:
+        return jsonify({'success': False, 'message': '找不到指定的上傳'}), 404
+
+    content_range = parse_content_range_header(request.headers.get('Content-Range'))
+    if content_range is None or content_range.units != 'bytes' or content_range.length != session['size']:
+        return jsonify({'success': False, 'message': '缺少或無效的 Content-Range 標頭'}), 400
+
+    start, stop = content_range.start, content_range.stop
+    if start > session['offset']:
+        # 中間有缺漏的範圍，告知客戶端從目前位移續傳
+        return jsonify({'success': False, 'message': '分段起始位置與已上傳的位移不符',
+                        'data': _upload_session_data(session)}), 409
+    if request.content_length is not None and request.content_length != stop - start:
+        return jsonify({'success': False, 'message': '分段長度與 Content-Range 不符'}), 400
+
+    try:
+        _, part_path = _upload_session_paths(upload_id)
+        remaining = stop - start
+        with open(part_path, 'r+b') as f:
+            f.seek(start)
+            while remaining > 0:
+                chunk = request.stream.read(min(UPLOAD_STREAM_CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                f.write(chunk)
+                remaining -= len(chunk)
+        session['offset'] = os.path.getsize(part_path)
+        if remaining > 0:
+            return jsonify({'success': False, 'message': '分段內容不完整，請從目前位移續傳',
+                            'data': _upload_session_data(session)}), 400
+        return jsonify({'success': True, 'data': _upload_session_data(session)})
+    except Exception as e:
+        print(f"寫入上傳分段時發生錯誤: {e}")
+        return jsonify({'success': False, 'message': '寫入上傳分段時發生伺服器錯誤。'}), 500
+
+@app.route('/api/uploads/<upload_id>/complete', methods=['POST'])
+@token_required
+def complete_upload_session(current_user, upload_id):
+    """所有分段都寫入後，建立素材記錄 (及選擇性的指派)"""
+    session = _load_upload_session(upload_id, current_user)
+    if not session:
+        return jsonify({'success': False, 'message': '找不到指定的上傳'}), 404
+    if session['offset'] != session['size']:
+        return jsonify({'success': False, 'message': '檔案尚未上傳完成',
+                        'data': _upload_session_data(session)}), 409
+
+    created_path = None
+    try:
+        file_extension = session['filename'].rsplit('.', 1)[1].lower()
+        material_id = str(uuid.uuid4())
+
+        if session.get('section_key'):
+            success, result_or_message = _create_assignment_record({
+                'section_key': session['section_key'],
+                'type': 'single_media',
+                'media_id': material_id
+            })
+            if not success:
+                db.session.rollback()
+                return jsonify({'success': False, 'message': f'指派失敗: {result_or_message}'}), 400
+
+        # 分段可能重疊或重傳，因此在完成時對整個檔案計算雜湊
+        _, part_path = _upload_session_paths(upload_id)
+        sha256, size = run_cpu_bound(_hash_file, part_path)
+        os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=app.config['UPLOAD_FOLDER'], suffix='.uploading')
+        os.close(fd)
+        os.replace(part_path, temp_path)
+        try:
+            blob, created_path = _acquire_blob(sha256, size, temp_path, file_extension)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.replace(temp_path, part_path)
+            raise
+
+        new_material = Material(
+            id=material_id,
+            original_filename=session['filename'],
+            filename=blob.filename,
+            type='image' if file_extension in IMAGE_EXTENSIONS else 'video',
+            url=f"/{UPLOAD_FOLDER}/{blob.filename}",
+            content_hash=blob.sha256
+        )
+        db.session.add(new_material)
+
+        db.session.commit()
+        _discard_upload_session(upload_id)
+        if created_path:
+            # 檔案已由提交的記錄引用，之後發生錯誤也不可清除
+            created_path = None
+            schedule_renditions(new_material.content_hash, new_material.filename)
+
+        material_data = {
+            'id': new_material.id,
+            'original_filename': new_material.original_filename,
+            'filename': new_material.filename,
+            'type': new_material.type,
+            'url': new_material.url,
+            'source': new_material.source
+        }
+
+        mark_content_changed()
+        broadcast_content_change('media_updated', {'message': '素材已成功上傳！'})
+        return jsonify({'success': True, 'message': '上傳成功', 'data': material_data}), 201
+    except Exception as e:
+        db.session.rollback()
+        # 提交失敗時把新建立的檔案移回暫存區，讓客戶端可以再次完成
+        if created_path and os.path.exists(created_path):
+            os.replace(created_path, _upload_session_paths(upload_id)[1])
+        print(f"完成上傳時發生錯誤: {e}")
+        return jsonify({'success': False, 'message': '完成上傳時發生伺服器錯誤。'}), 500
+
+@app.route('/api/uploads/<upload_id>', methods=['DELETE'])
+@token_required
+def abort_upload_session(current_user, upload_id):
+    """放棄上傳並刪除暫存檔"""
+    session = _load_upload_session(upload_id, current_user)
+    if not session:
+        return jsonify({'success': False, 'message': '找不到指定的上傳'}), 404
+    _discard_upload_session(upload_id)
+    return jsonify({'success': True, 'message': '上傳已取消'})
+
+ASSIGNMENT_LIST_FIELDS = ('id', 'section_key', 'content_source_type', 'offset', 'media_id', 'group_id',
+                          'display_id', 'display_group_id', 'schedule', 'material', 'group')
+
 @app.route('/api/assignments', methods=['GET'])
+@conditional_on_content_version
 def get_assignments():
-    """獲取所有內容指派"""
+    """獲取所有內容指派。支援 limit / cursor 分頁與 fields 欄位投影。"""
     try:
-        assignments = Assignment.query.all()
+        limit, after_id, fields = _parse_list_params(ASSIGNMENT_LIST_FIELDS)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+
+    try:
+        # 只預先載入投影後仍需要的關聯
+        options = []
+        if fields is None or 'material' in fields:
+            options.append(selectinload(Assignment.material))
+        if fields is None or 'group' in fields:
+            options.append(selectinload(Assignment.carousel_group))
+        query = Assignment.query.options(*options)
+        next_cursor = None
+        if limit is None:
+            assignments = query.all()
+        else:
+            assignments, next_cursor = _fetch_page(query, Assignment.id, limit, after_id)
+
         assignments_data = []
         for assignment in assignments:
             assignment_data = {
@@ -508,11 +2501,14 @@ def get_assignments():
                 'content_source_type': assignment.content_source_type,
                 'offset': assignment.offset,
                 'media_id': assignment.media_id,
-                'group_id': assignment.group_id
+                'group_id': assignment.group_id,
+                'display_id': assignment.display_id,
+                'display_group_id': assignment.display_group_id,
+                'schedule': _schedule_data(assignment)
             }
             
             # 添加相關資料
-            if assignment.material:
+            if (fields is None or 'material' in fields) and assignment.material:
                 assignment_data['material'] = {
                     'id': assignment.material.id,
                     'original_filename': assignment.material.original_filename,
@@ -520,7 +2516,7 @@ def get_assignments():
                     'url': assignment.material.url
                 }
             
-            if assignment.carousel_group:
+            if (fields is None or 'group' in fields) and assignment.carousel_group:
                 assignment_data['group'] = {
                     'id': assignment.carousel_group.id,
                     'name': assignment.carousel_group.name
@@ -528,7 +2524,7 @@ def get_assignments():
                 
             assignments_data.append(assignment_data)
             
-        return jsonify({'success': True, 'data': assignments_data})
+        return _list_response(assignments_data, fields, limit, next_cursor)
     except Exception as e:
         print(f"獲取指派時發生錯誤: {e}")
         return jsonify({'success': False, 'message': '獲取指派時發生伺服器錯誤。'}), 500
@@ -547,7 +2543,10 @@ def get_assignment(assignment_id):
             'content_source_type': assignment.content_source_type,
             'offset': assignment.offset,
             'media_id': assignment.media_id,
-            'group_id': assignment.group_id
+            'group_id': assignment.group_id,
+            'display_id': assignment.display_id,
+            'display_group_id': assignment.display_group_id,
+            'schedule': _schedule_data(assignment)
         }
         
         # 添加相關資料
@@ -564,7 +2563,7 @@ def get_assignment(assignment_id):
             assignment_data['group'] = {
                 'id': assignment.carousel_group.id,
                 'name': assignment.carousel_group.name,
-                'image_count': len(list(assignment.carousel_group.image_associations))
+                'image_count': len(assignment.carousel_group.image_associations)
             }
             
         return jsonify({'success': True, 'data': assignment_data})
@@ -598,6 +2597,13 @@ def update_assignment(current_user, assignment_id):
             assignment.group_id = data['group_id']
             assignment.media_id = None  # 清除媒體關聯
             assignment.content_source_type = 'group_reference'
+        try:
+            for field, value in _parse_schedule(data).items():
+                setattr(assignment, field, value)
+            _validate_schedule(assignment)
+        except ValueError as e:
+            db.session.rollback()
+            return jsonify({'success': False, 'message': str(e)}), 400
             
         db.session.commit()
         
@@ -607,10 +2613,14 @@ def update_assignment(current_user, assignment_id):
             'content_source_type': assignment.content_source_type,
             'offset': assignment.offset,
             'media_id': assignment.media_id,
-            'group_id': assignment.group_id
+            'group_id': assignment.group_id,
+            'display_id': assignment.display_id,
+            'display_group_id': assignment.display_group_id,
+            'schedule': _schedule_data(assignment)
         }
         
-        socketio.emit('media_updated', {'message': '指派已更新!'})
+        mark_content_changed()
+        broadcast_content_change('media_updated', {'message': '指派已更新!'})
         return jsonify({'success': True, 'message': '指派更新成功', 'data': assignment_data})
     except Exception as e:
         db.session.rollback()
@@ -629,7 +2639,8 @@ def delete_assignment(current_user, assignment_id_to_delete):
         db.session.delete(assignment_to_delete)
         db.session.commit()
 
-        socketio.emit('media_updated', {'message': '指派已刪除!'})
+        mark_content_changed()
+        broadcast_content_change('media_updated', {'message': '指派已刪除!'})
         return jsonify({'success': True, 'message': '刪除成功'})
 
     except Exception as e:
@@ -637,8 +2648,35 @@ def delete_assignment(current_user, assignment_id_to_delete):
         print(f"刪除指派時發生錯誤: {e}")
         return jsonify({'success': False, 'message': '刪除指派時發生伺服器錯誤。'}), 500
 
+@app.route('/api/schedule', methods=['GET'])
+@token_required
+def get_schedule(current_user):
+    """預覽指定時間 (?at=ISO 8601，預設為現在) 生效的排程指派與下一次切換時間"""
+    try:
+        at = _parse_schedule_datetime(request.args.get('at'), 'at')
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+
+    try:
+        timestamp = _utc_timestamp(at) if at else time.time()
+        index = display_catalog_snapshot().payload['schedule']
+        if not index.covers(timestamp):
+            # 超出目前索引範圍 (例如預覽下個月)，另外建立一份從該時間開始的索引
+            index = build_schedule_index(Assignment.query.all(), timestamp)
+        next_transition = index.next_transition(timestamp)
+        return jsonify({'success': True, 'data': {
+            'at': datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc).isoformat(),
+            'active_assignment_ids': sorted(index.active_at(timestamp)),
+            'next_transition': datetime.datetime.fromtimestamp(next_transition, datetime.timezone.utc).isoformat()
+                               if next_transition is not None else None
+        }})
+    except Exception as e:
+        print(f"預覽排程時發生錯誤: {e}")
+        return jsonify({'success': False, 'message': '預覽排程時發生伺服器錯誤。'}), 500
+
 # --- Settings API ---
 @app.route('/api/settings', methods=['GET'])
+@conditional_on_content_version
 def get_settings():
     """獲取所有設定"""
     try:
@@ -671,7 +2709,8 @@ def update_settings(current_user):
         db.session.commit()
         
         # 通知前端更新
-        socketio.emit('settings_updated', data)
+        mark_content_changed()
+        broadcast_content_change('settings_updated', data)
         return jsonify({'success': True, 'message': '設定已成功儲存！'})
     except (ValueError, TypeError):
         db.session.rollback()
@@ -689,20 +2728,38 @@ def update_global_settings_legacy(current_user):
     return update_settings(current_user)
 
 # --- Groups API ---
+GROUP_LIST_FIELDS = ('id', 'name', 'image_ids', 'image_count')
+
 @app.route('/api/groups', methods=['GET'])
+@conditional_on_content_version
 def get_groups():
-    """獲取所有輪播群組"""
+    """獲取所有輪播群組。支援 limit / cursor 分頁與 fields 欄位投影。"""
+    try:
+        limit, after_id, fields = _parse_list_params(GROUP_LIST_FIELDS)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+
     try:
-        groups = CarouselGroup.query.all()
+        # 只有需要圖片資訊時才載入群組與圖片的關聯
+        include_images = fields is None or 'image_ids' in fields or 'image_count' in fields
+        query = CarouselGroup.query
+        if include_images:
+            query = query.options(selectinload(CarouselGroup.image_associations))
+        next_cursor = None
+        if limit is None:
+            groups = query.all()
+        else:
+            groups, next_cursor = _fetch_page(query, CarouselGroup.id, limit, after_id)
+
         groups_data = []
         for group in groups:
-            groups_data.append({
-                'id': group.id,
-                'name': group.name,
-                'image_ids': [assoc.material_id for assoc in group.image_associations],
-                'image_count': len(list(group.image_associations))
-            })
-        return jsonify({'success': True, 'data': groups_data})
+            group_data = {'id': group.id, 'name': group.name}
+            if include_images:
+                image_ids = [assoc.material_id for assoc in group.image_associations]
+                group_data['image_ids'] = image_ids
+                group_data['image_count'] = len(image_ids)
+            groups_data.append(group_data)
+        return _list_response(groups_data, fields, limit, next_cursor)
     except Exception as e:
         print(f"獲取群組時發生錯誤: {e}")
         return jsonify({'success': False, 'message': '獲取群組時發生伺服器錯誤。'}), 500
@@ -711,7 +2768,9 @@ def get_groups():
 def get_group(group_id):
     """獲取單個輪播群組詳細資訊"""
     try:
-        group = db.session.get(CarouselGroup, group_id)
+        group = db.session.get(CarouselGroup, group_id, options=[
+            selectinload(CarouselGroup.image_associations).joinedload(GroupImageAssociation.material)
+        ])
         if not group:
             return jsonify({'success': False, 'message': '找不到指定的群組'}), 404
             
@@ -764,7 +2823,8 @@ def create_group(current_user):
             'image_count': 0
         }
         
-        socketio.emit('media_updated', {'message': '群組已建立!'})
+        mark_content_changed()
+        broadcast_content_change('media_updated', {'message': '群組已建立!'})
         return jsonify({'success': True, 'message': '群組建立成功', 'data': group_data}), 201
     except Exception as e:
         db.session.rollback()
@@ -794,10 +2854,11 @@ def update_group(current_user, group_id):
             'id': group.id,
             'name': group.name,
             'image_ids': [assoc.material_id for assoc in group.image_associations],
-            'image_count': len(list(group.image_associations))
+            'image_count': len(group.image_associations)
         }
         
-        socketio.emit('media_updated', {'message': '群組資訊已更新!'})
+        mark_content_changed()
+        broadcast_content_change('media_updated', {'message': '群組資訊已更新!'})
         return jsonify({'success': True, 'message': '群組更新成功', 'data': group_data})
     except Exception as e:
         db.session.rollback()
@@ -819,23 +2880,19 @@ def delete_group(current_user, group_id):
             Material.source == 'group_specific',
             Material.id.in_(material_ids_in_group)
         ).all()
+        orphaned_paths = []
         for image_item in group_specific_images:
-            if image_item.filename:
-                filepath = os.path.join(app.config['UPLOAD_FOLDER'], image_item.filename)
-                if os.path.exists(filepath):
-                    try:
-                        os.remove(filepath)
-                        print(f"已刪除群組專屬圖片檔案: {filepath}")
-                    except OSError as e:
-                        print(f"刪除群組專屬圖片檔案時發生錯誤 {filepath}: {e}")
+            orphaned_paths.extend(_release_material_file(image_item))
             # 從資料庫刪除圖片記錄
             db.session.delete(image_item)
 
         # 刪除群組本身 (關聯的 Assignment 和 GroupImageAssociation 會自動級聯刪除)
         db.session.delete(group_to_delete)
         db.session.commit()
+        _remove_files(orphaned_paths)
         
-        socketio.emit('media_updated', {'message': '群組及其專屬圖片已刪除！'})
+        mark_content_changed()
+        broadcast_content_change('media_updated', {'message': '群組及其專屬圖片已刪除！'})
         return jsonify({'success': True, 'message': '群組刪除成功'})
     except Exception as e:
         db.session.rollback()
@@ -852,11 +2909,19 @@ def create_carousel_group_legacy(current_user):
 @app.route('/api/groups/<group_id>/images', methods=['POST'])
 @token_required
 def upload_group_images(current_user, group_id):
-    """上傳圖片到指定群組"""
+    """
+    上傳多張圖片到指定群組。
+
+    所有檔案同時在執行緒池中寫入上傳目錄並計算雜湊，接著以批次 INSERT 寫入素材與群組關聯，
+    完成後只廣播一次。副檔名、類型或大小不符的檔案會被略過，列在回應的 skipped 中。
+    """
+    created_paths = []
+    temp_paths = []
     try:
         group = db.session.get(CarouselGroup, group_id)
         if not group:
             return jsonify({'success': False, 'message': '找不到指定的群組'}), 404
+        group_name = group.name
 
         if 'files' not in request.files:
             return jsonify({'success': False, 'message': '沒有選擇檔案'}), 400
@@ -865,100 +2930,245 @@ def upload_group_images(current_user, group_id):
         if not files or all(file.filename == '' for file in files):
             return jsonify({'success': False, 'message': '沒有選擇有效的檔案'}), 400
 
-        uploaded_image_objects = []
-        
+        accepted = []
+        skipped = []
         for file in files:
-            if file and file.filename != '' and allowed_file(file.filename):
-                file_extension = file.filename.rsplit('.', 1)[1].lower()
-                if file_extension not in {'png', 'jpg', 'jpeg', 'gif'}: continue
-
-                new_material_id = str(uuid.uuid4())
-                unique_filename = f"{new_material_id}.{file_extension}"
-                filepath = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
-                os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
-                file.save(filepath)
-
-                new_material = Material(
-                    id=new_material_id,
-                    original_filename=file.filename,
-                    filename=unique_filename,
-                    type='image',
-                    source='group_specific',
-                    url=f"/{UPLOAD_FOLDER}/{unique_filename}"
-                )
-                db.session.add(new_material)
-
-                # 將新圖片加入到群組的末尾
-                max_order = db.session.query(db.func.max(GroupImageAssociation.order)).filter_by(group_id=group_id).scalar() or -1
-                new_assoc = GroupImageAssociation(group_id=group_id, material_id=new_material_id, order=max_order + 1)
-                db.session.add(new_assoc)
-
-                uploaded_image_objects.append({
-                    "id": new_material.id,
-                    "original_filename": new_material.original_filename,
-                    "filename": new_material.filename,
-                    "type": new_material.type,
-                    "source": new_material.source,
-                    "group_id": group_id,
-                    "group_name": group.name,
-                    "url": new_material.url
-                })
-        
-        if uploaded_image_objects:
-            db.session.commit()
-            return jsonify({
-                'success': True, 
-                'message': f'成功上傳 {len(uploaded_image_objects)} 張圖片',
-                'data': uploaded_image_objects
-            }), 201
-        else:
-            return jsonify({'success': False, 'message': '沒有成功上傳任何圖片，請檢查檔案格式'}), 400
-            
+            if not file or file.filename == '':
+                continue
+            extension = file.filename.rsplit('.', 1)[1].lower() if '.' in file.filename else ''
+            if not allowed_file(file.filename) or extension not in IMAGE_EXTENSIONS:
+                skipped.append({'filename': file.filename, 'message': '不支援的檔案格式'})
+            elif file.mimetype and not file.mimetype.startswith('image/') and file.mimetype != 'application/octet-stream':
+                skipped.append({'filename': file.filename, 'message': f'檔案類型 {file.mimetype} 不是圖片'})
+            else:
+                accepted.append((file, extension))
+
+        stored = []
+        failure = None
+        results = _store_uploaded_files([file for file, _ in accepted], app.config['MAX_GROUP_IMAGE_SIZE'])
+        for (file, extension), result in zip(accepted, results):
+            if isinstance(result, ValueError):
+                skipped.append({'filename': file.filename, 'message': str(result)})
+            elif isinstance(result, Exception):
+                failure = failure or result
+            else:
+                sha256, size, temp_path = result
+                temp_paths.append(temp_path)
+                stored.append((file.filename, (sha256, size, temp_path, extension)))
+        if failure is not None:
+            raise failure
+
+        if not stored:
+            return jsonify({'success': False, 'message': '沒有成功上傳任何圖片，請檢查檔案格式', 'skipped': skipped}), 400
+
+        filenames, created_paths, new_blobs = _acquire_blobs([blob_args for _, blob_args in stored])
+        temp_paths = []  # 暫存檔都已移到正式位置或刪除
+
+        # 一次計算群組末尾的排序鍵，新圖片依上傳順序接在後面
+        base_order = _next_group_order(group_id)
+        material_rows = []
+        association_rows = []
+        for index, (original_filename, (sha256, _size, _temp_path, _extension)) in enumerate(stored):
+            material_id = str(uuid.uuid4())
+            material_rows.append({
+                'id': material_id,
+                'original_filename': original_filename,
+                'filename': filenames[sha256],
+                'type': 'image',
+                'source': 'group_specific',
+                'url': f"/{UPLOAD_FOLDER}/{filenames[sha256]}",
+                'content_hash': sha256
+            })
+            association_rows.append({'group_id': group_id, 'material_id': material_id,
+                                     'order': base_order + index * GROUP_ORDER_GAP})
+        db.session.execute(insert(Material), material_rows)
+        db.session.execute(insert(GroupImageAssociation), association_rows)
+        db.session.commit()
+        created_paths = []  # 檔案已由提交的記錄引用，之後發生錯誤也不可清除
+
+        for sha256, filename in new_blobs:
+            schedule_renditions(sha256, filename)
+        mark_content_changed()
+        broadcast_content_change('media_updated', {'message': f'已上傳 {len(material_rows)} 張圖片到群組 {group_name}'})
+
+        uploaded_image_objects = [{
+            "id": row['id'],
+            "original_filename": row['original_filename'],
+            "filename": row['filename'],
+            "type": row['type'],
+            "source": row['source'],
+            "group_id": group_id,
+            "group_name": group_name,
+            "url": row['url']
+        } for row in material_rows]
+        return jsonify({
+            'success': True,
+            'message': f'成功上傳 {len(uploaded_image_objects)} 張圖片',
+            'data': uploaded_image_objects,
+            'skipped': skipped
+        }), 201
+
     except Exception as e:
         db.session.rollback()
+        _remove_files(created_paths + temp_paths)
         print(f"群組上傳圖片時發生錯誤: {str(e)}")
         return jsonify({'success': False, 'message': f'上傳失敗: {str(e)}'}), 500
 
 @app.route('/api/groups/<group_id>/images', methods=['PUT'])
 @token_required
 def update_group_images(current_user, group_id):
-    """更新群組中圖片的順序"""
+    """
+    更新群組中圖片的順序。
+
+    預設為差異模式 (mode='diff')：只刪除移出群組的關聯、新增加入的關聯，並保留目前順序中最長的遞增子序列，
+    只改寫其餘位置改變的關聯 (見 plan_group_order)；順序未變時不寫入也不廣播。
+    mode='replace' 則刪除全部關聯後一次批次寫入，適合整個順序都改變的情況。
+    不存在的圖片ID會被略過，重複的ID只保留第一次出現的位置。
+    只移動一張圖片時請改用 move_group_image，不必傳送整個列表。
+    """
     data = request.get_json()
     if not data or 'image_ids' not in data:
         return jsonify({'success': False, 'message': '請求無效，缺少 image_ids 參數'}), 400
+    mode = data.get('mode', 'diff')
+    if mode not in ('diff', 'replace'):
+        return jsonify({'success': False, 'message': 'mode 必須是 diff 或 replace'}), 400
 
     try:
         group = db.session.get(CarouselGroup, group_id)
         if not group:
             return jsonify({'success': False, 'message': '找不到群組'}), 404
-
-        # 刪除舊的關聯
-        GroupImageAssociation.query.filter_by(group_id=group_id).delete()
-
-        # 建立新的關聯，並儲存順序
-        for index, image_id in enumerate(data['image_ids']):
-            # 確保圖片存在
-            if db.session.get(Material, image_id):
-                new_assoc = GroupImageAssociation(group_id=group_id, material_id=image_id, order=index)
-                db.session.add(new_assoc)
-        
+        group_name = group.name
+
+        # 以單一 IN 查詢確認圖片存在
+        requested_ids = list(dict.fromkeys(data['image_ids']))
+        existing_ids = set()
+        if requested_ids:
+            existing_ids = {row[0] for row in db.session.query(Material.id).filter(Material.id.in_(requested_ids))}
+        image_ids = [image_id for image_id in requested_ids if image_id in existing_ids]
+
+        if mode == 'replace':
+            new_orders = {image_id: (index + 1) * GROUP_ORDER_GAP for index, image_id in enumerate(image_ids)}
+            GroupImageAssociation.query.filter_by(group_id=group_id).delete()
+            inserted = [{'group_id': group_id, 'material_id': image_id, 'order': order}
+                        for image_id, order in new_orders.items()]
+            moved, removed = [], []
+        else:
+            current_orders = dict(db.session.query(GroupImageAssociation.material_id, GroupImageAssociation.order)
+                                  .filter_by(group_id=group_id).all())
+            kept_ids = set(image_ids)
+            removed = [image_id for image_id in current_orders if image_id not in kept_ids]
+            # 只有被移動與新加入的圖片取得新的排序鍵，順序未變的圖片不會改寫
+            new_orders = plan_group_order(image_ids, current_orders)
+            inserted = [{'group_id': group_id, 'material_id': image_id, 'order': order}
+                        for image_id, order in new_orders.items() if image_id not in current_orders]
+            moved = [{'group_id': group_id, 'material_id': image_id, 'order': order}
+                     for image_id, order in new_orders.items() if image_id in current_orders]
+            if removed:
+                GroupImageAssociation.query.filter(
+                    GroupImageAssociation.group_id == group_id,
+                    GroupImageAssociation.material_id.in_(removed)
+                ).delete(synchronize_session=False)
+
+        if moved:
+            db.session.execute(update(GroupImageAssociation), moved)
+        if inserted:
+            db.session.execute(insert(GroupImageAssociation), inserted)
         db.session.commit()
         
         # 獲取更新後的群組資訊
         updated_group_data = {
-            'id': group.id,
-            'name': group.name,
-            'image_ids': data['image_ids'],
-            'image_count': len(data['image_ids'])
+            'id': group_id,
+            'name': group_name,
+            'image_ids': image_ids,
+            'image_count': len(image_ids),
+            'changes': {'inserted': len(inserted), 'moved': len(moved), 'removed': len(removed)}
         }
         
-        socketio.emit('media_updated', {'message': '圖片順序已更新!'})
+        if inserted or moved or removed:
+            mark_content_changed()
+            broadcast_content_change('media_updated', {'message': '圖片順序已更新!'})
         return jsonify({'success': True, 'message': '圖片順序已儲存', 'data': updated_group_data})
     except Exception as e:
         db.session.rollback()
         print(f"更新群組圖片時發生錯誤: {e}")
         return jsonify({'success': False, 'message': '更新群組圖片時發生伺服器錯誤。'}), 500
 
+@app.route('/api/groups/<group_id>/images/<image_id>/move', methods=['POST'])
+@token_required
+def move_group_image(current_user, group_id, image_id):
+    """
+    把一張圖片移到群組中的指定位置；圖片尚未在群組中時則插入該位置。
+
+    JSON 參數擇一指定：before_id (放在該圖片之前)、after_id (放在該圖片之後)、
+    position ('first' 或 'last')，都未指定時放到末尾。
+    只改寫被移動的那一筆關聯，成本與群組大小無關；多位編輯者同時移動不同圖片時也不會互相覆蓋。
+    """
+    data = request.get_json(silent=True) or {}
+    before_id = data.get('before_id')
+    after_id = data.get('after_id')
+    position = data.get('position')
+    if sum(value is not None for value in (before_id, after_id, position)) > 1:
+        return jsonify({'success': False, 'message': 'before_id、after_id 與 position 只能指定一個'}), 400
+    if position not in (None, 'first', 'last'):
+        return jsonify({'success': False, 'message': 'position 必須是 first 或 last'}), 400
+    if image_id in (before_id, after_id):
+        return jsonify({'success': False, 'message': '不能以圖片本身作為參考位置'}), 400
+
+    try:
+        if not db.session.get(CarouselGroup, group_id):
+            return jsonify({'success': False, 'message': '找不到群組'}), 404
+
+        assoc = db.session.get(GroupImageAssociation, (group_id, image_id))
+        if assoc is None and not db.session.get(Material, image_id):
+            return jsonify({'success': False, 'message': '找不到圖片'}), 404
+
+        anchor = None
+        anchor_id = before_id or after_id
+        if anchor_id is not None:
+            anchor = db.session.get(GroupImageAssociation, (group_id, anchor_id))
+            if anchor is None:
+                return jsonify({'success': False, 'message': '參考圖片不在群組中'}), 404
+        place = 'before' if before_id is not None or position == 'first' else 'after'
+
+        lower, upper = _group_order_bounds(group_id, image_id, anchor, place)
+        if assoc is not None and (lower is None or lower < assoc.order) and (upper is None or assoc.order < upper):
+            # 已經在目標位置
+            return jsonify({'success': True, 'message': '圖片已在指定位置', 'data': {
+                'image_id': image_id, 'order': assoc.order, 'inserted': False
+            }})
+
+        order = _order_key_between(lower, upper)
+        if order is None:
+            # 前後兩張之間沒有空位，先就地重新編號再重新計算
+            renumber_group_images(group_id)
+            db.session.expire_all()
+            assoc = db.session.get(GroupImageAssociation, (group_id, image_id))
+            if anchor_id is not None:
+                anchor = db.session.get(GroupImageAssociation, (group_id, anchor_id))
+            lower, upper = _group_order_bounds(group_id, image_id, anchor, place)
+            order = _order_key_between(lower, upper)
+
+        inserted = assoc is None
+        if inserted:
+            db.session.add(GroupImageAssociation(group_id=group_id, material_id=image_id, order=order))
+        else:
+            assoc.order = order
+        db.session.commit()
+
+        # 與相鄰圖片只差 1 時，下一次插入同一位置就沒有空位，趁現在於背景重新編號
+        if (lower is not None and order - lower <= 1) or (upper is not None and upper - order <= 1):
+            schedule_group_renumber(group_id)
+
+        mark_content_changed()
+        broadcast_content_change('media_updated', {'message': '圖片順序已更新!'})
+        return jsonify({'success': True, 'message': '圖片順序已儲存', 'data': {
+            'image_id': image_id, 'order': order, 'inserted': inserted
+        }})
+    except Exception as e:
+        db.session.rollback()
+        print(f"移動群組圖片時發生錯誤: {e}")
+        return jsonify({'success': False, 'message': '移動群組圖片時發生伺服器錯誤。'}), 500
+
 # --- 向後兼容的舊端點 ---
 @app.route('/admin/carousel_group/delete/<group_id_to_delete>', methods=['POST'])
 @token_required
@@ -978,6 +3188,209 @@ def update_carousel_group_images_legacy(current_user, group_id):
     """向後兼容的群組圖片順序更新端點"""
     return update_group_images(current_user, group_id)
 
+# --- 展示螢幕 API ---
+# 螢幕識別碼會出現在網址與 Socket.IO 房間名稱中，限制為英數字、底線與連字號
+DISPLAY_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+DISPLAY_LIST_FIELDS = ('id', 'name', 'group_id')
+
+def _display_data(display):
+    return {'id': display.id, 'name': display.name, 'group_id': display.group_id}
+
+def notify_display_reconfigured(display_ids):
+    """通知螢幕其登記或所屬群組已改變，展示頁會重新連線以加入正確的房間並重新抓取內容"""
+    for display_id in display_ids:
+        emit_event('display_reconfigured', {'display_id': display_id}, to=display_room(display_id))
+
+@app.route('/api/displays', methods=['GET'])
+@conditional_on_content_version
+def get_displays():
+    """獲取所有已登記的展示螢幕。支援 limit / cursor 分頁與 fields 欄位投影。"""
+    try:
+        limit, after_id, fields = _parse_list_params(DISPLAY_LIST_FIELDS)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+
+    try:
+        next_cursor = None
+        if limit is None:
+            displays = Display.query.all()
+        else:
+            displays, next_cursor = _fetch_page(Display.query, Display.id, limit, after_id)
+        return _list_response([_display_data(display) for display in displays], fields, limit, next_cursor)
+    except Exception as e:
+        print(f"獲取展示螢幕時發生錯誤: {e}")
+        return jsonify({'success': False, 'message': '獲取展示螢幕時發生伺服器錯誤。'}), 500
+
+@app.route('/api/displays', methods=['POST'])
+@token_required
+def create_display(current_user):
+    """登記展示螢幕"""
+    data = request.json
+    if not data or not data.get('id') or not data.get('name'):
+        return jsonify({'success': False, 'message': '缺少螢幕識別碼或名稱'}), 400
+    display_id = str(data['id'])
+    if not DISPLAY_ID_PATTERN.match(display_id):
+        return jsonify({'success': False, 'message': '螢幕識別碼只能包含英數字、底線與連字號 (最多 64 字元)'}), 400
+
+    try:
+        if db.session.get(Display, display_id):
+            return jsonify({'success': False, 'message': '螢幕識別碼已存在'}), 409
+        group_id = data.get('group_id') or None
+        if group_id and not db.session.get(DisplayGroup, group_id):
+            return jsonify({'success': False, 'message': '找不到指定的展示群組'}), 404
+
+        display = Display(id=display_id, name=data['name'], group_id=group_id)
+        db.session.add(display)
+        db.session.commit()
+
+        mark_content_changed()
+        broadcast_content_change('media_updated', {'message': f'已登記展示螢幕 {display.name}'})
+        notify_display_reconfigured([display_id])
+        return jsonify({'success': True, 'message': '展示螢幕登記成功', 'data': _display_data(display)}), 201
+    except Exception as e:
+        db.session.rollback()
+        print(f"登記展示螢幕時發生錯誤: {e}")
+        return jsonify({'success': False, 'message': '登記展示螢幕時發生伺服器錯誤。'}), 500
+
+@app.route('/api/displays/<display_id>', methods=['PUT'])
+@token_required
+def update_display(current_user, display_id):
+    """更新展示螢幕的名稱或所屬群組"""
+    data = request.json
+    if not data:
+        return jsonify({'success': False, 'message': '請求資料不能為空'}), 400
+
+    try:
+        display = db.session.get(Display, display_id)
+        if not display:
+            return jsonify({'success': False, 'message': '找不到指定的展示螢幕'}), 404
+
+        group_changed = False
+        if 'name' in data:
+            display.name = data['name']
+        if 'group_id' in data:
+            group_id = data['group_id'] or None
+            if group_id and not db.session.get(DisplayGroup, group_id):
+                return jsonify({'success': False, 'message': '找不到指定的展示群組'}), 404
+            group_changed = group_id != display.group_id
+            display.group_id = group_id
+        db.session.commit()
+
+        mark_content_changed()
+        broadcast_content_change('media_updated', {'message': '展示螢幕已更新!'})
+        if group_changed:
+            notify_display_reconfigured([display_id])
+        return jsonify({'success': True, 'message': '展示螢幕更新成功', 'data': _display_data(display)})
+    except Exception as e:
+        db.session.rollback()
+        print(f"更新展示螢幕時發生錯誤: {e}")
+        return jsonify({'success': False, 'message': '更新展示螢幕時發生伺服器錯誤。'}), 500
+
+@app.route('/api/displays/<display_id>', methods=['DELETE'])
+@token_required
+def delete_display(current_user, display_id):
+    """取消登記展示螢幕，並刪除它專屬的指派；螢幕之後改播全域內容"""
+    try:
+        display = db.session.get(Display, display_id)
+        if not display:
+            return jsonify({'success': False, 'message': '找不到要刪除的展示螢幕'}), 404
+
+        db.session.delete(display)
+        db.session.commit()
+
+        mark_content_changed()
+        broadcast_content_change('media_updated', {'message': '展示螢幕已刪除!'})
+        notify_display_reconfigured([display_id])
+        return jsonify({'success': True, 'message': '刪除成功'})
+    except Exception as e:
+        db.session.rollback()
+        print(f"刪除展示螢幕時發生錯誤: {e}")
+        return jsonify({'success': False, 'message': '刪除展示螢幕時發生伺服器錯誤。'}), 500
+
+@app.route('/api/display_groups', methods=['GET'])
+@conditional_on_content_version
+def get_display_groups():
+    """獲取所有展示群組及其螢幕"""
+    try:
+        groups = DisplayGroup.query.options(selectinload(DisplayGroup.displays)).all()
+        return jsonify({'success': True, 'data': [
+            {'id': group.id, 'name': group.name, 'display_ids': [display.id for display in group.displays]}
+            for group in groups
+        ]})
+    except Exception as e:
+        print(f"獲取展示群組時發生錯誤: {e}")
+        return jsonify({'success': False, 'message': '獲取展示群組時發生伺服器錯誤。'}), 500
+
+@app.route('/api/display_groups', methods=['POST'])
+@token_required
+def create_display_group(current_user):
+    """建立展示群組"""
+    data = request.json
+    if not data or not data.get('name'):
+        return jsonify({'success': False, 'message': '群組名稱不能為空'}), 400
+
+    try:
+        group = DisplayGroup(name=data['name'])
+        db.session.add(group)
+        db.session.commit()
+
+        mark_content_changed()
+        broadcast_content_change('media_updated', {'message': '展示群組已建立!'})
+        return jsonify({'success': True, 'message': '展示群組建立成功',
+                        'data': {'id': group.id, 'name': group.name, 'display_ids': []}}), 201
+    except Exception as e:
+        db.session.rollback()
+        print(f"建立展示群組時發生錯誤: {e}")
+        return jsonify({'success': False, 'message': '建立展示群組時發生伺服器錯誤。'}), 500
+
+@app.route('/api/display_groups/<group_id>', methods=['PUT'])
+@token_required
+def update_display_group(current_user, group_id):
+    """更新展示群組名稱"""
+    data = request.json
+    if not data or not data.get('name'):
+        return jsonify({'success': False, 'message': '群組名稱不能為空'}), 400
+
+    try:
+        group = db.session.get(DisplayGroup, group_id)
+        if not group:
+            return jsonify({'success': False, 'message': '找不到指定的展示群組'}), 404
+        group.name = data['name']
+        db.session.commit()
+
+        mark_content_changed()
+        broadcast_content_change('media_updated', {'message': '展示群組已更新!'})
+        return jsonify({'success': True, 'message': '展示群組更新成功',
+                        'data': {'id': group.id, 'name': group.name, 'display_ids': [d.id for d in group.displays]}})
+    except Exception as e:
+        db.session.rollback()
+        print(f"更新展示群組時發生錯誤: {e}")
+        return jsonify({'success': False, 'message': '更新展示群組時發生伺服器錯誤。'}), 500
+
+@app.route('/api/display_groups/<group_id>', methods=['DELETE'])
+@token_required
+def delete_display_group(current_user, group_id):
+    """刪除展示群組及其指派；群組內的螢幕保留登記，改為不屬於任何群組"""
+    try:
+        group = db.session.get(DisplayGroup, group_id)
+        if not group:
+            return jsonify({'success': False, 'message': '找不到要刪除的展示群組'}), 404
+
+        display_ids = [display_id for (display_id,) in
+                       db.session.query(Display.id).filter_by(group_id=group_id).all()]
+        Display.query.filter_by(group_id=group_id).update({'group_id': None}, synchronize_session=False)
+        db.session.delete(group)
+        db.session.commit()
+
+        mark_content_changed()
+        broadcast_content_change('media_updated', {'message': '展示群組已刪除!'})
+        notify_display_reconfigured(display_ids)
+        return jsonify({'success': True, 'message': '刪除成功'})
+    except Exception as e:
+        db.session.rollback()
+        print(f"刪除展示群組時發生錯誤: {e}")
+        return jsonify({'success': False, 'message': '刪除展示群組時發生伺服器錯誤。'}), 500
+
 # --- 使用者管理 API ---
 @app.route('/api/users', methods=['GET'])
 @token_required
@@ -1025,7 +3438,7 @@ def create_user(current_user):
         # 建立新使用者
         new_user = User(
             username=username,
-            password_hash=generate_password_hash(password),
+            password_hash=hash_password(password),
             role=role,
             is_active=is_active
         )
@@ -1074,6 +3487,7 @@ def update_user(current_user, user_id):
             user.is_active = data['is_active']
             
         db.session.commit()
+        principal_cache.invalidate()
         
         user_data = {
             'id': user.id,
@@ -1107,8 +3521,9 @@ def reset_user_password(current_user, user_id):
             return jsonify({'success': False, 'message': '找不到指定的使用者'}), 404
             
         # 更新密碼
-        user.password_hash = generate_password_hash(new_password)
+        user.password_hash = hash_password(new_password)
         db.session.commit()
+        principal_cache.invalidate()
         
         return jsonify({'success': True, 'message': '密碼重設成功'})
     except Exception as e:
@@ -1132,6 +3547,7 @@ def delete_user(current_user, user_id):
             
         db.session.delete(user)
         db.session.commit()
+        principal_cache.invalidate()
         
         return jsonify({'success': True, 'message': '使用者刪除成功'})
     except Exception as e:
@@ -1140,20 +3556,56 @@ def delete_user(current_user, user_id):
         return jsonify({'success': False, 'message': '刪除使用者時發生伺服器錯誤。'}), 500
     
 # --- 公開 API ---
-@app.route('/api/media_with_settings', methods=['GET'])
-def get_media_with_settings():
-    """提供給前端的 API，返回所有媒體資料和播放設定，並處理輪播群組的偏移"""
+# 區塊指派分為三個範圍，較具體的範圍以整個區塊為單位覆寫較寬的範圍：全域 → 展示群組 → 單一展示螢幕
+GLOBAL_SCOPE = 'global'
+
+def _assignment_scope(assignment):
+    if assignment.display_id:
+        return f'display:{assignment.display_id}'
+    if assignment.display_group_id:
+        return f'group:{assignment.display_group_id}'
+    return GLOBAL_SCOPE
+
+def _build_display_catalog():
+    """從資料庫組出所有範圍的區塊媒體列表、播放設定與已登記螢幕所屬的群組。只在快照失效時被呼叫。
+
+    Returns:
+        dict: {'settings': {...}, 'scopes': {範圍: {section_key: [媒體]}}, 'displays': {螢幕ID: 群組ID或None},
+               'schedule': ScheduleIndex, 'valid_until': 下一次排程切換的 epoch 秒數或 None}
+    """
     # 從資料庫獲取設定
     settings_from_db = Setting.query.all()
     settings = {s.key: s.value for s in settings_from_db}
 
-    # 從資料庫獲取所有指派
-    assignments = Assignment.query.all()
-    
-    section_content_map = {} 
-
+    # 從資料庫獲取所有指派，並一次預先載入引用的素材、群組及群組內已排序的圖片
+    assignments = Assignment.query.options(
+        selectinload(Assignment.material),
+        selectinload(Assignment.carousel_group)
+            .selectinload(CarouselGroup.image_associations)
+            .joinedload(GroupImageAssociation.material)
+    ).all()
+    # 一次載入所有尺寸版本，依 (內容雜湊, 版面) 查找
+    renditions = {(r.content_hash, r.profile): r for r in MediaRendition.query.all()}
+    displays = dict(db.session.query(Display.id, Display.group_id).all())
+
+    # 依排程篩選目前生效的指派：同一範圍同一區塊有生效中的排程指派時，只使用排程指派
+    now = time.time()
+    schedule = build_schedule_index(assignments, now)
+    active_ids = schedule.active_at(now)
+    candidates = {}
     for assign in assignments:
+        if not assign.is_scheduled or assign.id in active_ids:
+            candidates.setdefault((_assignment_scope(assign), assign.section_key), []).append(assign)
+    effective = []
+    for scoped in candidates.values():
+        scheduled = [assign for assign in scoped if assign.is_scheduled]
+        effective.extend(scheduled or scoped)
+
+    scopes = {}
+
+    for assign in effective:
         section_key = assign.section_key
+        section_content_map = scopes.setdefault(_assignment_scope(assign), {})
         if section_key not in section_content_map:
             section_content_map[section_key] = []
 
@@ -1172,7 +3624,7 @@ def get_media_with_settings():
                         "id": material.id,
                         "filename": material.filename,
                         "type": "image",
-                        "url": material.url,
+                        "url": _display_url(material, section_key, renditions),
                         "section_key": section_key
                     })
 
@@ -1182,44 +3634,235 @@ def get_media_with_settings():
                 "id": material.id,
                 "filename": material.filename,
                 "type": material.type,
-                "url": material.url,
+                "url": _display_url(material, section_key, renditions),
                 "section_key": section_key
             })
 
+    # 沒有任何排程時目錄永遠有效；否則在下一次切換時過期，索引範圍內沒有切換時在範圍結束時重建
+    valid_until = None
+    if any(assign.is_scheduled for assign in assignments):
+        valid_until = schedule.next_transition(now) or schedule.end
+    return {"settings": settings, "scopes": scopes, "displays": displays,
+            "schedule": schedule, "valid_until": valid_until}
+
+def resolve_display_payload(catalog, display_id=None):
+    """依範圍優先順序組出單一螢幕的展示資料。未登記的螢幕 (或 None) 只使用全域指派。
+
+    只做字典合併，不查詢資料庫；覆寫的區塊即使沒有內容也會取代全域內容。
+    """
+    sections = dict(catalog['scopes'].get(GLOBAL_SCOPE, {}))
+    if display_id in catalog['displays']:
+        group_id = catalog['displays'][display_id]
+        if group_id:
+            sections.update(catalog['scopes'].get(f'group:{group_id}', {}))
+        sections.update(catalog['scopes'].get(f'display:{display_id}', {}))
+
     processed_media_for_frontend = []
-    for section_key, content_list in section_content_map.items():
+    for section_key, content_list in sections.items():
         processed_media_for_frontend.extend(content_list)
-        
-    # 為了讓後台 admin.html 仍然能讀取到所有素材和群組，暫時從資料庫查詢
-    all_materials = Material.query.all()
-    all_groups = CarouselGroup.query.all()
-    all_assignments = Assignment.query.all()
 
-    # 將 SQLAlchemy 物件轉換為字典列表
-    _debug_all_materials = [
-        {"id": m.id, "original_filename": m.original_filename, "filename": m.filename, "type": m.type, "url": m.url, "source": m.source} for m in all_materials
-    ]
-    _debug_all_groups = [
-        {"id": g.id, "name": g.name, "image_ids": [assoc.material_id for assoc in g.image_associations]} for g in all_groups
-    ]
-    _debug_all_assignments = [
-        {"id": a.id, "section_key": a.section_key, "content_source_type": a.content_source_type, "media_id": a.media_id, "group_id": a.group_id, "offset": a.offset} for a in all_assignments
-    ]
+    return {"media": processed_media_for_frontend, "settings": catalog['settings']}
+
+def display_catalog_snapshot():
+    """取得目前版本的指派目錄快照，所有螢幕的展示資料都由它解析而來；排程時段已切換時先遞增版本"""
+    daypart_scheduler.transition_if_due()
+    return playlist_cache.get('catalog', _build_display_catalog, serialize=False)
 
-    return jsonify({"media": processed_media_for_frontend, 
-                    "settings": settings, 
-                    "_debug_all_materials": _debug_all_materials, 
-                    "_debug_all_groups": _debug_all_groups,
-                    "_debug_all_assignments": _debug_all_assignments})
+def _build_media_payload():
+    """組出未登記螢幕使用的全域展示資料"""
+    return resolve_display_payload(display_catalog_snapshot().payload)
+
+def get_display_snapshot(display_id=None):
+    """取得指定螢幕的展示資料快照。每個已登記的螢幕在每個內容版本只解析一次，之後直接回傳序列化好的 bytes；
+    未登記的識別碼共用全域快照，不會因任意的識別碼而讓快取無限成長。
+    """
+    if not display_id or display_id not in display_catalog_snapshot().payload['displays']:
+        return playlist_cache.get('display', _build_media_payload)
+    return playlist_cache.get(f'display:{display_id}',
+                              lambda: resolve_display_payload(display_catalog_snapshot().payload, display_id))
+
+# 後台可透過 ?include= 額外取得的完整內容庫資料，對應到回應中的鍵名 (沿用舊的 _debug_all_* 名稱以相容前端)
+MEDIA_INCLUDE_OPTIONS = {
+    'materials': '_debug_all_materials',
+    'groups': '_debug_all_groups',
+    'assignments': '_debug_all_assignments'
+}
+
+def _build_library_payload(include):
+    """組出後台需要的完整素材、群組與指派列表，只包含 include 中要求的部分"""
+    payload = {}
+    if 'materials' in include:
+        payload['_debug_all_materials'] = [
+            {"id": m.id, "original_filename": m.original_filename, "filename": m.filename, "type": m.type, "url": m.url, "source": m.source}
+            for m in Material.query.all()
+        ]
+    if 'groups' in include:
+        all_groups = CarouselGroup.query.options(selectinload(CarouselGroup.image_associations)).all()
+        payload['_debug_all_groups'] = [
+            {"id": g.id, "name": g.name, "image_ids": [assoc.material_id for assoc in g.image_associations]} for g in all_groups
+        ]
+    if 'assignments' in include:
+        payload['_debug_all_assignments'] = [
+            {"id": a.id, "section_key": a.section_key, "content_source_type": a.content_source_type, "media_id": a.media_id, "group_id": a.group_id, "offset": a.offset,
+             "display_id": a.display_id, "display_group_id": a.display_group_id, "schedule": _schedule_data(a)}
+            for a in Assignment.query.all()
+        ]
+    return payload
+
+def _get_media_with_library(current_user, include):
+    """在展示資料之外附加內容庫資料，僅限已登入的後台使用 (由 _include_requires_token 驗證)"""
+    key = 'library:' + ','.join(include)
+    snapshot = playlist_cache.get(key, lambda: {**_build_media_payload(), **_build_library_payload(include)})
+    return app.response_class(snapshot.body, mimetype='application/json')
+
+def _include_requires_token(f):
+    """帶 ?include= 時先驗證 token 再進行條件請求檢查；否則未登入的客戶端可用 If-None-Match 取得 304，
+    藉此確認內容庫的版本"""
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        if request.args.get('include'):
+            return token_required(lambda current_user: f(*args, current_user=current_user, **kwargs))()
+        return f(*args, **kwargs)
+    return decorated
+
+@app.route('/api/media_with_settings', methods=['GET'])
+@_include_requires_token
+@conditional_on_content_version
+def get_media_with_settings(current_user=None):
+    """提供給展示頁的 API，只返回各區塊的媒體列表和播放設定。內容未變更時直接使用快取的快照。
+
+    已登記的螢幕加上 ?display=<螢幕ID> 取得套用群組與螢幕覆寫後的內容。
+
+    後台可加上 ?include=materials,groups,assignments (需登入) 一併取得完整的內容庫資料。
+    """
+    include_param = request.args.get('include')
+    if include_param:
+        include = sorted({part.strip() for part in include_param.split(',') if part.strip()})
+        invalid = [part for part in include if part not in MEDIA_INCLUDE_OPTIONS]
+        if invalid:
+            return jsonify({'success': False, 'message': f'不支援的 include 參數: {", ".join(invalid)}'}), 400
+        return _get_media_with_library(current_user, include)
+
+    snapshot = get_display_snapshot(request.args.get('display'))
+    playlist_publisher.remember(display_catalog_snapshot())
+    return app.response_class(snapshot.body, mimetype='application/json')
+
+def _build_display_manifest(display_id=None):
+    """列出展示頁播放清單用到的所有檔案，附帶內容雜湊、大小、MIME 類型與預先下載的優先順序。
+
+    priority 為建議的下載順序 (0 最先)：先排各區塊第一個顯示的項目，再依播放位置往後，
+    讓每個區塊都能盡早開始播放。同一檔案出現在多個區塊時取最前面的位置。
+    """
+    media = get_display_snapshot(display_id).payload['media']
+    section_order = {key: index for index, key in enumerate(AVAILABLE_SECTIONS)}
+
+    assets = {}
+    positions = {}
+    for item in media:
+        position = positions.get(item['section_key'], 0)
+        positions[item['section_key']] = position + 1
+        rank = (position, section_order.get(item['section_key'], len(section_order)))
+        if item['url'] not in assets or rank < assets[item['url']]:
+            assets[item['url']] = rank
+
+    # 依檔名一次查出原檔與尺寸版本的雜湊和大小
+    upload_prefix = f"/{UPLOAD_FOLDER}/"
+    filenames = [url[len(upload_prefix):] for url in assets if url.startswith(upload_prefix)]
+    known = {}
+    for blob in MediaBlob.query.filter(MediaBlob.filename.in_(filenames)).all():
+        known[upload_prefix + blob.filename] = (blob.sha256, blob.size)
+    rendition_names = [name[len('renditions/'):] for name in filenames if name.startswith('renditions/')]
+    for rendition in MediaRendition.query.filter(MediaRendition.filename.in_(rendition_names)).all():
+        known[rendition.url] = (rendition.sha256, rendition.size)
+
+    manifest_assets = []
+    for priority, url in enumerate(sorted(assets, key=assets.get)):
+        sha256, size = known.get(url, (None, None))
+        if size is None:
+            # 內容定址之前上傳的檔案沒有記錄雜湊，只回報檔案大小
+            path = os.path.join(app.config['UPLOAD_FOLDER'], url[len(upload_prefix):])
+            size = os.path.getsize(path) if os.path.isfile(path) else None
+        manifest_assets.append({
+            'url': url,
+            'sha256': sha256,
+            'size': size,
+            'mime': mimetypes.guess_type(url)[0] or 'application/octet-stream',
+            'priority': priority
+        })
+    return {'assets': manifest_assets}
+
+@app.route('/api/display_manifest', methods=['GET'])
+@conditional_on_content_version
+def get_display_manifest():
+    """提供展示頁離線快取所需的檔案清單，?display=<螢幕ID> 時列出該螢幕實際播放的檔案"""
+    display_id = request.args.get('display')
+    if not display_id or display_id not in display_catalog_snapshot().payload['displays']:
+        snapshot = playlist_cache.get('manifest', _build_display_manifest)
+    else:
+        snapshot = playlist_cache.get(f'manifest:{display_id}', lambda: _build_display_manifest(display_id))
+    return app.response_class(snapshot.body, mimetype='application/json')
+
+@app.route('/display-sw.js')
+def display_service_worker():
+    """展示頁的 Service Worker；由根路徑提供，範圍才能涵蓋 /display 與 /static/uploads"""
+    response = send_from_directory(os.path.join(app.root_path, 'static', 'js'), 'display-sw.js', request.environ,
+                                   response_class=app.response_class)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
 
 # --- WebSocket ---
+# 客戶端連線時以 auth 表明身分並加入房間，廣播只送到受影響的房間：
+#   admins                 後台 (auth.token 驗證通過)：media_updated、settings_updated
+#   displays               未登記的展示頁：播放設定變更的 playlist_patch
+#   section:<section_key>  訂閱該區塊的未登記展示頁：全域內容中該區塊的 playlist_patch
+#   display:<display_id>   單一展示頁；已登記的螢幕只加入這個房間，接收依自身覆寫解析後的 playlist_patch
+# 未帶 auth 的舊版客戶端 (例如仍在快取中的舊展示頁) 視為未登記的展示頁，加入 displays 與所有區塊房間；
+# admins 房間只接受 token 驗證通過的後台，未驗證的連線收不到後台事件。
+# 螢幕的登記或所屬群組改變時，伺服器送出 display_reconfigured，展示頁重新連線以加入正確的房間。
+ADMIN_ROOM = 'admins'
+DISPLAY_ROOM = 'displays'
+
+def section_room(section_key):
+    return f'section:{section_key}'
+
+def display_room(display_id):
+    return f'display:{display_id}'
+
+def _join_display_rooms(sections, display_id=None):
+    join_room(DISPLAY_ROOM)
+    for section_key in sections:
+        if section_key in AVAILABLE_SECTIONS:
+            join_room(section_room(section_key))
+    if display_id:
+        join_room(display_room(display_id))
+
 @socketio.on('connect', namespace='/')
-def handle_connect():
-    """處理 WebSocket 連接事件"""
+def handle_connect(auth=None):
+    """處理 WebSocket 連接事件，依 auth 加入對應的房間；後台 token 無效時拒絕連線"""
+    auth = auth if isinstance(auth, dict) else {}
+    client_type = auth.get('client')
+    if client_type == 'admin':
+        try:
+            principal = _authenticate_token(auth.get('token') or '')
+        except Exception:
+            principal = None
+        if principal is None or not principal.is_active:
+            return False
+        join_room(ADMIN_ROOM)
+    elif client_type == 'display':
+        display_id = str(auth['display_id']) if auth.get('display_id') else None
+        if display_id and display_id in display_catalog_snapshot().payload['displays']:
+            join_room(display_room(display_id))
+        else:
+            _join_display_rooms(auth.get('sections') or list(AVAILABLE_SECTIONS), display_id)
+    else:
+        _join_display_rooms(AVAILABLE_SECTIONS)
+    SOCKETIO_CONNECTIONS.inc()
     print('一個客戶端已連接')
 @socketio.on('disconnect', namespace='/')
 def handle_disconnect():
     """處理 WebSocket 斷開連接事件"""
+    SOCKETIO_CONNECTIONS.dec()
     print('一個客戶端已斷開')
 
 # --- 主程式啟動 ---
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+SQLite 設定效能比較腳本
+以模擬展示頁讀取與後台寫入的混合負載，比較 SQLite 預設值與正式環境 PRAGMA 設定的吞吐量。
+
+用法: python bench_sqlite.py [--duration 秒數] [--readers 讀取執行緒數] [--writers 寫入執行緒數]
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import threading
+import time
+import uuid
+
+from sqlalchemy import create_engine, event, select, update
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from app import (db, Material, Assignment, Setting, SQLITE_PRODUCTION_PRAGMAS, apply_sqlite_pragmas)
+
+SEED_MATERIALS = 500
+
+
+def create_bench_engine(path, pragmas):
+    """以與應用程式相同的連線池設定建立引擎，並在每個新連線套用指定的 PRAGMA"""
+    engine = create_engine(f'sqlite:///{path}', pool_size=10, max_overflow=-1)
+    event.listen(engine, 'connect', lambda dbapi_connection, record: apply_sqlite_pragmas(dbapi_connection, pragmas))
+    return engine
+
+
+def seed(engine):
+    db.metadata.create_all(engine)
+    with Session(engine) as session:
+        for index in range(SEED_MATERIALS):
+            material = Material(original_filename=f'seed{index}.jpg', filename=f'seed{index}.jpg',
+                                type='image', url=f'/static/uploads/seed{index}.jpg')
+            session.add(material)
+            session.flush()
+            session.add(Assignment(section_key=f'section_{index % 6}', content_source_type='single_media',
+                                   media_id=material.id))
+        session.add(Setting(key='header_interval', value='5'))
+        session.commit()
+
+
+def run_workload(engine, duration, readers, writers):
+    """在指定時間內同時執行讀取與寫入，返回各類操作的次數、錯誤數與寫入延遲"""
+    stop_at = time.monotonic() + duration
+    results = {'reads': 0, 'writes': 0, 'errors': 0, 'write_latencies': []}
+    lock = threading.Lock()
+
+    def reader():
+        count = 0
+        errors = 0
+        while time.monotonic() < stop_at:
+            try:
+                with Session(engine) as session:
+                    # 與展示頁播放清單相同的讀取型態：所有指派連同素材
+                    session.execute(select(Assignment, Material).join(Material, Assignment.media_id == Material.id)).all()
+                    session.execute(select(Setting)).all()
+                count += 1
+            except OperationalError:
+                errors += 1
+        with lock:
+            results['reads'] += count
+            results['errors'] += errors
+
+    def writer():
+        count = 0
+        errors = 0
+        latencies = []
+        while time.monotonic() < stop_at:
+            started = time.monotonic()
+            try:
+                with Session(engine) as session:
+                    # 與上傳素材相同的寫入型態：新增素材與指派，並更新設定
+                    material_id = str(uuid.uuid4())
+                    session.add(Material(id=material_id, original_filename='bench.jpg', filename=f'{material_id}.jpg',
+                                         type='image', url=f'/static/uploads/{material_id}.jpg'))
+                    session.add(Assignment(section_key='bench', content_source_type='single_media', media_id=material_id))
+                    session.execute(update(Setting).where(Setting.key == 'header_interval').values(value=str(count % 10)))
+                    session.commit()
+                count += 1
+                latencies.append(time.monotonic() - started)
+            except OperationalError:
+                errors += 1
+        with lock:
+            results['writes'] += count
+            results['errors'] += errors
+            results['write_latencies'].extend(latencies)
+
+    threads = [threading.Thread(target=reader) for _ in range(readers)]
+    threads += [threading.Thread(target=writer) for _ in range(writers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='比較 SQLite 預設值與正式環境 PRAGMA 設定的吞吐量')
+    parser.add_argument('--duration', type=float, default=5.0, help='每種設定的測試秒數')
+    parser.add_argument('--readers', type=int, default=4, help='讀取執行緒數')
+    parser.add_argument('--writers', type=int, default=2, help='寫入執行緒數')
+    args = parser.parse_args()
+
+    profiles = [('SQLite 預設值', {}), ('正式環境設定', SQLITE_PRODUCTION_PRAGMAS)]
+    print(f"測試時間 {args.duration} 秒，讀取執行緒 {args.readers}，寫入執行緒 {args.writers}")
+    print(f"{'設定':<12}{'讀取/秒':>12}{'寫入/秒':>12}{'寫入 p95 (ms)':>16}{'鎖定錯誤':>10}")
+
+    for name, pragmas in profiles:
+        with tempfile.TemporaryDirectory() as directory:
+            engine = create_bench_engine(os.path.join(directory, 'bench.db'), pragmas)
+            seed(engine)
+            results = run_workload(engine, args.duration, args.readers, args.writers)
+            engine.dispose()
+
+        latencies = sorted(results['write_latencies'])
+        p95 = statistics.quantiles(latencies, n=20)[-1] * 1000 if len(latencies) >= 2 else float('nan')
+        print(f"{name:<12}{results['reads'] / args.duration:>12.1f}{results['writes'] / args.duration:>12.1f}"
+              f"{p95:>16.1f}{results['errors']:>10}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""group order gaps
+
+Revision ID: 2d9a6c3e7f81
+Revises: e7b1d4a6f253
+Create Date: 2026-10-17 22:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2d9a6c3e7f81'
+down_revision = 'e7b1d4a6f253'
+branch_labels = None
+depends_on = None
+
+
+# 與 app.GROUP_ORDER_GAP 相同；遷移檔不匯入應用程式
+GROUP_ORDER_GAP = 1024
+
+association = sa.table(
+    'group_image_association',
+    sa.column('group_id', sa.String),
+    sa.column('material_id', sa.String),
+    sa.column('order', sa.Integer)
+)
+
+
+def _renumber(gap):
+    bind = op.get_bind()
+    rows = bind.execute(
+        sa.select(association.c.group_id, association.c.material_id)
+        .order_by(association.c.group_id, association.c.order, association.c.material_id)
+    ).all()
+    positions = {}
+    changes = []
+    for group_id, material_id in rows:
+        positions[group_id] = positions.get(group_id, 0) + 1
+        changes.append({'g': group_id, 'm': material_id, 'o': positions[group_id] * gap})
+    if changes:
+        bind.execute(
+            association.update()
+            .where(association.c.group_id == sa.bindparam('g'))
+            .where(association.c.material_id == sa.bindparam('m'))
+            .values(order=sa.bindparam('o')),
+            changes
+        )
+
+
+def upgrade():
+    # 既有的順序是 0, 1, 2...，改為等間隔的排序鍵，讓移動單張圖片時有空位可插入
+    _renumber(GROUP_ORDER_GAP)
+
+
+def downgrade():
+    # 等間隔的排序鍵保留相對順序，舊版程式可直接使用，不需還原成連續整數
+    pass
@@ -0,0 +1,61 @@
+"""content addressed media blobs
+
+Revision ID: 3f1c2a9d8e47
+Revises: 
+Create Date: 2026-10-17 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c2a9d8e47'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+# SQLite 反射出的 UNIQUE 限制沒有名稱，需透過命名規則才能在批次模式中移除
+NAMING_CONVENTION = {'uq': 'uq_%(table_name)s_%(column_0_name)s'}
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+
+    # 以 db.create_all() 建立的新資料庫已經包含這些結構
+    if 'media_blob' not in inspector.get_table_names():
+        op.create_table(
+            'media_blob',
+            sa.Column('sha256', sa.String(length=64), nullable=False),
+            sa.Column('filename', sa.String(length=255), nullable=False),
+            sa.Column('size', sa.BigInteger(), nullable=False),
+            sa.Column('ref_count', sa.Integer(), nullable=False),
+            sa.PrimaryKeyConstraint('sha256'),
+            sa.UniqueConstraint('filename')
+        )
+
+    material_columns = {column['name'] for column in inspector.get_columns('material')}
+    has_filename_unique = any(
+        constraint['column_names'] == ['filename']
+        for constraint in inspector.get_unique_constraints('material')
+    )
+    if 'content_hash' in material_columns and not has_filename_unique:
+        return
+
+    with op.batch_alter_table('material', naming_convention=NAMING_CONVENTION) as batch_op:
+        if has_filename_unique:
+            batch_op.drop_constraint('uq_material_filename', type_='unique')
+        if 'content_hash' not in material_columns:
+            batch_op.add_column(sa.Column('content_hash', sa.String(length=64), nullable=True))
+            batch_op.create_foreign_key('fk_material_content_hash_media_blob', 'media_blob',
+                                        ['content_hash'], ['sha256'])
+
+
+def downgrade():
+    # 還原前需確保每個檔名只對應一筆素材
+    with op.batch_alter_table('material', naming_convention=NAMING_CONVENTION) as batch_op:
+        batch_op.drop_constraint('fk_material_content_hash_media_blob', type_='foreignkey')
+        batch_op.drop_column('content_hash')
+        batch_op.create_unique_constraint('uq_material_filename', ['filename'])
+
+    op.drop_table('media_blob')
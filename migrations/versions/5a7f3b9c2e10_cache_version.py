@@ -0,0 +1,31 @@
+"""cache version
+
+Revision ID: 5a7f3b9c2e10
+Revises: c4d2e8f1a093
+Create Date: 2026-10-17 20:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5a7f3b9c2e10'
+down_revision = 'c4d2e8f1a093'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if 'cache_version' in sa.inspect(op.get_bind()).get_table_names():
+        return
+    op.create_table(
+        'cache_version',
+        sa.Column('name', sa.String(length=50), nullable=False),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('name')
+    )
+
+
+def downgrade():
+    op.drop_table('cache_version')
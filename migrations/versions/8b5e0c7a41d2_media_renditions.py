@@ -0,0 +1,39 @@
+"""media renditions
+
+Revision ID: 8b5e0c7a41d2
+Revises: 3f1c2a9d8e47
+Create Date: 2026-10-17 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b5e0c7a41d2'
+down_revision = '3f1c2a9d8e47'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if 'media_rendition' in sa.inspect(op.get_bind()).get_table_names():
+        return
+    op.create_table(
+        'media_rendition',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('content_hash', sa.String(length=64), nullable=False),
+        sa.Column('profile', sa.String(length=20), nullable=False),
+        sa.Column('filename', sa.String(length=255), nullable=False),
+        sa.Column('width', sa.Integer(), nullable=False),
+        sa.Column('height', sa.Integer(), nullable=False),
+        sa.Column('size', sa.BigInteger(), nullable=False),
+        sa.ForeignKeyConstraint(['content_hash'], ['media_blob.sha256']),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('content_hash', 'profile'),
+        sa.UniqueConstraint('filename')
+    )
+
+
+def downgrade():
+    op.drop_table('media_rendition')
@@ -0,0 +1,63 @@
+"""displays
+
+Revision ID: 9c3e5b7d1a24
+Revises: 2d9a6c3e7f81
+Create Date: 2026-10-17 23:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9c3e5b7d1a24'
+down_revision = '2d9a6c3e7f81'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    tables = inspector.get_table_names()
+    if 'display_group' not in tables:
+        op.create_table(
+            'display_group',
+            sa.Column('id', sa.String(length=36), nullable=False),
+            sa.Column('name', sa.String(length=100), nullable=False),
+            sa.PrimaryKeyConstraint('id')
+        )
+    if 'display' not in tables:
+        op.create_table(
+            'display',
+            sa.Column('id', sa.String(length=64), nullable=False),
+            sa.Column('name', sa.String(length=100), nullable=False),
+            sa.Column('group_id', sa.String(length=36), nullable=True),
+            sa.ForeignKeyConstraint(['group_id'], ['display_group.id'], name='fk_display_group_id_display_group'),
+            sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index('ix_display_group_id', 'display', ['group_id'], unique=False)
+
+    # 既有的指派兩個欄位皆為 NULL，即全域指派
+    columns = {column['name'] for column in inspector.get_columns('assignment')}
+    if 'display_id' not in columns:
+        with op.batch_alter_table('assignment') as batch_op:
+            batch_op.add_column(sa.Column('display_group_id', sa.String(length=36), nullable=True))
+            batch_op.add_column(sa.Column('display_id', sa.String(length=64), nullable=True))
+            batch_op.create_foreign_key('fk_assignment_display_group_id_display_group', 'display_group',
+                                        ['display_group_id'], ['id'])
+            batch_op.create_foreign_key('fk_assignment_display_id_display', 'display', ['display_id'], ['id'])
+            batch_op.create_index('ix_assignment_display_group_id', ['display_group_id'], unique=False)
+            batch_op.create_index('ix_assignment_display_id', ['display_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('assignment') as batch_op:
+        batch_op.drop_index('ix_assignment_display_id')
+        batch_op.drop_index('ix_assignment_display_group_id')
+        batch_op.drop_constraint('fk_assignment_display_id_display', type_='foreignkey')
+        batch_op.drop_constraint('fk_assignment_display_group_id_display_group', type_='foreignkey')
+        batch_op.drop_column('display_id')
+        batch_op.drop_column('display_group_id')
+    op.drop_index('ix_display_group_id', table_name='display')
+    op.drop_table('display')
+    op.drop_table('display_group')
@@ -0,0 +1,41 @@
+"""assignment schedule
+
+Revision ID: b6d2f8a4c913
+Revises: 9c3e5b7d1a24
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b6d2f8a4c913'
+down_revision = '9c3e5b7d1a24'
+branch_labels = None
+depends_on = None
+
+
+# 皆為 NULL 表示全天候播放，既有的指派不需要回填
+SCHEDULE_COLUMNS = [
+    ('starts_at', sa.DateTime),
+    ('ends_at', sa.DateTime),
+    ('weekdays', sa.Integer),
+    ('daily_start', sa.Integer),
+    ('daily_end', sa.Integer),
+]
+
+
+def upgrade():
+    columns = {column['name'] for column in sa.inspect(op.get_bind()).get_columns('assignment')}
+    missing = [(name, type_) for name, type_ in SCHEDULE_COLUMNS if name not in columns]
+    if missing:
+        with op.batch_alter_table('assignment') as batch_op:
+            for name, type_ in missing:
+                batch_op.add_column(sa.Column(name, type_(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('assignment') as batch_op:
+        for name, _type in reversed(SCHEDULE_COLUMNS):
+            batch_op.drop_column(name)
@@ -0,0 +1,28 @@
+"""rendition sha256
+
+Revision ID: c4d2e8f1a093
+Revises: 8b5e0c7a41d2
+Create Date: 2026-10-17 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4d2e8f1a093'
+down_revision = '8b5e0c7a41d2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    columns = {column['name'] for column in sa.inspect(op.get_bind()).get_columns('media_rendition')}
+    if 'sha256' not in columns:
+        with op.batch_alter_table('media_rendition') as batch_op:
+            batch_op.add_column(sa.Column('sha256', sa.String(length=64), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('media_rendition') as batch_op:
+        batch_op.drop_column('sha256')
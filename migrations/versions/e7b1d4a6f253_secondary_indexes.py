@@ -0,0 +1,45 @@
+"""secondary indexes
+
+Revision ID: e7b1d4a6f253
+Revises: 5a7f3b9c2e10
+Create Date: 2026-10-17 21:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7b1d4a6f253'
+down_revision = '5a7f3b9c2e10'
+branch_labels = None
+depends_on = None
+
+
+# (索引名稱, 資料表, 欄位)
+INDEXES = [
+    # 指派區塊時依 section_key 刪除舊指派
+    ('ix_assignment_section_key', 'assignment', ['section_key']),
+    # 刪除素材或群組時級聯查詢所屬的指派
+    ('ix_assignment_media_id', 'assignment', ['media_id']),
+    ('ix_assignment_group_id', 'assignment', ['group_id']),
+    # 依順序載入群組圖片與 upload_group_images 的 max(order)
+    ('ix_group_image_association_group_id_order', 'group_image_association', ['group_id', 'order']),
+    # 刪除素材時級聯查詢所屬的群組關聯 (主鍵以 group_id 開頭，無法使用)
+    ('ix_group_image_association_material_id', 'group_image_association', ['material_id']),
+    # 刪除群組時篩選群組專屬圖片
+    ('ix_material_source', 'material', ['source']),
+]
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    for name, table, columns in INDEXES:
+        existing = {index['name'] for index in inspector.get_indexes(table)}
+        if name not in existing:
+            op.create_index(name, table, columns, unique=False)
+
+
+def downgrade():
+    for name, table, _columns in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
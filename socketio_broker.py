@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Socket.IO 本機訊息代理
+在沒有 Redis 的開發與測試環境中，讓多個 app.py 工作程序共用 Socket.IO 廣播。
+
+代理只做一件事：把任一連線送來的訊息轉送給其他所有連線。
+工作程序以 SOCKETIO_MESSAGE_QUEUE=broker://<host>:<port> 啟動時，會透過 BrokerManager 連上代理。
+
+用法: python socketio_broker.py [--host 127.0.0.1] [--port 6390]
+"""
+import argparse
+import struct
+
+import eventlet
+from eventlet.green import socket
+from eventlet.semaphore import Semaphore
+from engineio import json
+from socketio.pubsub_manager import PubSubManager
+
+FRAME_HEADER = struct.Struct('!I')  # 每則訊息前綴 4 位元組的長度
+RECONNECT_MAX_DELAY = 5.0
+
+
+def send_frame(sock, payload):
+    sock.sendall(FRAME_HEADER.pack(len(payload)) + payload)
+
+
+def _recv_exactly(sock, size):
+    data = b''
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError('連線已關閉')
+        data += chunk
+    return data
+
+
+def recv_frame(sock):
+    (size,) = FRAME_HEADER.unpack(_recv_exactly(sock, FRAME_HEADER.size))
+    return _recv_exactly(sock, size)
+
+
+def parse_broker_url(url):
+    """將 broker://host:port 拆成 (host, port)"""
+    address = url.split('://', 1)[1].rstrip('/')
+    host, _, port = address.rpartition(':')
+    return host or '127.0.0.1', int(port)
+
+
+def run_broker(host='127.0.0.1', port=6390):
+    """啟動代理並持續轉送訊息，直到程序結束"""
+    server = eventlet.listen((host, port))
+    subscribers = {}  # 連線 -> 寫入鎖
+
+    def serve(sock):
+        subscribers[sock] = Semaphore()
+        try:
+            while True:
+                payload = recv_frame(sock)
+                for other, lock in list(subscribers.items()):
+                    if other is sock:
+                        continue
+                    try:
+                        with lock:
+                            send_frame(other, payload)
+                    except OSError:
+                        subscribers.pop(other, None)
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            subscribers.pop(sock, None)
+            sock.close()
+
+    print(f"Socket.IO 訊息代理已啟動於 {host}:{port}", flush=True)
+    while True:
+        sock, _address = server.accept()
+        eventlet.spawn_n(serve, sock)
+
+
+class BrokerManager(PubSubManager):
+    """透過 socketio_broker 代理在多個工作程序之間轉送 Socket.IO 廣播的用戶端管理器。
+
+    使用 eventlet 的 green socket，不需要 monkey patch 也不會阻塞事件迴圈。
+    """
+    name = 'broker'
+
+    def __init__(self, url='broker://127.0.0.1:6390', channel='socketio', write_only=False, logger=None):
+        self.address = parse_broker_url(url)
+        self._publisher = None
+        self._publish_lock = Semaphore()
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+
+    def _connect(self):
+        return socket.create_connection(self.address)
+
+    def _publish(self, data):
+        payload = json.dumps({'channel': self.channel, 'data': data}).encode('utf-8')
+        with self._publish_lock:
+            for attempt in range(2):
+                try:
+                    if self._publisher is None:
+                        self._publisher = self._connect()
+                    send_frame(self._publisher, payload)
+                    return
+                except OSError as e:
+                    if self._publisher is not None:
+                        self._publisher.close()
+                    self._publisher = None
+                    if attempt:
+                        self._get_logger().error(f'無法發送訊息到 Socket.IO 訊息代理: {e}')
+
+    def _listen(self):
+        delay = 0.5
+        while True:
+            try:
+                sock = self._connect()
+            except OSError as e:
+                self._get_logger().error(f'無法連線到 Socket.IO 訊息代理，{delay} 秒後重試: {e}')
+                eventlet.sleep(delay)
+                delay = min(delay * 2, RECONNECT_MAX_DELAY)
+                continue
+            delay = 0.5
+            try:
+                while True:
+                    message = json.loads(recv_frame(sock).decode('utf-8'))
+                    if message.get('channel') == self.channel:
+                        yield message['data']
+            except (ConnectionError, OSError, ValueError) as e:
+                self._get_logger().error(f'與 Socket.IO 訊息代理的連線中斷，重新連線: {e}')
+            finally:
+                sock.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='多個 MQ-CMS 工作程序共用的 Socket.IO 訊息代理')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=6390)
+    args = parser.parse_args()
+    run_broker(args.host, args.port)
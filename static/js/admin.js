@@ -19,7 +19,10 @@ document.addEventListener('DOMContentLoaded', () => {
     }
 
     // 2. Initialize WebSocket connection
-    const socket = io();
+    // Join the admin room; the server rejects the connection if the token is invalid
+    const socket = io({
+        auth: cb => cb({ client: 'admin', token: localStorage.getItem('jwt_token') })
+    });
     socket.on('connect', () => console.log('Socket.IO Connected!'));
     
     // When the server pushes an update, refetch all data to ensure consistency
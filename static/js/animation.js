@@ -83,40 +83,73 @@ function initializeGenericCarousel(containerElement, slideInterval) {
 }
 
 
-// 更新所有區塊
-function updateAllSections(data) {
-  const mediaItems = data.media || []; // 確保 mediaItems 始終是陣列
-  const settings = data.settings || {};
-
-  const currentIntervals = {
+// 將後端設定轉換為各區塊的輪播間隔 (毫秒)
+function resolveIntervals(settings) {
+  return {
     header_interval: settings.header_interval !== undefined ? parseInt(settings.header_interval, 10) * 1000 : DEFAULT_INTERVALS.header_interval,
     carousel_interval: settings.carousel_interval !== undefined ? parseInt(settings.carousel_interval, 10) * 1000 : DEFAULT_INTERVALS.carousel_interval,
     footer_interval: settings.footer_interval !== undefined ? parseInt(settings.footer_interval, 10) * 1000 : DEFAULT_INTERVALS.footer_interval
   };
+}
+
+// 各區塊對應的更新函式
+const SECTION_UPDATERS = {
+  header_video: (mediaItems, intervals) => updateHeaderContent(mediaItems, intervals.header_interval),
+  footer_content: (mediaItems, intervals) => updateFooterContent(mediaItems, intervals.footer_interval),
+  carousel_top_left: (mediaItems, intervals) => updateCarousel(mediaItems, 'carousel_top_left', 'carousel-top-left-inner', intervals.carousel_interval),
+  carousel_top_right: (mediaItems, intervals) => updateCarousel(mediaItems, 'carousel_top_right', 'carousel-top-right-inner', intervals.carousel_interval),
+  carousel_bottom_left: (mediaItems, intervals) => updateCarousel(mediaItems, 'carousel_bottom_left', 'carousel-bottom-left-inner', intervals.carousel_interval),
+  carousel_bottom_right: (mediaItems, intervals) => updateCarousel(mediaItems, 'carousel_bottom_right', 'carousel-bottom-right-inner', intervals.carousel_interval)
+};
+
+// 只重新渲染指定的區塊
+function updateSections(data, sectionKeys) {
+  const mediaItems = data.media || []; // 確保 mediaItems 始終是陣列
+  const currentIntervals = resolveIntervals(data.settings || {});
   console.log("當前使用的輪播間隔 (毫秒):", currentIntervals);
 
+  sectionKeys.forEach(sectionKey => {
+    const updater = SECTION_UPDATERS[sectionKey];
+    if (updater) updater(mediaItems, currentIntervals);
+  });
+}
 
-  updateHeaderContent(mediaItems, currentIntervals.header_interval);
-  updateFooterContent(mediaItems, currentIntervals.footer_interval);
-  updateCarousel(mediaItems, 'carousel_top_left', 'carousel-top-left-inner', currentIntervals.carousel_interval);
-  updateCarousel(mediaItems, 'carousel_top_right', 'carousel-top-right-inner', currentIntervals.carousel_interval);
-  updateCarousel(mediaItems, 'carousel_bottom_left', 'carousel-bottom-left-inner', currentIntervals.carousel_interval);
-  updateCarousel(mediaItems, 'carousel_bottom_right', 'carousel-bottom-right-inner', currentIntervals.carousel_interval);
+// 更新所有區塊
+function updateAllSections(data) {
+  updateSections(data, Object.keys(SECTION_UPDATERS));
 }
 
+// 上一次成功取得的資料與其 ETag，用於條件請求
+let lastMediaETag = null;
+let lastMediaData = null;
+// 各區塊 (與 settings) 最後套用的版本；展示頁只收到訂閱區塊的更新，因此各區塊版本可能不同。
+// 未列出的區塊沿用完整抓取時的 lastMediaData.version
+let sectionVersions = {};
+
 // 獲取媒體數據和設定
 async function fetchMediaData() {
   try {
-    const response = await fetch(`${SERVER_BASE_URL}/api/media_with_settings`);
+    const headers = {};
+    if (lastMediaETag && lastMediaData) {
+      headers['If-None-Match'] = lastMediaETag;
+    }
+    const response = await fetch(`${SERVER_BASE_URL}/api/media_with_settings${displayQuery()}`, { headers, cache: 'no-store' });
+    if (response.status === 304) {
+      console.log('媒體資料和設定未變更，沿用現有資料');
+      return lastMediaData;
+    }
     if (!response.ok) {
       throw new Error(`獲取媒體資料和設定失敗: ${response.status} ${response.statusText}`);
     }
     const data = await response.json();
+    lastMediaETag = response.headers.get('ETag');
+    lastMediaData = data;
+    sectionVersions = {};
     console.log('成功獲取媒體資料和設定:', data);
     return data;
   } catch (error) {
     console.error('fetchMediaData 錯誤:', error);
-    return { media: [], settings: DEFAULT_INTERVALS }; // 返回包含預設值的物件
+    return null; // 由呼叫端決定是否保留目前的畫面
   }
 }
 
@@ -299,13 +332,75 @@ function updateCarousel(mediaItems, sectionKey, carouselInnerId, carouselInterva
   }
 }
 
+// 離線快取：Service Worker 依檔案清單預先下載媒體，伺服器無法連線時從本機快取播放
+let offlineCacheRegistration = Promise.resolve(null);
+let lastManifestETag = null;
+
+function registerOfflineCache() {
+  if (!('serviceWorker' in navigator)) return;
+  offlineCacheRegistration = navigator.serviceWorker.register('/display-sw.js', { scope: '/display' })
+    .catch(error => {
+      console.warn('Service Worker 註冊失敗，略過離線快取:', error);
+      return null;
+    });
+}
+
+// 取得最新的檔案清單並交給 Service Worker，只下載缺少或內容不同的檔案
+async function syncOfflineCache() {
+  try {
+    if (!(await offlineCacheRegistration)) return;
+    const registration = await navigator.serviceWorker.ready;
+    const headers = lastManifestETag ? { 'If-None-Match': lastManifestETag } : {};
+    const response = await fetch(`${SERVER_BASE_URL}/api/display_manifest${displayQuery()}`, { headers, cache: 'no-store' });
+    if (response.status === 304 || !response.ok) return;
+    lastManifestETag = response.headers.get('ETag');
+    const manifest = await response.json();
+    registration.active.postMessage({ type: 'sync-manifest', manifest });
+  } catch (error) {
+    console.warn('同步離線快取失敗:', error);
+  }
+}
+
+// 重新抓取完整資料並更新畫面與離線快取
+function refreshAll() {
+  return fetchMediaData().then(data => {
+    if (!data) {
+      // 抓取失敗：已有畫面時繼續播放，只有首次載入才顯示預設的空白版面
+      if (!lastMediaData) updateAllSections({ media: [], settings: DEFAULT_INTERVALS });
+      return;
+    }
+    updateAllSections(data);
+    syncOfflineCache();
+  });
+}
+
 // WebSocket 初始化
 function initializeWebSocket() {
+  if (typeof io === 'undefined') {
+    // Socket.IO 用戶端無法載入 (例如離線啟動)，繼續以快取內容播放
+    console.warn('Socket.IO 用戶端未載入，略過即時更新');
+    return;
+  }
   const socket = io({
-    transports: ['websocket', 'polling']
+    transports: ['websocket', 'polling'],
+    // 伺服器依此將展示頁加入 displays、section:<區塊> 與 display:<ID> 房間，只推送相關的更新
+    auth: { client: 'display', display_id: getDisplayId(), sections: getSubscribedSections() }
   });
   
-  socket.on('connect', () => console.log('成功連接到 WebSocket 伺服器 (Socket.IO)'));
+  socket.on('connect', () => {
+    console.log('成功連接到 WebSocket 伺服器 (Socket.IO)');
+    // 斷線期間可能錯過增量更新，重新連線後以條件請求確認內容
+    if (lastMediaData) {
+      const knownVersion = lastMediaData.version;
+      fetchMediaData().then(data => {
+        // 網路不穩導致抓取失敗時沒有可比較的版本，保留目前播放的內容
+        if (data && data.version !== undefined && data.version !== knownVersion) {
+          updateAllSections(data);
+          syncOfflineCache();
+        }
+      });
+    }
+  });
   
   socket.on('disconnect', (reason) => {
     console.log(`與 WebSocket 伺服器斷開連線: ${reason}`);
@@ -314,18 +409,88 @@ function initializeWebSocket() {
   
   socket.on('connect_error', (error) => console.error('WebSocket 連線錯誤:', error));
 
-  socket.on('media_updated', (data) => {
-    console.log('收到 "media_updated" 事件:', data.message || data);
-    fetchMediaData().then(updateAllSections);
-  });
-  
-  socket.on('settings_updated', (settings_data) => {
-    console.log('收到 "settings_updated" 事件:', settings_data);
-    fetchMediaData().then(updateAllSections);
+  socket.on('playlist_patch', applyPlaylistPatch);
+  // 伺服器沒有可比較的基準、無法計算增量更新時，改以條件請求重新抓取完整內容
+  socket.on('playlist_resync', () => refreshAll());
+
+  // 螢幕登記或所屬群組改變：重新連線以加入正確的房間，連線後會重新抓取內容
+  socket.on('display_reconfigured', () => {
+    console.log('展示螢幕設定已變更，重新連線');
+    socket.disconnect();
+    socket.connect();
   });
 }
 
+// 展示頁識別碼：網址參數 ?display= (或 ?id=) 優先，否則使用存在 localStorage 的隨機識別碼。
+// 在後台登記此識別碼後，伺服器會回傳套用螢幕群組與螢幕覆寫後的內容
+function getDisplayId() {
+  const params = new URLSearchParams(window.location.search);
+  const fromUrl = params.get('display') || params.get('id');
+  if (fromUrl) return fromUrl;
+  let displayId = localStorage.getItem('display_id');
+  if (!displayId) {
+    displayId = `display-${Math.random().toString(36).slice(2, 10)}`;
+    localStorage.setItem('display_id', displayId);
+  }
+  return displayId;
+}
+
+function displayQuery() {
+  return `?display=${encodeURIComponent(getDisplayId())}`;
+}
+
+// 訂閱的區塊：網址參數 ?sections=header_video,footer_content；未指定時訂閱畫面上的所有區塊
+function getSubscribedSections() {
+  const fromUrl = new URLSearchParams(window.location.search).get('sections');
+  return fromUrl ? fromUrl.split(',').map(key => key.trim()).filter(Boolean) : Object.keys(SECTION_UPDATERS);
+}
+
+function heldVersion(key) {
+  return sectionVersions[key] !== undefined ? sectionVersions[key] : lastMediaData.version;
+}
+
+// 套用伺服器推送的區塊增量更新；偵測到版本缺口時才重新完整抓取
+function applyPlaylistPatch(patch) {
+  if (!lastMediaData || lastMediaData.version === undefined) {
+    refreshAll();
+    return;
+  }
+  const changedKeys = Object.keys(patch.sections || {}).concat(patch.removed_sections || []);
+  if (patch.settings) changedKeys.push('settings');
+  const pendingKeys = changedKeys.filter(key => heldVersion(key) < patch.version);
+  if (pendingKeys.length === 0) {
+    return; // 已經是較新的內容
+  }
+  // base_versions 記錄每個變動區塊上一次變動時的版本，持有的版本較舊代表錯過了更新
+  const baseVersions = patch.base_versions || {};
+  const missed = pendingKeys.find(key => heldVersion(key) < (baseVersions[key] !== undefined ? baseVersions[key] : patch.from_version));
+  if (missed !== undefined) {
+    console.log(`播放清單版本缺口 (${missed} 持有 ${heldVersion(missed)})，重新抓取完整資料`);
+    refreshAll();
+    return;
+  }
+
+  pendingKeys.forEach(key => { sectionVersions[key] = patch.version; });
+  const changedSections = pendingKeys.filter(key => key !== 'settings');
+  const media = (lastMediaData.media || []).filter(item => !changedSections.includes(item.section_key));
+  changedSections.forEach(key => media.push(...((patch.sections || {})[key] || [])));
+  const settingsChanged = pendingKeys.includes('settings');
+
+  // version 保留完整抓取時的版本，作為未收到更新之區塊的基準與重新連線時的比對依據
+  lastMediaData = {
+    ...lastMediaData,
+    media,
+    settings: settingsChanged ? patch.settings : lastMediaData.settings
+  };
+  console.log(`已套用播放清單更新至版本 ${patch.version}，變動區塊:`, pendingKeys);
+
+  // 播放設定變更會影響所有區塊的輪播間隔
+  updateSections(lastMediaData, settingsChanged ? Object.keys(SECTION_UPDATERS) : changedSections);
+  syncOfflineCache();
+}
+
 document.addEventListener("DOMContentLoaded", () => {
-  fetchMediaData().then(updateAllSections);
+  registerOfflineCache();
+  refreshAll();
   initializeWebSocket();
 });
\ No newline at end of file
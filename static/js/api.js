@@ -42,9 +42,10 @@ async function fetchWithAuth(url, options = {}) {
 
 /**
  * Fetches all the initial data needed for the admin panel.
+ * The display payload is lean by default, so the full library is requested explicitly.
  */
 export function getInitialData() {
-    return fetchWithAuth('/api/media_with_settings');
+    return fetchWithAuth('/api/media_with_settings?include=materials,groups,assignments');
 }
 
 /**
@@ -97,6 +98,19 @@ export function updateGroupImages(groupId, imageIds) {
     });
 }
 
+/**
+ * Moves (or inserts) a single image within a group without resending the whole list.
+ * @param {string} groupId - The ID of the group.
+ * @param {string} imageId - The ID of the image to move.
+ * @param {object} target - One of { before_id }, { after_id } or { position: 'first' | 'last' }.
+ */
+export function moveGroupImage(groupId, imageId, target) {
+    return fetchWithAuth(`/api/groups/${groupId}/images/${imageId}/move`, {
+        method: 'POST',
+        body: JSON.stringify(target)
+    });
+}
+
 /**
  * Uploads images specifically to a carousel group.
  * @param {string} groupId - The ID of the group.
@@ -152,6 +166,70 @@ export function uploadMediaWithProgress(formData, onProgress) {
     });
 }
 
+const RESUMABLE_CHUNK_SIZE = 8 * 1024 * 1024;
+const RESUMABLE_MAX_RETRIES = 5;
+
+/**
+ * Sends one byte range of a resumable upload.
+ * @param {string} uploadId - The upload session ID.
+ * @param {Blob} chunk - The bytes to send.
+ * @param {number} start - Offset of the first byte of the chunk.
+ * @param {number} total - Total size of the file.
+ * @returns {Promise<any>} - The parsed JSON response containing the committed offset.
+ */
+async function sendUploadChunk(uploadId, chunk, start, total) {
+    const response = await fetch(`/api/uploads/${uploadId}`, {
+        method: 'PUT',
+        headers: {
+            'Authorization': `Bearer ${JWT_TOKEN}`,
+            'Content-Type': 'application/octet-stream',
+            'Content-Range': `bytes ${start}-${start + chunk.size - 1}/${total}`
+        },
+        body: chunk
+    });
+    const responseData = await response.json();
+    if (!response.ok) {
+        throw new Error(responseData.message || `HTTP Error ${response.status}`);
+    }
+    return responseData;
+}
+
+/**
+ * Uploads a large media file in chunks. After a failed chunk the committed offset
+ * is queried from the server and the upload resumes from there.
+ * @param {File} file - The file to upload.
+ * @param {string} [sectionKey] - Optional section to assign the new material to.
+ * @param {function(number, number): void} [onProgress] - Called with (uploadedBytes, totalBytes).
+ * @returns {Promise<any>} - The JSON response of the finalize request.
+ */
+export async function uploadMediaResumable(file, sectionKey, onProgress) {
+    const session = await fetchWithAuth('/api/uploads', {
+        method: 'POST',
+        body: JSON.stringify({ filename: file.name, size: file.size, section_key: sectionKey || null })
+    });
+    const uploadId = session.data.upload_id;
+    let offset = session.data.offset;
+    let retries = 0;
+
+    while (offset < file.size) {
+        const end = Math.min(offset + RESUMABLE_CHUNK_SIZE, file.size);
+        try {
+            const result = await sendUploadChunk(uploadId, file.slice(offset, end), offset, file.size);
+            offset = result.data.offset;
+            retries = 0;
+            if (onProgress) onProgress(offset, file.size);
+        } catch (error) {
+            retries += 1;
+            if (retries > RESUMABLE_MAX_RETRIES) throw error;
+            await new Promise(resolve => setTimeout(resolve, 1000 * retries));
+            const status = await fetchWithAuth(`/api/uploads/${uploadId}`);
+            offset = status.data.offset;
+        }
+    }
+
+    return fetchWithAuth(`/api/uploads/${uploadId}/complete`, { method: 'POST' });
+}
+
 /**
  * Gets all users from the server.
  * @returns {Promise<any>} - The JSON response containing users data.
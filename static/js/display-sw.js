@@ -0,0 +1,182 @@
+// 展示頁的 Service Worker：依伺服器的檔案清單預先下載媒體，斷線時從本機快取繼續播放。
+// 由 /display-sw.js 提供，註冊時範圍限定為 /display，只控制展示頁。
+
+const MEDIA_CACHE = 'mq-display-media-v1';
+const SHELL_CACHE = 'mq-display-shell-v1';
+const UPLOADS_PREFIX = '/static/uploads/';
+const HASH_HEADER = 'X-Content-SHA256';
+// 超過此大小的檔案不載入記憶體驗證雜湊，直接串流寫入快取
+const MAX_VERIFY_BYTES = 64 * 1024 * 1024;
+
+// 展示頁本身與播放清單 API：優先使用網路，失敗時回退到最後一次成功的回應
+const SHELL_PATHS = ['/display', '/static/css/display.css', '/static/js/animation.js', '/api/media_with_settings'];
+const SOCKET_IO_URL = 'https://cdn.socket.io/4.7.5/socket.io.min.js';
+// 展示頁用來選擇螢幕與訂閱區塊的查詢參數；只帶這些參數的請求也走 networkFirst，並依完整網址分開快取
+const SHELL_QUERY_PARAMS = ['display', 'id', 'sections'];
+
+function isShellRequest(url) {
+  if (url.origin !== self.location.origin || !SHELL_PATHS.includes(url.pathname)) return false;
+  return Array.from(url.searchParams.keys()).every(key => SHELL_QUERY_PARAMS.includes(key));
+}
+
+self.addEventListener('install', event => {
+  event.waitUntil(
+    caches.open(SHELL_CACHE)
+      .then(cache => Promise.allSettled(SHELL_PATHS.concat(SOCKET_IO_URL).map(url => cache.add(url))))
+      .then(() => self.skipWaiting())
+  );
+});
+
+self.addEventListener('activate', event => {
+  event.waitUntil(
+    caches.keys()
+      .then(keys => Promise.all(keys
+        .filter(key => key.startsWith('mq-display-') && key !== MEDIA_CACHE && key !== SHELL_CACHE)
+        .map(key => caches.delete(key))))
+      .then(() => self.clients.claim())
+  );
+});
+
+self.addEventListener('message', event => {
+  if (event.data && event.data.type === 'sync-manifest') {
+    event.waitUntil(syncManifest(event.data.manifest));
+  }
+});
+
+self.addEventListener('fetch', event => {
+  const request = event.request;
+  if (request.method !== 'GET') return;
+  const url = new URL(request.url);
+
+  if (url.origin === self.location.origin && url.pathname.startsWith(UPLOADS_PREFIX)) {
+    event.respondWith(serveMedia(request, url.pathname));
+  } else if (isShellRequest(url) || request.url === SOCKET_IO_URL) {
+    event.respondWith(networkFirst(request, url));
+  }
+});
+
+async function networkFirst(request, url) {
+  const cache = await caches.open(SHELL_CACHE);
+  const cacheKey = url.origin === self.location.origin ? url.pathname + url.search : request.url;
+  try {
+    const response = await fetch(request);
+    if (response.status === 200) {
+      cache.put(cacheKey, response.clone());
+      return response;
+    }
+    if (response.status === 304) return response;
+    throw new Error(`HTTP ${response.status}`);
+  } catch (error) {
+    const cached = await cache.match(cacheKey);
+    if (cached) return cached;
+    throw error;
+  }
+}
+
+// 媒體檔案的網址不會改變內容，已快取就直接使用；影片的 Range 請求由快取切出對應範圍
+async function serveMedia(request, pathname) {
+  const cache = await caches.open(MEDIA_CACHE);
+  const cached = await cache.match(pathname);
+  if (!cached) return fetch(request);
+
+  const range = request.headers.get('Range');
+  if (!range) return cached;
+  return rangeResponse(cached, range);
+}
+
+async function rangeResponse(response, rangeHeader) {
+  const blob = await response.blob();
+  const match = /^bytes=(\d*)-(\d*)$/.exec(rangeHeader.trim());
+  if (!match || (match[1] === '' && match[2] === '')) {
+    return new Response(null, { status: 416, headers: { 'Content-Range': `bytes */${blob.size}` } });
+  }
+
+  let start;
+  let end;
+  if (match[1] === '') {
+    // bytes=-N 代表最後 N 個位元組
+    start = Math.max(blob.size - parseInt(match[2], 10), 0);
+    end = blob.size - 1;
+  } else {
+    start = parseInt(match[1], 10);
+    end = match[2] === '' ? blob.size - 1 : Math.min(parseInt(match[2], 10), blob.size - 1);
+  }
+  if (start >= blob.size || start > end) {
+    return new Response(null, { status: 416, headers: { 'Content-Range': `bytes */${blob.size}` } });
+  }
+
+  return new Response(blob.slice(start, end + 1), {
+    status: 206,
+    headers: {
+      'Content-Type': response.headers.get('Content-Type') || 'application/octet-stream',
+      'Content-Range': `bytes ${start}-${end}/${blob.size}`,
+      'Content-Length': String(end - start + 1),
+      'Accept-Ranges': 'bytes'
+    }
+  });
+}
+
+async function sha256Hex(buffer) {
+  const digest = await crypto.subtle.digest('SHA-256', buffer);
+  return Array.from(new Uint8Array(digest)).map(byte => byte.toString(16).padStart(2, '0')).join('');
+}
+
+// 依優先順序逐一下載缺少或內容不同的檔案，全部完成後移除清單中已不再使用的檔案
+let syncQueue = Promise.resolve();
+
+function syncManifest(manifest) {
+  // 同一時間只執行一次同步，新的清單排在目前的同步之後
+  syncQueue = syncQueue.then(() => runSync(manifest)).catch(error => console.warn('媒體快取同步失敗:', error));
+  return syncQueue;
+}
+
+async function runSync(manifest) {
+  const cache = await caches.open(MEDIA_CACHE);
+  const assets = (manifest.assets || []).slice().sort((a, b) => a.priority - b.priority);
+  let downloaded = 0;
+  let failed = 0;
+
+  for (const asset of assets) {
+    const cached = await cache.match(asset.url);
+    if (cached && (!asset.sha256 || cached.headers.get(HASH_HEADER) === asset.sha256)) continue;
+
+    try {
+      await downloadAsset(cache, asset);
+      downloaded += 1;
+    } catch (error) {
+      failed += 1;
+      console.warn(`下載 ${asset.url} 失敗:`, error);
+    }
+  }
+
+  // 有檔案下載失敗時保留舊檔案，避免斷線時反而沒有內容可播
+  if (failed === 0) {
+    const wanted = new Set(assets.map(asset => asset.url));
+    const keys = await cache.keys();
+    await Promise.all(keys
+      .filter(request => !wanted.has(new URL(request.url).pathname))
+      .map(request => cache.delete(request)));
+  }
+
+  const clients = await self.clients.matchAll();
+  clients.forEach(client => client.postMessage({ type: 'sync-complete', version: manifest.version, downloaded, failed }));
+}
+
+async function downloadAsset(cache, asset) {
+  const response = await fetch(asset.url, { cache: 'no-store' });
+  if (response.status !== 200) throw new Error(`HTTP ${response.status}`);
+
+  const headers = new Headers({ 'Content-Type': asset.mime });
+  if (asset.sha256) headers.set(HASH_HEADER, asset.sha256);
+
+  if (asset.size !== null && asset.size > MAX_VERIFY_BYTES) {
+    await cache.put(asset.url, new Response(response.body, { headers }));
+    return;
+  }
+
+  const buffer = await response.arrayBuffer();
+  if (asset.sha256 && await sha256Hex(buffer) !== asset.sha256) {
+    throw new Error('內容雜湊不符');
+  }
+  await cache.put(asset.url, new Response(buffer, { headers }));
+}
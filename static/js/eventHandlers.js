@@ -7,6 +7,9 @@ import { openGroupEditModal, openReassignMediaModal, closeModal, updateFileName,
 // Event Handlers
 // =========================================================================
 
+// Files larger than this are uploaded through the resumable chunked API
+const RESUMABLE_UPLOAD_THRESHOLD = 32 * 1024 * 1024;
+
 async function handleUploadFormSubmit(event) {
     event.preventDefault();
     const form = event.target;
@@ -18,8 +21,14 @@ async function handleUploadFormSubmit(event) {
 
     try {
         const formData = new FormData(form);
+        const file = formData.get('file');
         if (selectedType === 'group_reference') {
             await api.createAssignment(formData);
+        } else if (file instanceof File && file.size > RESUMABLE_UPLOAD_THRESHOLD) {
+            // Large videos are sent in resumable chunks so a flaky connection does not restart from zero
+            await api.uploadMediaResumable(file, formData.get('section_key'), (loaded, total) => {
+                updateUploadProgress((loaded / total) * 100);
+            });
         } else {
             await api.uploadMediaWithProgress(formData, (e) => {
                 if (e.lengthComputable) {
@@ -4,7 +4,18 @@
 import pytest
 import tempfile
 import os
-from app import app, db, User
+import atexit
+import shutil
+from sqlalchemy import event
+
+# app 匯入時就以 DATABASE_URL 建立引擎，之後再修改 SQLALCHEMY_DATABASE_URI 不會生效；
+# 必須在匯入前指向臨時資料庫，測試才不會改動專案內的 instance/mq_cms.db
+TEST_DATABASE_DIR = tempfile.mkdtemp(prefix='mq-cms-test-')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(TEST_DATABASE_DIR, 'test.db')}"
+atexit.register(shutil.rmtree, TEST_DATABASE_DIR, ignore_errors=True)
+
+from app import (app, db, User, Material, CarouselGroup, GroupImageAssociation,
+                 Assignment, Setting, mark_content_changed, playlist_publisher, principal_cache)
 from werkzeug.security import generate_password_hash
 
 
@@ -15,14 +26,20 @@ def test_app():
     db_fd, db_path = tempfile.mkstemp()
     app.config['DATABASE'] = db_path
     app.config['TESTING'] = True
-    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'  # 使用內存資料庫
     app.config['SECRET_KEY'] = 'test-secret-key'
     app.config['WTF_CSRF_ENABLED'] = False  # 禁用 CSRF 保護以便測試
+    app.config['BROADCAST_QUIET_WINDOW'] = 0  # 廣播立即送出，方便斷言
+    app.config['SCHEDULER_ENABLED'] = False  # 排程切換由測試直接觸發
+    app.config['RENDITION_WORKERS'] = 0  # 圖片尺寸版本同步產生，方便斷言
     
     with app.app_context():
         # 清除並重新創建所有表
         db.drop_all()
         db.create_all()
+        # 資料庫已重建，讓上一個測試留下的播放清單快照失效
+        mark_content_changed()
+        playlist_publisher.reset()
+        principal_cache.clear()
         yield app
         # 測試結束後清理
         db.session.rollback()
@@ -75,7 +92,67 @@ def auth_headers(client, test_user):
         pytest.fail("Failed to get authentication token for test")
 
 
+@pytest.fixture
+def admin_socket_auth(auth_headers):
+    """後台 Socket.IO 連線使用的 auth；只有 token 驗證通過的連線會收到 media_updated 等後台事件"""
+    return {'client': 'admin', 'token': auth_headers['Authorization'].split()[1]}
+
+
 @pytest.fixture
 def runner(test_app):
     """創建命令行測試運行器"""
     return test_app.test_cli_runner()
+
+
+@pytest.fixture
+def sample_content(test_app):
+    """建立展示用的測試內容：一個含三張圖片的輪播群組、一支影片，以及對應的區塊指派"""
+    images = [
+        Material(original_filename=f'image{i}.jpg', filename=f'image{i}.jpg', type='image',
+                 url=f'/static/uploads/image{i}.jpg', source='group_specific')
+        for i in range(3)
+    ]
+    video = Material(original_filename='video.mp4', filename='video.mp4', type='video',
+                     url='/static/uploads/video.mp4')
+    group = CarouselGroup(name='測試群組')
+    db.session.add_all(images + [video, group])
+    db.session.flush()
+
+    for index, image in enumerate(images):
+        db.session.add(GroupImageAssociation(group_id=group.id, material_id=image.id, order=index))
+    db.session.add(Assignment(section_key='carousel_top_left', content_source_type='group_reference',
+                              group_id=group.id, offset=1))
+    db.session.add(Assignment(section_key='header_video', content_source_type='single_media',
+                              media_id=video.id))
+    db.session.add(Setting(key='header_interval', value='5'))
+    db.session.commit()
+    mark_content_changed()
+
+    return {
+        'image_ids': [image.id for image in images],
+        'video_id': video.id,
+        'group_id': group.id
+    }
+
+
+@pytest.fixture
+def sql_statements(test_app):
+    """記錄測試期間執行的所有 SQL 語句，用於斷言查詢次數"""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    yield statements
+    event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+
+
+@pytest.fixture
+def upload_dirs(test_app, tmp_path):
+    """將上傳目錄與上傳暫存目錄導向臨時資料夾，避免測試寫入專案目錄"""
+    original = {key: test_app.config[key] for key in ('UPLOAD_FOLDER', 'UPLOAD_SESSION_FOLDER')}
+    test_app.config['UPLOAD_FOLDER'] = str(tmp_path / 'uploads')
+    test_app.config['UPLOAD_SESSION_FOLDER'] = str(tmp_path / 'upload_sessions')
+    yield tmp_path
+    test_app.config.update(original)
@@ -8,7 +8,8 @@ import {
   updateGroupImages,
   uploadImagesToGroup,
   reassignMedia,
-  uploadMediaWithProgress
+  uploadMediaWithProgress,
+  uploadMediaResumable
 } from '../../static/js/api.js';
 
 describe('API Module', () => {
@@ -53,7 +54,7 @@ describe('API Module', () => {
         await getInitialData();
         
         expect(fetchSpy).toHaveBeenCalledWith(
-          '/api/media_with_settings',
+          '/api/media_with_settings?include=materials,groups,assignments',
           expect.objectContaining({
             headers: expect.objectContaining({
               'Content-Type': 'application/json'
@@ -68,7 +69,7 @@ describe('API Module', () => {
         await getInitialData();
         
         expect(fetchSpy).toHaveBeenCalledWith(
-          '/api/media_with_settings',
+          '/api/media_with_settings?include=materials,groups,assignments',
           expect.objectContaining({
             headers: expect.objectContaining({
               'Content-Type': 'application/json'
@@ -169,7 +170,7 @@ describe('API Module', () => {
         await getInitialData();
         
         expect(fetchSpy).toHaveBeenCalledWith(
-          '/api/media_with_settings',
+          '/api/media_with_settings?include=materials,groups,assignments',
           expect.objectContaining({
             headers: expect.objectContaining({
               'Content-Type': 'application/json'
@@ -433,4 +434,57 @@ describe('API Module', () => {
       expect(mockXHR.upload.onprogress).toBe(onProgress);
     });
   });
+  describe('uploadMediaResumable', () => {
+    const jsonResponse = (body, status = 200) => Promise.resolve({
+      ok: status >= 200 && status < 300,
+      status,
+      json: () => Promise.resolve(body)
+    });
+
+    test('應該建立上傳、以 Content-Range 傳送分段並完成上傳', async () => {
+      const file = new File(['0123456789'], 'promo.mp4', { type: 'video/mp4' });
+      const onProgress = jest.fn();
+      fetchSpy
+        .mockImplementationOnce(() => jsonResponse({ data: { upload_id: 'abc', offset: 0 } }, 201))
+        .mockImplementationOnce(() => jsonResponse({ data: { offset: 10 } }))
+        .mockImplementationOnce(() => jsonResponse({ success: true, data: { id: 'm1' } }, 201));
+
+      const result = await uploadMediaResumable(file, 'header_video', onProgress);
+
+      expect(fetchSpy).toHaveBeenNthCalledWith(1, '/api/uploads', expect.objectContaining({
+        method: 'POST',
+        body: JSON.stringify({ filename: 'promo.mp4', size: 10, section_key: 'header_video' })
+      }));
+      expect(fetchSpy).toHaveBeenNthCalledWith(2, '/api/uploads/abc', expect.objectContaining({
+        method: 'PUT',
+        headers: expect.objectContaining({ 'Content-Range': 'bytes 0-9/10' })
+      }));
+      expect(fetchSpy).toHaveBeenNthCalledWith(3, '/api/uploads/abc/complete', expect.objectContaining({
+        method: 'POST'
+      }));
+      expect(onProgress).toHaveBeenCalledWith(10, 10);
+      expect(result).toEqual({ success: true, data: { id: 'm1' } });
+    });
+
+    test('分段失敗時應該查詢伺服器位移後續傳', async () => {
+      jest.useFakeTimers();
+      const file = new File(['0123456789'], 'promo.mp4', { type: 'video/mp4' });
+      fetchSpy
+        .mockImplementationOnce(() => jsonResponse({ data: { upload_id: 'abc', offset: 0 } }, 201))
+        .mockImplementationOnce(() => jsonResponse({ message: 'timeout' }, 500))
+        .mockImplementationOnce(() => jsonResponse({ data: { offset: 4 } }))
+        .mockImplementationOnce(() => jsonResponse({ data: { offset: 10 } }))
+        .mockImplementationOnce(() => jsonResponse({ success: true }, 201));
+
+      const promise = uploadMediaResumable(file);
+      await jest.runAllTimersAsync();
+      await promise;
+
+      expect(fetchSpy).toHaveBeenNthCalledWith(3, '/api/uploads/abc', expect.anything());
+      expect(fetchSpy).toHaveBeenNthCalledWith(4, '/api/uploads/abc', expect.objectContaining({
+        headers: expect.objectContaining({ 'Content-Range': 'bytes 4-9/10' })
+      }));
+      jest.useRealTimers();
+    });
+  });
 });
@@ -3,7 +3,6 @@
 測試 /api/auth/login 端點的各種情境
 """
 import pytest
-import json
 import jwt
 from datetime import datetime, timedelta, timezone
 from app import User, db
@@ -248,3 +247,64 @@ class TestAuthIntegration:
         assert response.status_code == 401
         data = response.get_json()
         assert 'Token error' in data['message']
+
+
+class TestPrincipalCache:
+    """測試已驗證 token 與使用者的快取"""
+
+    @pytest.fixture
+    def second_admin(self, client, test_app):
+        """建立第二位管理者並返回其 id 與認證 headers"""
+        user = User(username='second', password_hash=generate_password_hash('password'), role='admin', is_active=True)
+        db.session.add(user)
+        db.session.commit()
+        token = client.post('/api/auth/login', json={'username': 'second', 'password': 'password'}).get_json()['access_token']
+        return user.id, {'Authorization': f'Bearer {token}'}
+
+    def _user_queries(self, statements):
+        return [s for s in statements if 'FROM user' in s]
+
+    def test_repeated_requests_skip_user_lookup(self, client, auth_headers, sql_statements):
+        """測試同一個 token 的後續請求不再查詢使用者"""
+        assert client.get('/api/users', headers=auth_headers).status_code == 200
+        sql_statements.clear()
+
+        assert client.get('/api/users', headers=auth_headers).status_code == 200
+        # 只剩下路由本身列出使用者的查詢
+        assert len(self._user_queries(sql_statements)) == 1
+
+    def test_deactivation_takes_effect_immediately(self, client, auth_headers, second_admin):
+        """測試停用使用者後，其已快取的 token 立即失去管理權限"""
+        user_id, headers = second_admin
+        assert client.get('/api/users', headers=headers).status_code == 200
+
+        client.put(f'/api/users/{user_id}', json={'is_active': False}, headers=auth_headers)
+        response = client.get('/api/users', headers=headers)
+        assert response.status_code == 403
+        assert response.get_json()['message'] == '帳戶已被停用'
+
+    def test_deleted_user_token_rejected(self, client, auth_headers, second_admin):
+        """測試刪除使用者後，其 token 不再有效"""
+        user_id, headers = second_admin
+        assert client.get('/api/users', headers=headers).status_code == 200
+
+        client.delete(f'/api/users/{user_id}', headers=auth_headers)
+        assert client.get('/api/users', headers=headers).status_code == 401
+
+    def test_other_process_invalidation(self, client, test_app, auth_headers, second_admin):
+        """測試其他工作程序遞增版本後，本程序在下次比對時清空快取"""
+        from app import CacheVersion, bump_cache_version, principal_cache
+        user_id, headers = second_admin
+        test_app.config['AUTH_CACHE_VERSION_CHECK_INTERVAL'] = 0
+        try:
+            assert client.get('/api/users', headers=headers).status_code == 200
+
+            # 模擬另一個程序直接修改資料庫並遞增版本，本程序的快取尚未被清空
+            db.session.get(User, user_id).role = 'user'
+            db.session.commit()
+            bump_cache_version(principal_cache.VERSION_NAME)
+
+            assert client.get('/api/users', headers=headers).status_code == 403
+            assert db.session.get(CacheVersion, 'auth').version >= 1
+        finally:
+            test_app.config['AUTH_CACHE_VERSION_CHECK_INTERVAL'] = 2.0
@@ -0,0 +1,71 @@
+"""
+CPU 密集工作卸載測試案例
+測試密碼雜湊在執行緒池中執行時，eventlet 事件迴圈仍能持續處理心跳
+"""
+import time
+import pytest
+from werkzeug.security import check_password_hash
+from app import db, User, socketio, run_cpu_bound, hash_password
+
+LOGIN_COUNT = 4
+HEARTBEAT_INTERVAL = 0.01
+
+
+def _login_storm_heartbeat_gap(client):
+    """在連續登入期間以背景 greenlet 模擬心跳，返回兩次心跳之間最長的間隔 (秒)"""
+    ticks = []
+    running = [True]
+
+    def heartbeat():
+        while running[0]:
+            ticks.append(time.monotonic())
+            socketio.sleep(HEARTBEAT_INTERVAL)
+        ticks.append(time.monotonic())
+
+    socketio.start_background_task(heartbeat)
+    socketio.sleep(0)  # 讓心跳 greenlet 先開始
+    try:
+        for _ in range(LOGIN_COUNT):
+            response = client.post('/api/auth/login', json={'username': 'storm', 'password': 'storm-password'})
+            assert response.status_code == 200
+    finally:
+        running[0] = False
+        socketio.sleep(HEARTBEAT_INTERVAL * 2)
+
+    return max(later - earlier for earlier, later in zip(ticks, ticks[1:]))
+
+
+class TestCpuOffload:
+    """測試 CPU 密集工作不阻塞事件迴圈"""
+
+    @pytest.fixture
+    def storm_user(self, test_app):
+        user = User(username='storm', password_hash=hash_password('storm-password'), role='admin')
+        db.session.add(user)
+        db.session.commit()
+        # 單次驗證密碼所需的時間，作為判斷是否阻塞的基準
+        started = time.monotonic()
+        check_password_hash(user.password_hash, 'storm-password')
+        return time.monotonic() - started
+
+    def test_heartbeat_stays_responsive_during_login_storm(self, client, storm_user):
+        """測試連續登入時心跳間隔遠小於單次密碼驗證的時間"""
+        max_gap = _login_storm_heartbeat_gap(client)
+        assert max_gap < storm_user / 2
+
+    def test_inline_hashing_blocks_heartbeat(self, client, test_app, storm_user):
+        """對照組：關閉卸載時，心跳會被密碼驗證整段阻塞"""
+        test_app.config['CPU_OFFLOAD'] = False
+        try:
+            max_gap = _login_storm_heartbeat_gap(client)
+        finally:
+            test_app.config['CPU_OFFLOAD'] = True
+        assert max_gap >= storm_user * 0.8
+
+    def test_exceptions_propagate(self):
+        """測試執行緒池中拋出的例外會傳回呼叫端"""
+        def fail():
+            raise ValueError('boom')
+
+        with pytest.raises(ValueError, match='boom'):
+            run_cpu_bound(fail)
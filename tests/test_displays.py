@@ -0,0 +1,281 @@
+"""
+展示螢幕與螢幕群組測試案例
+測試區塊指派依 全域 → 展示群組 → 單一螢幕 的順序覆寫、每個螢幕的快照快取，
+以及增量更新只送給解析後內容有變動的螢幕
+"""
+import pytest
+import app as app_module
+from app import (db, socketio, Material, CarouselGroup, GroupImageAssociation, Assignment, Display, DisplayGroup,
+                 mark_content_changed)
+
+
+def _video(name):
+    return Material(original_filename=f'{name}.mp4', filename=f'{name}.mp4', type='video',
+                    url=f'/static/uploads/{name}.mp4')
+
+
+@pytest.fixture
+def fleet(test_app, sample_content):
+    """在 sample_content 之上建立一個門市群組與三台螢幕：
+
+    lobby  屬於門市群組，頁首使用群組覆寫
+    kiosk  屬於門市群組，頁首另有自己的覆寫
+    solo   不屬於任何群組，只播全域內容
+    """
+    store = DisplayGroup(name='門市A')
+    store_video, kiosk_video = _video('store'), _video('kiosk')
+    db.session.add_all([store, store_video, kiosk_video])
+    db.session.flush()
+    db.session.add_all([Display(id='lobby', name='大廳', group_id=store.id),
+                        Display(id='kiosk', name='服務台', group_id=store.id),
+                        Display(id='solo', name='獨立螢幕')])
+    db.session.flush()
+    db.session.add_all([
+        Assignment(section_key='header_video', content_source_type='single_media', media_id=store_video.id,
+                   display_group_id=store.id),
+        Assignment(section_key='header_video', content_source_type='single_media', media_id=kiosk_video.id,
+                   display_id='kiosk'),
+    ])
+    db.session.commit()
+    mark_content_changed()
+    return {**sample_content, 'store_id': store.id, 'store_video_id': store_video.id, 'kiosk_video_id': kiosk_video.id}
+
+
+def _section_ids(client, section_key, display_id=None):
+    url = '/api/media_with_settings' + (f'?display={display_id}' if display_id else '')
+    media = client.get(url).get_json()['media']
+    return [item['id'] for item in media if item['section_key'] == section_key]
+
+
+class TestDisplayResolution:
+    """測試每個螢幕的內容解析"""
+
+    def test_scope_precedence(self, client, fleet):
+        """測試螢幕覆寫優先於群組覆寫，群組覆寫優先於全域指派；未覆寫的區塊沿用全域內容"""
+        assert _section_ids(client, 'header_video') == [fleet['video_id']]
+        assert _section_ids(client, 'header_video', 'solo') == [fleet['video_id']]
+        assert _section_ids(client, 'header_video', 'lobby') == [fleet['store_video_id']]
+        assert _section_ids(client, 'header_video', 'kiosk') == [fleet['kiosk_video_id']]
+
+        global_carousel = _section_ids(client, 'carousel_top_left')
+        assert len(global_carousel) == 3
+        for display_id in ('solo', 'lobby', 'kiosk'):
+            assert _section_ids(client, 'carousel_top_left', display_id) == global_carousel
+
+    def test_unknown_display_uses_global_payload(self, client, fleet):
+        """測試未登記的螢幕識別碼取得全域內容"""
+        unknown = client.get('/api/media_with_settings?display=not-registered').get_json()
+        assert unknown == client.get('/api/media_with_settings').get_json()
+
+    def test_cached_payload_skips_database(self, client, fleet, sql_statements):
+        """測試同一版本內再次取得螢幕內容不查詢資料庫"""
+        first = client.get('/api/media_with_settings?display=kiosk')
+        sql_statements.clear()
+        second = client.get('/api/media_with_settings?display=kiosk')
+
+        assert second.data == first.data
+        assert sql_statements == []
+
+    def test_resolution_cost_independent_of_fleet_size(self, client, fleet, sql_statements):
+        """測試解析單一螢幕的查詢數量不隨已登記螢幕與覆寫的數量成長"""
+        def count_statements():
+            mark_content_changed()
+            sql_statements.clear()
+            assert client.get('/api/media_with_settings?display=lobby').status_code == 200
+            return len(sql_statements)
+
+        baseline = count_statements()
+        for index in range(40):
+            db.session.add(Display(id=f'screen-{index}', name=f'螢幕{index}', group_id=fleet['store_id']))
+            db.session.add(Assignment(section_key='footer_content', content_source_type='single_media',
+                                      media_id=fleet['video_id'], display_id=f'screen-{index}'))
+        db.session.commit()
+
+        assert count_statements() == baseline
+
+    def test_manifest_lists_display_assets(self, client, fleet):
+        """測試螢幕的檔案清單只列出該螢幕實際播放的檔案"""
+        kiosk = {asset['url'] for asset in client.get('/api/display_manifest?display=kiosk').get_json()['assets']}
+        shared = {asset['url'] for asset in client.get('/api/display_manifest').get_json()['assets']}
+
+        assert '/static/uploads/kiosk.mp4' in kiosk
+        assert '/static/uploads/video.mp4' not in kiosk
+        assert '/static/uploads/video.mp4' in shared
+
+
+class TestScopedAssignments:
+    """測試指定範圍的區塊指派"""
+
+    def test_scoped_group_assignment_keeps_global(self, client, auth_headers, fleet):
+        """測試只對單一螢幕指派輪播群組時，不會取代全域的同區塊指派"""
+        group = CarouselGroup(name='獨立螢幕群組')
+        image = Material(original_filename='solo.jpg', filename='solo.jpg', type='image', url='/static/uploads/solo.jpg')
+        db.session.add_all([group, image])
+        db.session.flush()
+        db.session.add(GroupImageAssociation(group_id=group.id, material_id=image.id, order=1024))
+        db.session.commit()
+        group_id, image_id = group.id, image.id
+
+        response = client.post('/api/assignments', headers=auth_headers, data={
+            'section_key': 'carousel_top_left', 'type': 'group_reference', 'carousel_group_id': group_id,
+            'display_id': 'solo'})
+        assert response.status_code == 200
+
+        assert _section_ids(client, 'carousel_top_left', 'solo') == [image_id]
+        assert len(_section_ids(client, 'carousel_top_left')) == 3
+        scoped = [a for a in client.get('/api/assignments').get_json()['data'] if a['display_id'] == 'solo']
+        assert [a['group_id'] for a in scoped] == [group_id]
+
+    @pytest.mark.parametrize('scope, message', [
+        ({'display_id': 'missing'}, '找不到指定的展示螢幕'),
+        ({'display_group_id': 'missing'}, '找不到指定的展示群組'),
+        ({'display_id': 'solo', 'display_group_id': 'store'}, '只能指定展示螢幕或展示群組其中之一'),
+    ])
+    def test_invalid_scope(self, client, auth_headers, fleet, scope, message):
+        """測試不存在或互相衝突的指派範圍"""
+        response = client.post('/api/assignments', headers=auth_headers, data={
+            'section_key': 'header_video', 'type': 'single_media', 'media_id': fleet['video_id'], **scope})
+        assert response.status_code == 400
+        assert response.get_json()['message'] == message
+
+
+class TestDisplayApi:
+    """測試展示螢幕與螢幕群組的管理 API"""
+
+    def test_register_and_list(self, client, auth_headers, fleet):
+        """測試登記螢幕並列出"""
+        response = client.post('/api/displays', headers=auth_headers,
+                               json={'id': 'window-1', 'name': '櫥窗', 'group_id': fleet['store_id']})
+        assert response.status_code == 201
+
+        displays = {d['id']: d for d in client.get('/api/displays').get_json()['data']}
+        assert displays['window-1'] == {'id': 'window-1', 'name': '櫥窗', 'group_id': fleet['store_id']}
+        groups = client.get('/api/display_groups').get_json()['data']
+        assert sorted(groups[0]['display_ids']) == ['kiosk', 'lobby', 'window-1']
+
+    @pytest.mark.parametrize('body, status', [
+        ({'id': 'kiosk', 'name': '重複'}, 409),
+        ({'id': 'has space', 'name': '格式錯誤'}, 400),
+        ({'id': 'new-screen'}, 400),
+        ({'id': 'new-screen', 'name': '新螢幕', 'group_id': 'missing'}, 404),
+    ])
+    def test_register_validation(self, client, auth_headers, fleet, body, status):
+        """測試重複、格式錯誤、缺少名稱與不存在的群組"""
+        assert client.post('/api/displays', headers=auth_headers, json=body).status_code == status
+
+    def test_moving_display_changes_resolution(self, client, auth_headers, fleet):
+        """測試螢幕移出群組後不再套用群組覆寫"""
+        client.put('/api/displays/lobby', headers=auth_headers, json={'group_id': None})
+        assert _section_ids(client, 'header_video', 'lobby') == [fleet['video_id']]
+
+    def test_delete_display_removes_its_assignments(self, client, auth_headers, fleet):
+        """測試取消登記螢幕會刪除它專屬的指派"""
+        assert client.delete('/api/displays/kiosk', headers=auth_headers).status_code == 200
+        assert Assignment.query.filter_by(display_id='kiosk').count() == 0
+        assert _section_ids(client, 'header_video', 'kiosk') == [fleet['video_id']]
+
+    def test_delete_group_keeps_displays(self, client, auth_headers, fleet):
+        """測試刪除螢幕群組會移除群組覆寫，螢幕保留登記"""
+        assert client.delete(f"/api/display_groups/{fleet['store_id']}", headers=auth_headers).status_code == 200
+        assert db.session.get(Display, 'lobby').group_id is None
+        assert Assignment.query.filter_by(display_group_id=fleet['store_id']).count() == 0
+        assert _section_ids(client, 'header_video', 'lobby') == [fleet['video_id']]
+
+
+class TestDisplayNotifications:
+    """測試已登記螢幕的增量更新與重新設定通知"""
+
+    @pytest.fixture
+    def connect(self, test_app, client, fleet):
+        client.get('/api/media_with_settings')
+        sockets = []
+
+        def _connect(display_id, sections=None):
+            socket_client = socketio.test_client(test_app, auth={'client': 'display', 'display_id': display_id,
+                                                                 'sections': sections})
+            socket_client.get_received()
+            sockets.append(socket_client)
+            return socket_client
+
+        yield _connect
+        for socket_client in sockets:
+            socket_client.disconnect()
+
+    def _events(self, socket_client, name):
+        return [e['args'][0] for e in socket_client.get_received() if e['name'] == name]
+
+    def _reassign(self, client, auth_headers, section_key, media_id, **scope):
+        response = client.post('/api/assignments', headers=auth_headers, data={
+            'section_key': section_key, 'type': 'single_media', 'media_id': media_id, **scope})
+        assert response.status_code == 200
+
+    def test_overridden_section_ignores_global_change(self, client, auth_headers, fleet, connect):
+        """測試全域頁首變更不會喚醒已覆寫頁首的螢幕，但會送到未登記的展示頁"""
+        kiosk = connect('kiosk')
+        unregistered = connect('hallway', ['header_video'])
+        header = Assignment.query.filter_by(section_key='header_video', display_id=None, display_group_id=None).one()
+
+        client.delete(f'/api/assignments/{header.id}', headers=auth_headers)
+
+        assert kiosk.get_received() == []
+        patches = self._events(unregistered, 'playlist_patch')
+        assert len(patches) == 1
+        assert patches[0]['removed_sections'] == ['header_video']
+
+    def test_display_override_reaches_only_that_display(self, client, auth_headers, fleet, connect):
+        """測試螢幕覆寫只推送給該螢幕，並以該螢幕的內容計算區塊"""
+        kiosk, lobby = connect('kiosk'), connect('lobby')
+        unregistered = connect('hallway')
+
+        self._reassign(client, auth_headers, 'footer_content', fleet['video_id'], display_id='kiosk')
+
+        patches = self._events(kiosk, 'playlist_patch')
+        assert len(patches) == 1
+        assert patches[0]['display_id'] == 'kiosk'
+        assert [item['id'] for item in patches[0]['sections']['footer_content']] == [fleet['video_id']]
+        assert lobby.get_received() == []
+        assert unregistered.get_received() == []
+
+    def test_publish_resolves_only_affected_displays(self, client, auth_headers, fleet, monkeypatch):
+        """測試群組覆寫變更只重新解析該群組的螢幕，不隨其他已登記螢幕的數量成長"""
+        for index in range(20):
+            db.session.add(Display(id=f'screen-{index}', name=f'螢幕{index}'))
+        db.session.commit()
+        mark_content_changed()
+        client.get('/api/media_with_settings')
+
+        resolved = []
+        original = app_module.resolve_display_payload
+
+        def counting_resolve(catalog, display_id=None):
+            resolved.append(display_id)
+            return original(catalog, display_id)
+
+        monkeypatch.setattr(app_module, 'resolve_display_payload', counting_resolve)
+        self._reassign(client, auth_headers, 'footer_content', fleet['video_id'], display_group_id=fleet['store_id'])
+
+        assert set(resolved) == {'kiosk', 'lobby'}
+
+    def test_global_change_skips_overridden_displays(self, client, auth_headers, fleet, monkeypatch):
+        """測試全域區塊變更不會重新解析已覆寫該區塊的螢幕"""
+        client.get('/api/media_with_settings')
+        resolved = []
+        original = app_module.resolve_display_payload
+
+        def counting_resolve(catalog, display_id=None):
+            resolved.append(display_id)
+            return original(catalog, display_id)
+
+        monkeypatch.setattr(app_module, 'resolve_display_payload', counting_resolve)
+        header = Assignment.query.filter_by(section_key='header_video', display_id=None, display_group_id=None).one()
+        client.delete(f'/api/assignments/{header.id}', headers=auth_headers)
+
+        assert set(resolved) == {None, 'solo'}
+
+    def test_registration_sends_reconfigured(self, client, auth_headers, fleet, connect):
+        """測試登記正在連線的螢幕時通知它重新連線"""
+        newcomer = connect('newcomer')
+
+        client.post('/api/displays', headers=auth_headers, json={'id': 'newcomer', 'name': '新螢幕'})
+
+        assert self._events(newcomer, 'display_reconfigured') == [{'display_id': 'newcomer'}]
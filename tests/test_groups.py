@@ -0,0 +1,304 @@
+"""
+輪播群組圖片排序測試案例
+測試 PUT /api/groups/<group_id>/images 以固定數量的 SQL 語句完成排序，且差異模式只改寫被移動的資料；
+以及移動單張圖片的 API 只改寫一筆資料
+"""
+import pytest
+from app import (db, socketio, Material, CarouselGroup, GroupImageAssociation, GROUP_ORDER_GAP, playlist_cache,
+                 plan_group_order)
+
+IMAGE_COUNT = 300
+
+
+@pytest.fixture
+def group_with_images(test_app):
+    """建立一個含有 IMAGE_COUNT 張圖片的群組，返回 (群組ID, 依順序排列的圖片ID)"""
+    group = CarouselGroup(name='大型輪播')
+    images = [Material(original_filename=f'{index}.jpg', filename=f'{index}.jpg', type='image',
+                       url=f'/static/uploads/{index}.jpg', source='group_specific') for index in range(IMAGE_COUNT)]
+    db.session.add(group)
+    db.session.add_all(images)
+    db.session.flush()
+    db.session.add_all([GroupImageAssociation(group_id=group.id, material_id=image.id, order=(index + 1) * GROUP_ORDER_GAP)
+                        for index, image in enumerate(images)])
+    db.session.commit()
+    ids = group.id, [image.id for image in images]
+    db.session.expunge_all()
+    return ids
+
+
+def _stored_order(group_id):
+    return [assoc.material_id for assoc in
+            GroupImageAssociation.query.filter_by(group_id=group_id).order_by(GroupImageAssociation.order)]
+
+
+def _reorder(client, auth_headers, group_id, image_ids, **extra):
+    response = client.put(f'/api/groups/{group_id}/images', json={'image_ids': image_ids, **extra}, headers=auth_headers)
+    assert response.status_code == 200
+    return response.get_json()['data']
+
+
+def _writes(sql_statements):
+    return [statement for statement in sql_statements if statement.split()[0] in ('INSERT', 'UPDATE', 'DELETE')]
+
+
+class TestGroupImageReorder:
+    """測試群組圖片排序"""
+
+    def test_diff_mode_only_rewrites_moved_rows(self, client, auth_headers, group_with_images):
+        """測試交換相鄰兩張圖片只更新其中一筆資料"""
+        group_id, image_ids = group_with_images
+        new_order = image_ids[:]
+        new_order[10], new_order[11] = new_order[11], new_order[10]
+
+        data = _reorder(client, auth_headers, group_id, new_order)
+
+        assert data['changes'] == {'inserted': 0, 'moved': 1, 'removed': 0}
+        assert data['image_ids'] == new_order
+        assert _stored_order(group_id) == new_order
+
+    def test_move_first_to_last_rewrites_one_row(self, client, auth_headers, group_with_images, sql_statements):
+        """測試把第一張圖片移到大型群組的末尾只更新一筆資料"""
+        group_id, image_ids = group_with_images
+        new_order = image_ids[1:] + image_ids[:1]
+
+        sql_statements.clear()
+        data = _reorder(client, auth_headers, group_id, new_order)
+
+        assert data['changes'] == {'inserted': 0, 'moved': 1, 'removed': 0}
+        assert _stored_order(group_id) == new_order
+        assert len(_writes(sql_statements)) == 1
+
+    def test_constant_statement_count(self, client, auth_headers, group_with_images, sql_statements):
+        """測試整個順序反轉時，SQL 語句數量不隨圖片數量成長"""
+        group_id, image_ids = group_with_images
+        reversed_ids = image_ids[::-1]
+
+        sql_statements.clear()
+        data = _reorder(client, auth_headers, group_id, reversed_ids)
+        statements = list(sql_statements)
+
+        # 反轉後最長的遞增子序列只有一張，其餘都要改寫
+        assert data['changes']['moved'] == IMAGE_COUNT - 1
+        assert _stored_order(group_id) == reversed_ids
+        # 驗證圖片一次、讀取目前順序一次、批次更新一次
+        assert len([statement for statement in statements if 'FROM material' in statement]) == 1
+        assert len([statement for statement in statements if 'group_image_association' in statement]) == 2
+        assert len(_writes(statements)) == 1
+
+    def test_add_and_remove_images(self, client, auth_headers, group_with_images, test_app):
+        """測試加入新圖片、移除舊圖片，並略過不存在與重複的ID"""
+        group_id, image_ids = group_with_images
+        extra = Material(original_filename='new.jpg', filename='new.jpg', type='image', url='/static/uploads/new.jpg')
+        db.session.add(extra)
+        db.session.commit()
+        new_order = [extra.id, 'missing-id'] + image_ids[1:] + [extra.id]
+
+        data = _reorder(client, auth_headers, group_id, new_order)
+
+        expected = [extra.id] + image_ids[1:]
+        assert data['image_ids'] == expected
+        assert data['image_count'] == IMAGE_COUNT
+        assert data['changes']['inserted'] == 1
+        assert data['changes']['removed'] == 1
+        assert _stored_order(group_id) == expected
+
+    def test_replace_mode(self, client, auth_headers, group_with_images, sql_statements):
+        """測試取代模式以一次刪除與一次批次寫入完成"""
+        group_id, image_ids = group_with_images
+        new_order = image_ids[5:] + image_ids[:5]
+
+        sql_statements.clear()
+        data = _reorder(client, auth_headers, group_id, new_order, mode='replace')
+
+        assert data['changes']['inserted'] == IMAGE_COUNT
+        assert _stored_order(group_id) == new_order
+        writes = _writes(sql_statements)
+        assert [statement.split()[0] for statement in writes] == ['DELETE', 'INSERT']
+
+    def test_unchanged_order_writes_nothing(self, client, auth_headers, group_with_images, sql_statements):
+        """測試順序沒有改變時不寫入資料庫"""
+        group_id, image_ids = group_with_images
+        sql_statements.clear()
+        data = _reorder(client, auth_headers, group_id, image_ids)
+
+        assert data['changes'] == {'inserted': 0, 'moved': 0, 'removed': 0}
+        assert _writes(sql_statements) == []
+
+    @pytest.mark.parametrize('order_key', [
+        lambda index: index,  # 改用間隔排序鍵之前的 0..n-1
+        lambda index: (index + 1) * GROUP_ORDER_GAP + (index % 3) * 7,  # 經過 move_group_image 的不等間隔
+    ])
+    def test_unchanged_order_keeps_existing_keys(self, client, auth_headers, group_with_images, sql_statements,
+                                                 order_key):
+        """測試不是等間隔的既有排序鍵在順序未變時不會被改寫，也不遞增內容版本"""
+        group_id, image_ids = group_with_images
+        _set_orders(group_id, {image_id: order_key(index) for index, image_id in enumerate(image_ids)})
+        version = playlist_cache.version
+
+        sql_statements.clear()
+        data = _reorder(client, auth_headers, group_id, image_ids)
+
+        assert data['changes'] == {'inserted': 0, 'moved': 0, 'removed': 0}
+        assert _writes(sql_statements) == []
+        assert playlist_cache.version == version
+
+    def test_no_gap_renumbers_locally(self, client, auth_headers, group_with_images):
+        """測試連續排序鍵之間沒有空位時，只重新編號目標位置附近的圖片"""
+        group_id, image_ids = group_with_images
+        # 第 98~102 張經過多次移動後排序鍵相連，其餘仍是等間隔
+        _set_orders(group_id, {image_id: 99 * GROUP_ORDER_GAP + index - 98
+                               for index, image_id in enumerate(image_ids) if 98 <= index <= 102})
+        new_order = image_ids[:101] + [image_ids[-1]] + image_ids[101:-1]
+
+        data = _reorder(client, auth_headers, group_id, new_order)
+
+        assert _stored_order(group_id) == new_order
+        assert data['changes']['moved'] <= 7
+
+    def test_invalid_mode(self, client, auth_headers, group_with_images):
+        """測試不支援的模式回應 400"""
+        group_id, image_ids = group_with_images
+        response = client.put(f'/api/groups/{group_id}/images', json={'image_ids': image_ids, 'mode': 'bogus'},
+                              headers=auth_headers)
+        assert response.status_code == 400
+
+
+def _move(client, auth_headers, group_id, image_id, **body):
+    return client.post(f'/api/groups/{group_id}/images/{image_id}/move', json=body, headers=auth_headers)
+
+
+def _set_orders(group_id, orders):
+    """直接設定排序鍵，模擬間隔已用盡的群組"""
+    for material_id, order in orders.items():
+        db.session.get(GroupImageAssociation, (group_id, material_id)).order = order
+    db.session.commit()
+
+
+class TestPlanGroupOrder:
+    """測試差異排序的排序鍵配置"""
+
+    def test_inserts_between_existing_keys(self):
+        """測試新加入的圖片取得前後兩張之間的鍵，既有圖片不變"""
+        assert plan_group_order(['a', 'new', 'b'], {'a': 1024, 'b': 2048}) == {'new': 1536}
+
+    def test_inserts_at_both_ends(self):
+        """測試加在開頭與末尾的圖片以固定間隔往外延伸"""
+        assert plan_group_order(['x', 'a', 'y'], {'a': 1024}) == {'x': 0, 'y': 2048}
+
+    def test_local_renumber_keeps_order(self):
+        """測試空位不足時向兩側擴大重新編號的範圍，結果仍嚴格遞增"""
+        current = {image_id: index for index, image_id in enumerate('abcdef')}
+        image_ids = ['a', 'b', 'f', 'c', 'd', 'e']
+        orders = {**current, **plan_group_order(image_ids, current)}
+        keys = [orders[image_id] for image_id in image_ids]
+        assert keys == sorted(set(keys))
+
+
+class TestMoveGroupImage:
+    """測試移動單張群組圖片"""
+
+    @pytest.mark.parametrize('body, expected_index', [
+        ({'before_id': 10}, 10),
+        ({'after_id': 10}, 11),
+        ({'position': 'first'}, 0),
+        ({'position': 'last'}, IMAGE_COUNT - 1),
+        ({}, IMAGE_COUNT - 1),
+    ])
+    def test_move_positions(self, client, auth_headers, group_with_images, body, expected_index):
+        """測試 before_id、after_id 與 position 的移動結果"""
+        group_id, image_ids = group_with_images
+        moving = image_ids[200]
+        body = {key: image_ids[value] if key.endswith('_id') else value for key, value in body.items()}
+
+        response = _move(client, auth_headers, group_id, moving, **body)
+
+        assert response.status_code == 200
+        expected = [image_id for image_id in image_ids if image_id != moving]
+        expected.insert(expected_index, moving)
+        assert _stored_order(group_id) == expected
+
+    def test_move_writes_one_row(self, client, auth_headers, group_with_images, sql_statements):
+        """測試移動只執行一筆 UPDATE，且查詢數量與群組大小無關"""
+        group_id, image_ids = group_with_images
+        sql_statements.clear()
+        response = _move(client, auth_headers, group_id, image_ids[-1], before_id=image_ids[0])
+        statements = list(sql_statements)
+
+        assert response.status_code == 200
+        writes = _writes(statements)
+        assert len(writes) == 1
+        assert writes[0].startswith('UPDATE group_image_association')
+        assert len([statement for statement in statements if 'group_image_association' in statement]) == 4
+
+    def test_insert_new_image(self, client, auth_headers, group_with_images):
+        """測試移動不在群組中的圖片時會插入該位置"""
+        group_id, image_ids = group_with_images
+        extra = Material(original_filename='new.jpg', filename='new.jpg', type='image', url='/static/uploads/new.jpg')
+        db.session.add(extra)
+        db.session.commit()
+
+        response = _move(client, auth_headers, group_id, extra.id, after_id=image_ids[0])
+
+        assert response.get_json()['data']['inserted'] is True
+        assert _stored_order(group_id)[:3] == [image_ids[0], extra.id, image_ids[1]]
+
+    def test_no_gap_renumbers_inline(self, client, auth_headers, group_with_images):
+        """測試相鄰排序鍵沒有空位時先重新編號再移動"""
+        group_id, image_ids = group_with_images
+        _set_orders(group_id, {image_ids[0]: 1, image_ids[1]: 2})
+
+        response = _move(client, auth_headers, group_id, image_ids[5], after_id=image_ids[0])
+
+        assert response.status_code == 200
+        assert _stored_order(group_id)[:3] == [image_ids[0], image_ids[5], image_ids[1]]
+
+    def test_tight_gap_schedules_background_renumber(self, client, auth_headers, group_with_images):
+        """測試新排序鍵與相鄰圖片只差 1 時，背景會把群組重新編為等間隔"""
+        group_id, image_ids = group_with_images
+        _set_orders(group_id, {image_ids[0]: 10, image_ids[1]: 12})
+
+        response = _move(client, auth_headers, group_id, image_ids[5], after_id=image_ids[0])
+        assert response.get_json()['data']['order'] == 11
+
+        for _ in range(50):
+            socketio.sleep(0.02)
+            db.session.expire_all()
+            orders = [assoc.order for assoc in
+                      GroupImageAssociation.query.filter_by(group_id=group_id).order_by(GroupImageAssociation.order)]
+            if orders[:3] == [GROUP_ORDER_GAP, 2 * GROUP_ORDER_GAP, 3 * GROUP_ORDER_GAP]:
+                break
+        assert orders == [(index + 1) * GROUP_ORDER_GAP for index in range(IMAGE_COUNT)]
+        assert _stored_order(group_id)[:3] == [image_ids[0], image_ids[5], image_ids[1]]
+
+    def test_already_in_place(self, client, auth_headers, group_with_images, sql_statements):
+        """測試圖片已在目標位置時不寫入資料庫"""
+        group_id, image_ids = group_with_images
+        sql_statements.clear()
+        response = _move(client, auth_headers, group_id, image_ids[3], after_id=image_ids[2])
+        assert response.status_code == 200
+        assert _writes(sql_statements) == []
+
+    @pytest.mark.parametrize('body, status', [
+        ({'before_id': 'missing'}, 404),
+        ({'before_id': 0, 'after_id': 1}, 400),
+        ({'position': 'middle'}, 400),
+        ({'after_id': 'self'}, 400),
+    ])
+    def test_invalid_requests(self, client, auth_headers, group_with_images, body, status):
+        """測試參考圖片不存在、參數衝突與以自己為參考位置"""
+        group_id, image_ids = group_with_images
+        resolved = {}
+        for key, value in body.items():
+            if isinstance(value, int):
+                value = image_ids[value]
+            elif value == 'self':
+                value = image_ids[7]
+            resolved[key] = value
+        assert _move(client, auth_headers, group_id, image_ids[7], **resolved).status_code == status
+
+    def test_unknown_image_or_group(self, client, auth_headers, group_with_images):
+        """測試不存在的圖片或群組回應 404"""
+        group_id, image_ids = group_with_images
+        assert _move(client, auth_headers, group_id, 'missing').status_code == 404
+        assert _move(client, auth_headers, 'missing', image_ids[0]).status_code == 404
@@ -0,0 +1,107 @@
+"""
+資料庫索引測試案例
+以 EXPLAIN QUERY PLAN 檢查應用程式實際執行的熱門查詢都使用索引，而不是掃描整張資料表
+"""
+import pytest
+from sqlalchemy import event
+from app import (db, Material, CarouselGroup, GroupImageAssociation, Assignment,
+                 _create_assignment_record)
+
+
+@pytest.fixture
+def captured_sql(test_app):
+    """記錄測試期間執行的 SQL 語句與參數"""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    yield statements
+    event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+
+
+@pytest.fixture
+def library(test_app):
+    """建立一個含兩張圖片的群組、一個影片素材，以及各自的指派"""
+    group = CarouselGroup(name='群組')
+    video = Material(original_filename='clip.mp4', filename='clip.mp4', type='video', url='/static/uploads/clip.mp4')
+    images = [Material(original_filename=f'{index}.jpg', filename=f'{index}.jpg', type='image',
+                       url=f'/static/uploads/{index}.jpg', source='group_specific') for index in range(2)]
+    db.session.add_all([group, video, *images])
+    db.session.flush()
+    for order, image in enumerate(images):
+        db.session.add(GroupImageAssociation(group_id=group.id, material_id=image.id, order=order))
+    db.session.add(Assignment(section_key='header_video', content_source_type='single_media', media_id=video.id))
+    db.session.add(Assignment(section_key='carousel_top', content_source_type='group_reference', group_id=group.id))
+    db.session.commit()
+    ids = {'group': group.id, 'video': video.id, 'image': images[0].id}
+    db.session.expunge_all()
+    return ids
+
+
+def _statement_on(captured, table, keyword):
+    """從記錄的語句中找出作用於指定資料表、且包含指定關鍵字的第一筆"""
+    for statement, parameters in captured:
+        if f'FROM {table}' in statement and keyword in statement:
+            return statement, parameters
+    raise AssertionError(f'沒有執行 {table} 上包含 {keyword!r} 的查詢')
+
+
+def _query_plan(statement, parameters):
+    rows = db.session.connection().exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}', parameters).all()
+    return [row[-1] for row in rows]
+
+
+def _assert_uses_index(captured, table, keyword, index_name):
+    plan = _query_plan(*_statement_on(captured, table, keyword))
+    assert any(f'USING INDEX {index_name}' in line or f'USING COVERING INDEX {index_name}' in line
+               for line in plan), plan
+    assert not any(line.startswith(f'SCAN {table}') for line in plan), plan
+
+
+class TestHotQueryIndexes:
+    """測試熱門查詢的執行計畫使用索引"""
+
+    def test_assignment_replace_by_section(self, library, captured_sql):
+        """測試指派輪播組時依 section_key 刪除舊指派"""
+        success, _ = _create_assignment_record({'section_key': 'carousel_top', 'type': 'group_reference',
+                                                'carousel_group_id': library['group']})
+        assert success
+        db.session.flush()
+        _assert_uses_index(captured_sql, 'assignment', 'section_key', 'ix_assignment_section_key')
+
+    def test_material_delete_cascades(self, library, captured_sql):
+        """測試刪除素材時依 media_id 與 material_id 找出要級聯刪除的資料"""
+        db.session.delete(db.session.get(Material, library['video']))
+        db.session.delete(db.session.get(Material, library['image']))
+        db.session.flush()
+        _assert_uses_index(captured_sql, 'assignment', 'assignment.media_id', 'ix_assignment_media_id')
+        _assert_uses_index(captured_sql, 'group_image_association', 'group_image_association.material_id',
+                           'ix_group_image_association_material_id')
+
+    def test_group_delete_cascades(self, library, captured_sql):
+        """測試刪除群組時依 group_id 找出要級聯刪除的指派"""
+        db.session.delete(db.session.get(CarouselGroup, library['group']))
+        db.session.flush()
+        _assert_uses_index(captured_sql, 'assignment', 'assignment.group_id', 'ix_assignment_group_id')
+
+    def test_ordered_group_images(self, library, captured_sql):
+        """測試依順序載入群組圖片時由索引排序，不需要另建暫存 B-tree"""
+        group = db.session.get(CarouselGroup, library['group'])
+        assert [assoc.order for assoc in group.image_associations] == [0, 1]
+        statement, parameters = _statement_on(captured_sql, 'group_image_association', 'ORDER BY')
+        plan = _query_plan(statement, parameters)
+        assert any('ix_group_image_association_group_id_order' in line for line in plan), plan
+        assert not any('TEMP B-TREE' in line for line in plan), plan
+
+    def test_max_group_order(self, library, captured_sql):
+        """測試 upload_group_images 的 max(order) 查詢"""
+        max_order = db.session.query(db.func.max(GroupImageAssociation.order)).filter_by(group_id=library['group']).scalar()
+        assert max_order == 1
+        _assert_uses_index(captured_sql, 'group_image_association', 'max(', 'ix_group_image_association_group_id_order')
+
+    def test_group_specific_materials(self, library, captured_sql):
+        """測試依來源篩選素材"""
+        assert Material.query.filter(Material.source == 'group_specific').count() == 2
+        _assert_uses_index(captured_sql, 'material', 'material.source', 'ix_material_source')
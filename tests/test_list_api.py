@@ -0,0 +1,92 @@
+"""
+列表 API 分頁與欄位投影測試案例
+測試 /api/materials、/api/groups、/api/assignments 的 limit / cursor / fields 參數
+"""
+import pytest
+from app import db, Material, mark_content_changed
+
+
+@pytest.fixture
+def many_materials(test_app):
+    """建立七筆素材"""
+    materials = [
+        Material(original_filename=f'file{i}.jpg', filename=f'file{i}.jpg', type='image',
+                 url=f'/static/uploads/file{i}.jpg')
+        for i in range(7)
+    ]
+    db.session.add_all(materials)
+    db.session.commit()
+    mark_content_changed()
+    return sorted(material.id for material in materials)
+
+
+class TestKeysetPagination:
+    """測試以游標分頁"""
+
+    def test_default_response_is_unpaginated(self, client, many_materials):
+        """測試未帶分頁參數時維持原本的完整回應"""
+        data = client.get('/api/materials').get_json()
+        assert len(data['data']) == 7
+        assert 'next_cursor' not in data
+
+    def test_pages_cover_all_rows_in_stable_order(self, client, many_materials):
+        """測試依游標逐頁讀取可取得所有資料，且順序穩定不重複"""
+        seen = []
+        url = '/api/materials?limit=3'
+        pages = 0
+        while True:
+            data = client.get(url).get_json()
+            pages += 1
+            seen.extend(item['id'] for item in data['data'])
+            if data['next_cursor'] is None:
+                break
+            url = f"/api/materials?limit=3&cursor={data['next_cursor']}"
+
+        assert pages == 3
+        assert seen == many_materials
+
+    def test_exact_last_page_has_no_cursor(self, client, many_materials):
+        """測試最後一頁剛好填滿時不再返回游標"""
+        data = client.get('/api/materials?limit=7').get_json()
+        assert len(data['data']) == 7
+        assert data['next_cursor'] is None
+
+    def test_groups_and_assignments_paginate(self, client, sample_content):
+        """測試群組與指派列表同樣支援分頁"""
+        groups = client.get('/api/groups?limit=1').get_json()
+        assert len(groups['data']) == 1
+        assert groups['next_cursor'] is None
+
+        first = client.get('/api/assignments?limit=1').get_json()
+        second = client.get(f"/api/assignments?limit=1&cursor={first['next_cursor']}").get_json()
+        assert first['data'][0]['id'] < second['data'][0]['id']
+        assert second['next_cursor'] is None
+
+    @pytest.mark.parametrize('query', ['limit=0', 'limit=abc', 'limit=501', 'cursor=%%%', 'fields=password'])
+    def test_invalid_parameters(self, client, query):
+        """測試無效的分頁或欄位參數回應 400"""
+        response = client.get(f'/api/materials?{query}')
+        assert response.status_code == 400
+        assert response.get_json()['success'] is False
+
+
+class TestFieldProjection:
+    """測試 fields 欄位投影"""
+
+    def test_materials_projection(self, client, many_materials):
+        """測試素材只返回指定欄位"""
+        data = client.get('/api/materials?fields=id,url&limit=2').get_json()
+        assert all(set(item) == {'id', 'url'} for item in data['data'])
+
+    def test_assignment_projection_skips_relations(self, client, sample_content):
+        """測試指派投影掉關聯資料時不輸出 material / group"""
+        data = client.get('/api/assignments?fields=id,section_key').get_json()
+        assert all(set(item) == {'id', 'section_key'} for item in data['data'])
+
+    def test_group_projection_skips_image_query(self, client, sample_content, sql_statements):
+        """測試群組不需要圖片欄位時不查詢圖片關聯"""
+        sql_statements.clear()
+        data = client.get('/api/groups?fields=id,name').get_json()
+
+        assert data['data'] == [{'id': sample_content['group_id'], 'name': '測試群組'}]
+        assert len(sql_statements) == 1
@@ -0,0 +1,89 @@
+"""
+媒體檔案服務測試案例
+測試 /static/uploads 的 Range 請求、快取標頭與代理傳送模式
+"""
+import os
+import pytest
+
+
+@pytest.fixture
+def media_file(upload_dirs):
+    """在上傳目錄中建立一個 1000 位元組的影片檔"""
+    os.makedirs(upload_dirs / 'uploads')
+    content = bytes(range(250)) * 4
+    (upload_dirs / 'uploads' / 'clip.mp4').write_bytes(content)
+    return content
+
+
+@pytest.fixture
+def sendfile_mode(test_app):
+    yield lambda mode: test_app.config.update(MEDIA_SENDFILE=mode)
+    test_app.config['MEDIA_SENDFILE'] = None
+
+
+class TestMediaServing:
+    """測試上傳媒體的傳送"""
+
+    def test_full_response_is_immutable(self, client, media_file):
+        """測試完整回應帶有永久快取與 Range 支援的標頭"""
+        response = client.get('/static/uploads/clip.mp4')
+
+        assert response.status_code == 200
+        assert response.data == media_file
+        assert response.mimetype == 'video/mp4'
+        assert response.headers['Accept-Ranges'] == 'bytes'
+        assert response.cache_control.immutable
+        assert response.cache_control.public
+        assert response.cache_control.max_age == 365 * 24 * 60 * 60
+
+    def test_range_request(self, client, media_file):
+        """測試 Range 請求只返回指定的位元組範圍"""
+        response = client.get('/static/uploads/clip.mp4', headers={'Range': 'bytes=100-199'})
+
+        assert response.status_code == 206
+        assert response.data == media_file[100:200]
+        assert response.headers['Content-Range'] == 'bytes 100-199/1000'
+        assert response.cache_control.immutable
+
+    def test_open_ended_and_unsatisfiable_ranges(self, client, media_file):
+        """測試開放結尾的範圍與超出檔案大小的範圍"""
+        tail = client.get('/static/uploads/clip.mp4', headers={'Range': 'bytes=900-'})
+        assert tail.status_code == 206
+        assert tail.data == media_file[900:]
+
+        response = client.get('/static/uploads/clip.mp4', headers={'Range': 'bytes=5000-6000'})
+        assert response.status_code == 416
+
+    def test_conditional_request(self, client, media_file):
+        """測試 If-None-Match 相符時回應 304"""
+        etag = client.get('/static/uploads/clip.mp4').headers['ETag']
+        response = client.get('/static/uploads/clip.mp4', headers={'If-None-Match': etag})
+        assert response.status_code == 304
+
+    @pytest.mark.parametrize('path', ['missing.mp4', '../secret.txt', '..%2Fsecret.txt'])
+    def test_missing_or_outside_files(self, client, media_file, upload_dirs, path):
+        """測試不存在或位於上傳目錄之外的檔案回應 404"""
+        (upload_dirs / 'secret.txt').write_text('secret')
+        response = client.get(f'/static/uploads/{path}')
+        assert response.status_code == 404
+
+    def test_x_accel_redirect(self, client, media_file, sendfile_mode):
+        """測試 nginx 模式只返回內部轉址標頭"""
+        sendfile_mode('x-accel-redirect')
+        response = client.get('/static/uploads/clip.mp4')
+
+        assert response.status_code == 200
+        assert response.data == b''
+        assert response.headers['X-Accel-Redirect'] == '/_protected_uploads/clip.mp4'
+        assert response.mimetype == 'video/mp4'
+        assert response.cache_control.immutable
+
+        assert client.get('/static/uploads/missing.mp4').status_code == 404
+
+    def test_x_sendfile(self, client, media_file, upload_dirs, sendfile_mode):
+        """測試 X-Sendfile 模式把檔案路徑交給前端伺服器"""
+        sendfile_mode('x-sendfile')
+        response = client.get('/static/uploads/clip.mp4')
+
+        assert response.headers['X-Sendfile'] == str(upload_dirs / 'uploads' / 'clip.mp4')
+        assert response.data == b''
@@ -0,0 +1,171 @@
+"""
+效能指標測試案例
+測試 Prometheus 文字格式的輸出，請求、SQL、Socket.IO、上傳與快照快取的指標，以及慢查詢記錄與查詢數標頭
+"""
+import io
+import pytest
+from metrics import Registry
+from app import (socketio, REQUEST_DURATION, REQUEST_STATEMENTS, STATEMENT_DURATION, SOCKETIO_CONNECTIONS,
+                 SOCKETIO_EMITS, UPLOAD_BYTES, SNAPSHOT_REQUESTS, mark_content_changed)
+
+
+class TestRegistry:
+    """測試指標的累計與文字格式"""
+
+    def test_render_text_format(self):
+        """測試計數器、量測值與分桶的輸出格式及標籤跳脫"""
+        registry = Registry()
+        counter = registry.counter('demo_total', '示範計數', ['path'])
+        gauge = registry.gauge('demo_connections', '示範連線數')
+        histogram = registry.histogram('demo_seconds', '示範耗時', buckets=(0.1, 1))
+        counter.inc(path='a"b')
+        counter.inc(2, path='a"b')
+        gauge.inc()
+        gauge.inc()
+        gauge.dec()
+        histogram.observe(0.05)
+        histogram.observe(0.5)
+        histogram.observe(3)
+
+        lines = registry.render().splitlines()
+
+        assert '# TYPE demo_total counter' in lines
+        assert 'demo_total{path="a\\"b"} 3' in lines
+        assert 'demo_connections 1' in lines
+        assert 'demo_seconds_bucket{le="0.1"} 1' in lines
+        assert 'demo_seconds_bucket{le="1"} 2' in lines
+        assert 'demo_seconds_bucket{le="+Inf"} 3' in lines
+        assert 'demo_seconds_sum 3.55' in lines
+        assert 'demo_seconds_count 3' in lines
+
+    def test_label_names_must_match(self):
+        """測試缺少或多出的標籤會被拒絕"""
+        counter = Registry().counter('demo_total', '示範計數', ['path'])
+        with pytest.raises(ValueError):
+            counter.inc(route='/')
+
+
+class TestMetricsEndpoint:
+    """測試 /metrics 端點與各項指標"""
+
+    def test_scrape(self, client):
+        """測試以 Prometheus 文字格式輸出"""
+        response = client.get('/metrics')
+        assert response.status_code == 200
+        assert response.headers['Content-Type'].startswith('text/plain; version=0.0.4')
+        assert '# TYPE mqcms_http_request_duration_seconds histogram' in response.get_data(as_text=True)
+
+    def test_token(self, test_app, client):
+        """測試設定 METRICS_TOKEN 後必須帶正確的權杖"""
+        test_app.config['METRICS_TOKEN'] = 'scrape-secret'
+        try:
+            assert client.get('/metrics').status_code == 401
+            assert client.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 401
+            assert client.get('/metrics', headers={'Authorization': 'Bearer scrape-secret'}).status_code == 200
+        finally:
+            test_app.config['METRICS_TOKEN'] = None
+
+    def test_route_template_and_sql_statements(self, client, sample_content):
+        """測試以路由樣板記錄延遲，並記錄每個請求的 SQL 語句數"""
+        route = '/api/groups/<group_id>'
+        before = REQUEST_DURATION.count(method='GET', route=route, status=200)
+        statements_before = REQUEST_STATEMENTS.sum(route=route)
+
+        assert client.get(f"/api/groups/{sample_content['group_id']}").status_code == 200
+
+        assert REQUEST_DURATION.count(method='GET', route=route, status=200) == before + 1
+        assert REQUEST_STATEMENTS.sum(route=route) > statements_before
+
+    def test_snapshot_cache_hit_ratio(self, client, sample_content):
+        """測試快照第一次讀取為未命中，同一版本內再次讀取為命中"""
+        mark_content_changed()
+        hits = SNAPSHOT_REQUESTS.value(key='display', result='hit')
+        misses = SNAPSHOT_REQUESTS.value(key='display', result='miss')
+
+        client.get('/api/media_with_settings')
+        client.get('/api/media_with_settings')
+
+        assert SNAPSHOT_REQUESTS.value(key='display', result='miss') == misses + 1
+        assert SNAPSHOT_REQUESTS.value(key='display', result='hit') == hits + 1
+
+    def test_socketio_connections_and_emits(self, test_app, client, auth_headers, sample_content):
+        """測試連線數隨連線與斷線增減，廣播時記錄事件數"""
+        connections = SOCKETIO_CONNECTIONS.value()
+        emits = SOCKETIO_EMITS.value(event='settings_updated')
+        display = socketio.test_client(test_app, auth={'client': 'display'})
+        assert SOCKETIO_CONNECTIONS.value() == connections + 1
+
+        client.put('/api/settings', headers=auth_headers, json={'header_interval': 9})
+
+        assert SOCKETIO_EMITS.value(event='settings_updated') == emits + 1
+        display.disconnect()
+        assert SOCKETIO_CONNECTIONS.value() == connections
+
+    def test_rejected_connection_not_counted(self, test_app):
+        """測試被拒絕的連線不計入連線數"""
+        connections = SOCKETIO_CONNECTIONS.value()
+        rejected = socketio.test_client(test_app, auth={'client': 'admin', 'token': 'invalid'})
+        assert not rejected.is_connected()
+        assert SOCKETIO_CONNECTIONS.value() == connections
+
+    def test_upload_bytes(self, client, auth_headers, upload_dirs):
+        """測試成功的上傳累計接收的位元組數"""
+        uploaded = UPLOAD_BYTES.value(kind='material')
+        response = client.post('/api/materials', headers=auth_headers, content_type='multipart/form-data',
+                               data={'file': (io.BytesIO(b'\x00' * 2048), 'clip.mp4')})
+        assert response.status_code in (200, 201)
+        assert UPLOAD_BYTES.value(kind='material') > uploaded + 2048
+
+
+class TestSqlProfiler:
+    """測試每個請求的 SQL 分析"""
+
+    @pytest.fixture
+    def profile_config(self, test_app):
+        original = {key: test_app.config[key] for key in ('SLOW_QUERY_THRESHOLD', 'SQL_PROFILE_HEADERS')}
+        yield test_app.config
+        test_app.config.update(original)
+
+    def test_statement_duration_by_route(self, client, sample_content):
+        """測試每個語句的耗時以來源路由區分"""
+        route = '/api/groups/<group_id>'
+        before = STATEMENT_DURATION.count(route=route, operation='SELECT')
+        client.get(f"/api/groups/{sample_content['group_id']}")
+        assert STATEMENT_DURATION.count(route=route, operation='SELECT') > before
+
+    def test_profile_headers(self, client, sample_content, profile_config, sql_statements):
+        """測試開啟後回應帶有查詢數與 Server-Timing 標頭"""
+        profile_config['SQL_PROFILE_HEADERS'] = True
+        mark_content_changed()
+        sql_statements.clear()
+
+        response = client.get('/api/media_with_settings')
+
+        assert response.headers['X-Query-Count'] == str(len(sql_statements))
+        assert response.headers['Server-Timing'].startswith('db;dur=')
+        assert f'desc="{len(sql_statements)} queries"' in response.headers['Server-Timing']
+
+    def test_profile_headers_off_by_default(self, client, sample_content):
+        """測試非除錯模式預設不附加標頭"""
+        assert 'X-Query-Count' not in client.get('/api/media_with_settings').headers
+
+    def test_slow_query_log(self, client, sample_content, profile_config, capsys):
+        """測試超過門檻的語句連同參數與查詢計畫印出"""
+        profile_config['SLOW_QUERY_THRESHOLD'] = 0
+        capsys.readouterr()
+
+        client.get(f"/api/groups/{sample_content['group_id']}")
+
+        output = capsys.readouterr().out
+        assert '慢查詢' in output
+        assert '[/api/groups/<group_id>]' in output
+        assert sample_content['group_id'] in output
+        assert '查詢計畫:' in output
+        assert '無法取得查詢計畫' not in output
+
+    def test_slow_query_log_disabled(self, client, sample_content, profile_config, capsys):
+        """測試門檻設為 None 時不記錄"""
+        profile_config['SLOW_QUERY_THRESHOLD'] = None
+        capsys.readouterr()
+        client.get(f"/api/groups/{sample_content['group_id']}")
+        assert '慢查詢' not in capsys.readouterr().out
@@ -0,0 +1,168 @@
+"""
+多節點部署測試案例
+測試共用內容版本，以及兩個 app 程序經由 socketio_broker 代理互相轉送 Socket.IO 廣播
+"""
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+import pytest
+from app import app, db, playlist_cache, bump_cache_version, CacheVersion
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 以環境變數指定的資料庫啟動一個節點；第一個節點負責建立資料表與登入用的使用者
+NODE_SCRIPT = '''
+import sys
+from app import app, db, socketio, User, hash_password
+if sys.argv[2] == 'seed':
+    with app.app_context():
+        db.create_all()
+        db.session.add(User(username='node', password_hash=hash_password('node-password'), role='admin'))
+        db.session.commit()
+socketio.run(app, host='127.0.0.1', port=int(sys.argv[1]), log_output=False)
+'''
+
+
+@pytest.fixture
+def shared_version(test_app):
+    test_app.config.update(CONTENT_VERSION_SHARED=True, CONTENT_VERSION_CHECK_INTERVAL=0)
+    yield
+    test_app.config.update(CONTENT_VERSION_SHARED=False, CONTENT_VERSION_CHECK_INTERVAL=1.0)
+
+
+class TestSharedContentVersion:
+    """測試多節點共用的內容版本"""
+
+    def test_bump_writes_shared_version(self, shared_version):
+        """測試遞增版本會寫入資料庫"""
+        version = playlist_cache.bump()
+        assert version == db.session.get(CacheVersion, 'content').version
+        assert playlist_cache.version == version
+
+    def test_other_node_write_invalidates_snapshot(self, client, shared_version):
+        """測試其他節點遞增版本後，本節點的快照與 ETag 跟著失效"""
+        first = client.get('/api/media_with_settings')
+        etag = first.headers['ETag']
+
+        # 模擬另一個節點提交寫入
+        other_version = bump_cache_version('content')
+
+        second = client.get('/api/media_with_settings', headers={'If-None-Match': etag})
+        assert second.status_code == 200
+        assert second.get_json()['version'] == other_version
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _wait_for_port(port, process, timeout=15):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'程序提前結束: {process.args}')
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.2):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise TimeoutError(f'連接埠 {port} 沒有開啟')
+
+
+def _request(url, data=None, headers=None, method=None, timeout=10):
+    request = urllib.request.Request(url, data=data, headers=headers or {}, method=method)
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return response.read().decode('utf-8')
+
+
+class PollingClient:
+    """只使用 urllib 的最小 Engine.IO v4 長輪詢客戶端，足以接收 Socket.IO 事件"""
+
+    def __init__(self, base_url, auth=None):
+        self.base_url = base_url
+        handshake = _request(f'{base_url}/socket.io/?EIO=4&transport=polling')
+        self.sid = json.loads(handshake[1:])['sid']
+        self._post('40' + (json.dumps(auth) if auth else ''))  # 連線到預設命名空間，附帶 auth
+
+    def _url(self):
+        return f'{self.base_url}/socket.io/?EIO=4&transport=polling&sid={self.sid}'
+
+    def _post(self, packet):
+        _request(self._url(), data=packet.encode('utf-8'), method='POST')
+
+    def wait_for_event(self, name, timeout=10):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            for packet in _request(self._url(), timeout=timeout).split('\x1e'):
+                if packet == '2':
+                    self._post('3')  # 回應伺服器的 ping
+                elif packet.startswith('42'):
+                    event, *args = json.loads(packet[2:])
+                    if event == name:
+                        return args
+        raise TimeoutError(f'沒有收到 {name} 事件')
+
+
+@pytest.fixture
+def cluster(tmp_path):
+    """啟動一個訊息代理與兩個共用資料庫的 app 節點，返回兩個節點的網址"""
+    broker_port, port_a, port_b = _free_port(), _free_port(), _free_port()
+    env = {
+        **os.environ,
+        'DATABASE_URL': f"sqlite:///{tmp_path / 'cluster.db'}",
+        'SOCKETIO_MESSAGE_QUEUE': f'broker://127.0.0.1:{broker_port}',
+    }
+    processes = []
+
+    def start(*args, port):
+        process = subprocess.Popen([sys.executable, *args], cwd=PROJECT_DIR, env=env,
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        processes.append(process)
+        _wait_for_port(port, process)
+
+    try:
+        start('socketio_broker.py', '--port', str(broker_port), port=broker_port)
+        start('-c', NODE_SCRIPT, str(port_a), 'seed', port=port_a)
+        start('-c', NODE_SCRIPT, str(port_b), 'join', port=port_b)
+        yield f'http://127.0.0.1:{port_a}', f'http://127.0.0.1:{port_b}'
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait(timeout=10)
+
+
+class TestBrokerFanout:
+    """測試多個程序經由訊息代理轉送廣播"""
+
+    def test_write_on_one_node_reaches_display_on_other(self, cluster):
+        """測試在節點 A 修改設定，連線到節點 B 的展示頁會收到增量更新，且節點 B 讀到新內容。
+        兩個節點都還沒有提供過展示內容，節點 A 的第一次寫入也必須推送 playlist_patch。"""
+        node_a, node_b = cluster
+        display = PollingClient(node_b, auth={'client': 'display', 'display_id': 'lobby-b'})
+
+        login = json.loads(_request(f'{node_a}/api/auth/login', method='POST',
+                                    data=json.dumps({'username': 'node', 'password': 'node-password'}).encode(),
+                                    headers={'Content-Type': 'application/json'}))
+        token = login['access_token']
+        _request(f'{node_a}/api/settings', method='PUT', data=json.dumps({'header_interval': 9}).encode(),
+                 headers={'Content-Type': 'application/json', 'Authorization': f'Bearer {token}'})
+
+        patch = display.wait_for_event('playlist_patch')
+        assert patch[0]['settings']['header_interval'] == '9'
+
+        version_a = json.loads(_request(f'{node_a}/api/media_with_settings'))['version']
+        deadline = time.monotonic() + app.config['CONTENT_VERSION_CHECK_INTERVAL'] + 5
+        while True:
+            payload_b = json.loads(_request(f'{node_b}/api/media_with_settings'))
+            if payload_b['version'] == version_a or time.monotonic() > deadline:
+                break
+            time.sleep(0.2)
+        assert payload_b['version'] == version_a
+        assert payload_b['settings']['header_interval'] == '9'
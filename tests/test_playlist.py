@@ -0,0 +1,445 @@
+"""
+展示頁播放清單 API 測試案例
+測試 /api/media_with_settings 的內容組合與快照快取行為
+"""
+import hashlib
+import io
+import pytest
+from app import db, Setting, playlist_cache, playlist_publisher, mark_content_changed, broadcast_coalescer
+
+
+class TestPlaylistSnapshot:
+    """測試播放清單快照快取"""
+
+    def test_group_offset_is_applied(self, client, sample_content):
+        """測試輪播群組依偏移量旋轉圖片順序"""
+        response = client.get('/api/media_with_settings')
+
+        assert response.status_code == 200
+        data = response.get_json()
+        carousel = [item['id'] for item in data['media'] if item['section_key'] == 'carousel_top_left']
+        image_ids = sample_content['image_ids']
+        assert carousel == image_ids[1:] + image_ids[:1]
+
+        header = [item for item in data['media'] if item['section_key'] == 'header_video']
+        assert header[0]['id'] == sample_content['video_id']
+        assert header[0]['type'] == 'video'
+        assert data['settings'] == {'header_interval': '5'}
+
+    def test_repeated_reads_skip_database(self, client, sample_content, sql_statements):
+        """測試內容未變更時，重複讀取不再查詢資料庫"""
+        first = client.get('/api/media_with_settings')
+        assert len(sql_statements) > 0
+
+        sql_statements.clear()
+        second = client.get('/api/media_with_settings')
+
+        assert second.status_code == 200
+        assert second.data == first.data
+        assert sql_statements == []
+
+    def test_mutation_invalidates_snapshot(self, client, auth_headers, sample_content):
+        """測試寫入路由提交後，快照會重建"""
+        client.get('/api/media_with_settings')
+        version_before = playlist_cache.version
+
+        response = client.put('/api/settings', json={'header_interval': 9}, headers=auth_headers)
+        assert response.status_code == 200
+        assert playlist_cache.version > version_before
+
+        data = client.get('/api/media_with_settings').get_json()
+        assert data['settings']['header_interval'] == '9'
+
+    def test_stale_snapshot_not_served_without_bump(self, client, sample_content):
+        """測試直接修改資料庫而未遞增版本時沿用快照，遞增後才會反映"""
+        client.get('/api/media_with_settings')
+
+        db.session.add(Setting(key='footer_interval', value='3'))
+        db.session.commit()
+        assert 'footer_interval' not in client.get('/api/media_with_settings').get_json()['settings']
+
+        mark_content_changed()
+        assert client.get('/api/media_with_settings').get_json()['settings']['footer_interval'] == '3'
+
+    def test_media_updated_carries_version(self, client, auth_headers, admin_socket_auth, sample_content, test_app):
+        """測試 media_updated 廣播附帶新的內容版本"""
+        from app import socketio
+        socket_client = socketio.test_client(test_app, auth=admin_socket_auth)
+        socket_client.get_received()
+
+        response = client.delete(f"/api/assignments/{_first_assignment_id(client)}", headers=auth_headers)
+        assert response.status_code == 200
+
+        events = [e for e in socket_client.get_received() if e['name'] == 'media_updated']
+        assert len(events) == 1
+        assert events[0]['args'][0]['version'] == playlist_cache.version
+        socket_client.disconnect()
+
+
+def _first_assignment_id(client):
+    return client.get('/api/assignments').get_json()['data'][0]['id']
+
+
+class TestConditionalRequests:
+    """測試以內容版本為基礎的 ETag 條件請求"""
+
+    @pytest.mark.parametrize('url', [
+        '/api/media_with_settings',
+        '/api/materials',
+        '/api/groups',
+        '/api/assignments',
+        '/api/settings',
+        '/api/display_manifest'
+    ])
+    def test_matching_etag_returns_304_without_queries(self, client, sample_content, sql_statements, url):
+        """測試 If-None-Match 相符時回應 304 且不查詢資料庫"""
+        first = client.get(url)
+        assert first.status_code == 200
+        etag = first.headers['ETag']
+        assert not etag.startswith('W/')
+        assert first.headers['Cache-Control'] == 'no-cache'
+
+        sql_statements.clear()
+        second = client.get(url, headers={'If-None-Match': etag})
+
+        assert second.status_code == 304
+        assert second.data == b''
+        assert second.headers['ETag'] == etag
+        assert sql_statements == []
+
+    def test_etag_changes_after_mutation(self, client, auth_headers, sample_content):
+        """測試內容變更後舊的 ETag 失效，回應完整內容"""
+        etag = client.get('/api/settings').headers['ETag']
+
+        client.put('/api/settings', json={'carousel_interval': 4}, headers=auth_headers)
+        response = client.get('/api/settings', headers={'If-None-Match': etag})
+
+        assert response.status_code == 200
+        assert response.headers['ETag'] != etag
+        assert response.get_json()['data']['carousel_interval'] == '4'
+
+    def test_etag_differs_per_query_string(self, client, sample_content):
+        """測試不同查詢參數的表示使用不同的 ETag"""
+        plain = client.get('/api/materials').headers['ETag']
+        with_query = client.get('/api/materials?foo=bar').headers['ETag']
+
+        assert plain != with_query
+        response = client.get('/api/materials?foo=bar', headers={'If-None-Match': plain})
+        assert response.status_code == 200
+
+
+class TestPlaylistPatch:
+    """測試內容變更後推送的區塊增量更新"""
+
+    @pytest.fixture
+    def display_socket(self, test_app, client, sample_content):
+        """模擬一台已取得初始播放清單並連線的展示頁"""
+        from app import socketio
+        client.get('/api/media_with_settings')
+        socket_client = socketio.test_client(test_app)
+        socket_client.get_received()
+        yield socket_client
+        socket_client.disconnect()
+
+    def _patches(self, socket_client):
+        return [e['args'][0] for e in socket_client.get_received() if e['name'] == 'playlist_patch']
+
+    def test_patch_contains_only_changed_sections(self, client, auth_headers, sample_content, display_socket):
+        """測試增量更新只包含有變動的區塊，並銜接前一個版本"""
+        initial = client.get('/api/media_with_settings').get_json()
+
+        response = client.put(f"/api/groups/{sample_content['group_id']}/images",
+                              json={'image_ids': list(reversed(sample_content['image_ids']))},
+                              headers=auth_headers)
+        assert response.status_code == 200
+
+        patches = self._patches(display_socket)
+        assert len(patches) == 1
+        patch = patches[0]
+        assert patch['from_version'] == initial['version']
+        assert patch['version'] == playlist_cache.version
+        assert list(patch['sections']) == ['carousel_top_left']
+        assert patch['removed_sections'] == []
+        assert 'settings' not in patch
+
+        # 套用增量更新後的結果應與完整抓取一致
+        current = client.get('/api/media_with_settings').get_json()
+        carousel = [item for item in current['media'] if item['section_key'] == 'carousel_top_left']
+        assert patch['sections']['carousel_top_left'] == carousel
+
+    def test_patch_reports_removed_sections_and_settings(self, client, auth_headers, sample_content, display_socket):
+        """測試清空的區塊與變更的設定都會出現在增量更新中"""
+        assignments = client.get('/api/assignments').get_json()['data']
+        header = next(a for a in assignments if a['section_key'] == 'header_video')
+        client.delete(f"/api/assignments/{header['id']}", headers=auth_headers)
+        client.put('/api/settings', json={'footer_interval': 12}, headers=auth_headers)
+
+        first, second = self._patches(display_socket)
+        assert first['removed_sections'] == ['header_video']
+        assert first['sections'] == {}
+        assert second['from_version'] == first['version']
+        assert second['settings']['footer_interval'] == '12'
+
+
+class TestBroadcastCoalescing:
+    """測試連續寫入的廣播合併"""
+
+    @pytest.fixture
+    def coalescing(self, test_app):
+        test_app.config['BROADCAST_QUIET_WINDOW'] = 0.05
+        test_app.config['BROADCAST_MAX_LATENCY'] = 0.15
+        yield
+        test_app.config['BROADCAST_QUIET_WINDOW'] = 0
+        broadcast_coalescer.flush()
+
+    @pytest.fixture
+    def socket_client(self, test_app, client, admin_socket_auth, sample_content):
+        """已連線的後台"""
+        from app import socketio
+        client.get('/api/media_with_settings')
+        socket_client = socketio.test_client(test_app, auth=admin_socket_auth)
+        socket_client.get_received()
+        yield socket_client
+        socket_client.disconnect()
+
+    @pytest.fixture
+    def display_client(self, test_app, socket_client):
+        """未帶 auth 的舊版展示頁"""
+        from app import socketio
+        display_client = socketio.test_client(test_app)
+        display_client.get_received()
+        yield display_client
+        display_client.disconnect()
+
+    def _events(self, socket_client, name):
+        return [e['args'][0] for e in socket_client.get_received() if e['name'] == name]
+
+    def test_burst_becomes_single_notification(self, client, auth_headers, sample_content, coalescing, socket_client,
+                                               display_client):
+        """測試安靜期內的多次寫入只送出一次通知，並帶有最終版本"""
+        from app import socketio
+        initial_version = playlist_cache.version
+        for name in ['群組一', '群組二', '群組三']:
+            client.post('/api/groups', json={'name': name}, headers=auth_headers)
+        client.put('/api/settings', json={'header_interval': 8}, headers=auth_headers)
+        assert socket_client.get_received() == []
+        assert display_client.get_received() == []
+
+        socketio.sleep(0.2)
+        received = socket_client.get_received()
+        media_events = [e['args'][0] for e in received if e['name'] == 'media_updated']
+        settings_events = [e['args'][0] for e in received if e['name'] == 'settings_updated']
+        patches = self._events(display_client, 'playlist_patch')
+
+        assert len(media_events) == 1
+        assert media_events[0]['changes'] == 3
+        assert media_events[0]['version'] == playlist_cache.version
+        assert settings_events == [{'header_interval': 8}]
+        assert len(patches) == 1
+        assert patches[0]['from_version'] == initial_version
+        assert patches[0]['version'] == playlist_cache.version
+
+    def test_max_latency_caps_continuous_changes(self, client, auth_headers, sample_content, coalescing, socket_client):
+        """測試持續不斷的寫入也會在達到延遲上限時送出通知"""
+        from app import socketio
+        for index in range(8):
+            client.post('/api/groups', json={'name': f'群組{index}'}, headers=auth_headers)
+            socketio.sleep(0.03)
+
+        media_events = self._events(socket_client, 'media_updated')
+        assert len(media_events) >= 1
+        assert sum(event['changes'] for event in media_events) <= 8
+
+
+class TestDisplayContract:
+    """測試展示頁的精簡資料格式與後台的 include 選項"""
+
+    def test_display_payload_is_lean(self, client, sample_content):
+        """測試展示頁預設只取得區塊媒體列表、播放設定與版本"""
+        data = client.get('/api/media_with_settings').get_json()
+        assert set(data) == {'media', 'settings', 'version'}
+
+    def test_include_requires_authentication(self, client, sample_content):
+        """測試未登入時無法取得完整內容庫"""
+        response = client.get('/api/media_with_settings?include=materials')
+        assert response.status_code == 401
+
+    def test_include_etag_requires_authentication(self, client, auth_headers, sample_content):
+        """測試未登入時帶相符的 If-None-Match 也不會得到 304，無法藉此確認內容庫版本"""
+        etag = client.get('/api/media_with_settings?include=materials', headers=auth_headers).headers['ETag']
+        response = client.get('/api/media_with_settings?include=materials', headers={'If-None-Match': etag})
+        assert response.status_code == 401
+        response = client.get('/api/media_with_settings?include=materials',
+                              headers={**auth_headers, 'If-None-Match': etag})
+        assert response.status_code == 304
+
+    def test_include_returns_requested_library(self, client, auth_headers, sample_content):
+        """測試登入後可依 include 取得指定的內容庫資料"""
+        response = client.get('/api/media_with_settings?include=materials,groups', headers=auth_headers)
+
+        assert response.status_code == 200
+        data = response.get_json()
+        assert len(data['_debug_all_materials']) == 4
+        assert data['_debug_all_groups'][0]['image_ids'] == sample_content['image_ids']
+        assert '_debug_all_assignments' not in data
+        assert len(data['media']) == 4
+
+    def test_include_rejects_unknown_option(self, client, auth_headers):
+        """測試不支援的 include 值回應 400"""
+        response = client.get('/api/media_with_settings?include=users', headers=auth_headers)
+        assert response.status_code == 400
+
+
+class TestDisplayManifest:
+    """測試展示頁離線快取的檔案清單"""
+
+    def test_assets_ordered_for_prefetch(self, client, sample_content):
+        """測試先列出各區塊第一個顯示的檔案，再依播放位置排列"""
+        data = client.get('/api/display_manifest').get_json()
+
+        assert data['version'] == playlist_cache.version
+        assert [asset['url'] for asset in data['assets']] == [
+            '/static/uploads/video.mp4', '/static/uploads/image1.jpg',
+            '/static/uploads/image2.jpg', '/static/uploads/image0.jpg'
+        ]
+        assert [asset['priority'] for asset in data['assets']] == [0, 1, 2, 3]
+        assert data['assets'][0]['mime'] == 'video/mp4'
+        # 內容定址之前的檔案沒有雜湊紀錄
+        assert data['assets'][1]['sha256'] is None
+
+    def test_hashed_asset_metadata(self, client, auth_headers, upload_dirs):
+        """測試以內容雜湊儲存的檔案附帶雜湊與大小"""
+        content = b'\x00' * 2048
+        client.post('/api/materials', data={'file': (io.BytesIO(content), 'clip.mp4'), 'section_key': 'footer_content'},
+                    headers=auth_headers, content_type='multipart/form-data')
+
+        asset = client.get('/api/display_manifest').get_json()['assets'][0]
+        assert asset['sha256'] == hashlib.sha256(content).hexdigest()
+        assert asset['size'] == 2048
+        assert asset['url'] == f"/static/uploads/{asset['sha256']}.mp4"
+
+    def test_service_worker_served_from_root(self, client):
+        """測試 Service Worker 由根路徑提供且每次都重新驗證"""
+        response = client.get('/display-sw.js')
+        assert response.status_code == 200
+        assert response.mimetype in ('text/javascript', 'application/javascript')
+        assert response.headers['Cache-Control'] == 'no-cache'
+
+
+class TestSocketRooms:
+    """測試依房間推送的通知：後台只收到管理事件，展示頁只收到訂閱區塊的增量更新"""
+
+    @pytest.fixture
+    def connect(self, test_app, client, sample_content):
+        """以指定的 auth 連線，返回已清空初始事件的測試客戶端"""
+        from app import socketio
+        client.get('/api/media_with_settings')
+        sockets = []
+
+        def _connect(auth):
+            socket_client = socketio.test_client(test_app, auth=auth)
+            if socket_client.is_connected():
+                socket_client.get_received()
+            sockets.append(socket_client)
+            return socket_client
+
+        yield _connect
+        for socket_client in sockets:
+            if socket_client.is_connected():
+                socket_client.disconnect()
+
+    def _events(self, socket_client, name):
+        return [e['args'][0] for e in socket_client.get_received() if e['name'] == name]
+
+    def _reorder_carousel(self, client, auth_headers, sample_content):
+        client.put(f"/api/groups/{sample_content['group_id']}/images",
+                   json={'image_ids': list(reversed(sample_content['image_ids']))}, headers=auth_headers)
+
+    def test_admin_receives_notifications_but_not_patches(self, client, auth_headers, sample_content, connect):
+        """測試通過驗證的後台收到 media_updated，不會收到展示頁的增量更新"""
+        token = auth_headers['Authorization'].split()[1]
+        admin = connect({'client': 'admin', 'token': token})
+
+        self._reorder_carousel(client, auth_headers, sample_content)
+
+        received = admin.get_received()
+        assert [e['name'] for e in received] == ['media_updated']
+
+    def test_invalid_admin_token_is_rejected(self, connect):
+        """測試後台 token 無效時拒絕連線"""
+        assert not connect({'client': 'admin', 'token': 'not-a-jwt'}).is_connected()
+        assert not connect({'client': 'admin'}).is_connected()
+
+    def test_unrelated_display_is_not_woken(self, client, auth_headers, sample_content, connect):
+        """測試只訂閱頁尾的展示頁不會收到輪播區塊的變更"""
+        footer = connect({'client': 'display', 'display_id': 'lobby', 'sections': ['footer_content']})
+        carousel = connect({'client': 'display', 'display_id': 'hall', 'sections': ['carousel_top_left']})
+        initial_version = playlist_cache.version
+
+        self._reorder_carousel(client, auth_headers, sample_content)
+
+        assert footer.get_received() == []
+        patches = self._events(carousel, 'playlist_patch')
+        assert len(patches) == 1
+        assert list(patches[0]['sections']) == ['carousel_top_left']
+        assert patches[0]['base_versions'] == {'carousel_top_left': initial_version}
+
+    def test_base_versions_skip_unrelated_changes(self, client, auth_headers, sample_content, connect):
+        """測試其他區塊的變更之後，區塊的 base_versions 仍指向該區塊上一次的變更"""
+        carousel = connect({'client': 'display', 'sections': ['carousel_top_left']})
+
+        self._reorder_carousel(client, auth_headers, sample_content)
+        first = self._events(carousel, 'playlist_patch')[0]
+        header = next(a for a in client.get('/api/assignments').get_json()['data'] if a['section_key'] == 'header_video')
+        client.delete(f"/api/assignments/{header['id']}", headers=auth_headers)
+        assert carousel.get_received() == []
+
+        client.put(f"/api/groups/{sample_content['group_id']}/images",
+                   json={'image_ids': sample_content['image_ids']}, headers=auth_headers)
+        second = self._events(carousel, 'playlist_patch')[0]
+        assert second['from_version'] > first['version']
+        assert second['base_versions'] == {'carousel_top_left': first['version']}
+
+    def test_first_write_without_prior_read_sends_patch(self, client, auth_headers, connect):
+        """測試本程序從未提供過展示內容時，第一次寫入仍以寫入前的目錄為基準推送增量更新"""
+        footer = connect({'client': 'display', 'sections': ['footer_content']})
+        playlist_publisher.reset()
+
+        client.put('/api/settings', json={'footer_interval': 12}, headers=auth_headers)
+
+        patches = self._events(footer, 'playlist_patch')
+        assert [patch['settings']['footer_interval'] for patch in patches] == ['12']
+
+    def test_missing_baseline_sends_resync(self, test_app, connect):
+        """測試沒有推送基準的背景寫入改送 playlist_resync，讓展示頁重新抓取"""
+        from app import broadcast_content_change
+        footer = connect({'client': 'display', 'sections': ['footer_content']})
+        playlist_publisher.reset()
+
+        db.session.add(Setting(key='footer_interval', value='7'))
+        db.session.commit()
+        version = mark_content_changed()
+        broadcast_content_change()
+
+        assert self._events(footer, 'playlist_resync') == [{'version': version}]
+
+    def test_unauthenticated_socket_gets_no_admin_events(self, client, auth_headers, sample_content, connect):
+        """測試未帶 auth 的連線只加入展示頁房間，收不到後台的 media_updated 與 settings_updated"""
+        legacy = connect(None)
+
+        self._reorder_carousel(client, auth_headers, sample_content)
+        client.put('/api/settings', json={'footer_interval': 12}, headers=auth_headers)
+
+        assert {e['name'] for e in legacy.get_received()} == {'playlist_patch'}
+
+    def test_settings_change_reaches_every_display(self, client, auth_headers, connect):
+        """測試播放設定變更會送到所有展示頁"""
+        footer = connect({'client': 'display', 'sections': ['footer_content']})
+        legacy = connect(None)
+
+        client.put('/api/settings', json={'footer_interval': 12}, headers=auth_headers)
+
+        for socket_client in (footer, legacy):
+            patches = self._events(socket_client, 'playlist_patch')
+            assert len(patches) == 1
+            assert patches[0]['settings']['footer_interval'] == '12'
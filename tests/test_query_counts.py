@@ -0,0 +1,60 @@
+"""
+讀取端點的 SQL 語句數量測試
+確保預先載入策略讓每個端點執行固定數量的查詢，不隨群組、圖片或指派的數量成長
+"""
+import pytest
+from app import (db, Material, CarouselGroup, GroupImageAssociation, Assignment, Setting,
+                 mark_content_changed)
+
+
+def _create_library(group_count, images_per_group):
+    """建立指定規模的內容庫：每個群組都指派到一個區塊，另外每個群組附帶一個單一素材指派"""
+    db.session.add(Setting(key='header_interval', value='5'))
+    for group_index in range(group_count):
+        group = CarouselGroup(name=f'群組{group_index}')
+        video = Material(original_filename=f'video{group_index}.mp4', filename=f'video{group_index}.mp4',
+                         type='video', url=f'/static/uploads/video{group_index}.mp4')
+        db.session.add_all([group, video])
+        db.session.flush()
+        for image_index in range(images_per_group):
+            image = Material(original_filename=f'g{group_index}_{image_index}.jpg',
+                             filename=f'g{group_index}_{image_index}.jpg', type='image',
+                             url=f'/static/uploads/g{group_index}_{image_index}.jpg', source='group_specific')
+            db.session.add(image)
+            db.session.flush()
+            db.session.add(GroupImageAssociation(group_id=group.id, material_id=image.id, order=image_index))
+        db.session.add(Assignment(section_key=f'carousel_{group_index}', content_source_type='group_reference',
+                                  group_id=group.id, offset=group_index))
+        db.session.add(Assignment(section_key=f'single_{group_index}', content_source_type='single_media',
+                                  media_id=video.id))
+    db.session.commit()
+    db.session.expunge_all()
+    mark_content_changed()
+
+
+def _count_statements(client, sql_statements, url):
+    mark_content_changed()  # 避開快照與 ETag，強制重新查詢
+    sql_statements.clear()
+    response = client.get(url)
+    assert response.status_code == 200
+    return len(sql_statements)
+
+
+@pytest.mark.parametrize('url, expected', [
+    ('/api/media_with_settings', 7),  # 含已登記螢幕的群組對照
+    ('/api/assignments', 3),
+    ('/api/groups', 2),
+    ('/admin', 5),
+])
+class TestConstantQueryCount:
+    """測試讀取端點的查詢數量為常數"""
+
+    def test_small_library(self, client, sql_statements, url, expected):
+        """測試小型內容庫的查詢數量"""
+        _create_library(group_count=1, images_per_group=2)
+        assert _count_statements(client, sql_statements, url) == expected
+
+    def test_large_library(self, client, sql_statements, url, expected):
+        """測試較大的內容庫查詢數量不變"""
+        _create_library(group_count=6, images_per_group=8)
+        assert _count_statements(client, sql_statements, url) == expected
@@ -0,0 +1,125 @@
+"""
+圖片尺寸版本測試案例
+測試上傳後產生的各區塊尺寸版本，以及展示頁播放清單選用的網址
+"""
+import hashlib
+import io
+import os
+import time
+import pytest
+from PIL import Image
+import app as app_module
+from app import db, MediaRendition, RENDITION_PROFILES, socketio
+
+
+def _camera_jpeg(width=3000, height=2000, orientation=None):
+    """產生一張雜訊 JPEG (壓縮率低，接近相機原檔)，可選擇附帶 EXIF 方向"""
+    image = Image.effect_noise((width, height), 64).convert('RGB')
+    exif = Image.Exif()
+    exif[0x010F] = 'TestCamera'  # Make
+    if orientation:
+        exif[0x0112] = orientation
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=95, exif=exif)
+    return buffer.getvalue()
+
+
+def _upload(client, auth_headers, content, filename='photo.jpg', section_key=None):
+    data = {'file': (io.BytesIO(content), filename)}
+    if section_key:
+        data['section_key'] = section_key
+    response = client.post('/api/materials', data=data, headers=auth_headers, content_type='multipart/form-data')
+    assert response.status_code == 201
+    return response.get_json()['data']
+
+
+class TestRenditionGeneration:
+    """測試尺寸版本的產生內容"""
+
+    def test_renditions_cover_each_profile(self, client, auth_headers, upload_dirs):
+        """測試每個版面都產生剛好覆蓋區塊的 WebP，且移除中繼資料並套用方向"""
+        material = _upload(client, auth_headers, _camera_jpeg(orientation=6))
+
+        renditions = {r.profile: r for r in MediaRendition.query.all()}
+        assert set(renditions) == set(RENDITION_PROFILES)
+        for profile, (box_width, box_height) in RENDITION_PROFILES.items():
+            rendition = renditions[profile]
+            # 方向 6 代表需旋轉 90 度，直式圖片的寬度即為覆蓋區塊的邊
+            assert rendition.width < rendition.height
+            assert rendition.width >= box_width and rendition.height >= box_height
+            assert min(rendition.width - box_width, rendition.height - box_height) <= 1
+
+            path = upload_dirs / 'uploads' / 'renditions' / rendition.filename
+            with Image.open(path) as image:
+                assert image.format == 'WEBP'
+                assert len(image.getexif()) == 0
+            assert rendition.size < os.path.getsize(upload_dirs / 'uploads' / material['filename'])
+            assert rendition.sha256 == hashlib.sha256(path.read_bytes()).hexdigest()
+
+    def test_gif_keeps_original(self, client, auth_headers, upload_dirs):
+        """測試 GIF 不產生尺寸版本"""
+        buffer = io.BytesIO()
+        Image.new('P', (1200, 1200)).save(buffer, 'GIF')
+        _upload(client, auth_headers, buffer.getvalue(), 'banner.gif')
+        assert MediaRendition.query.count() == 0
+
+    def test_renditions_removed_with_blob(self, client, auth_headers, upload_dirs):
+        """測試最後一筆引用刪除時一併刪除尺寸版本的檔案"""
+        material = _upload(client, auth_headers, _camera_jpeg(1600, 1200))
+        assert len(os.listdir(upload_dirs / 'uploads' / 'renditions')) == len(RENDITION_PROFILES)
+
+        client.delete(f"/api/materials/{material['id']}", headers=auth_headers)
+        assert MediaRendition.query.count() == 0
+        assert os.listdir(upload_dirs / 'uploads' / 'renditions') == []
+
+
+class TestDisplayRenditions:
+    """測試展示頁播放清單使用最適合區塊的版本"""
+
+    def test_playlist_uses_section_rendition(self, client, auth_headers, upload_dirs):
+        """測試單一素材與輪播群組圖片都改用對應區塊的版本網址"""
+        content = _camera_jpeg(2400, 1600)
+        single = _upload(client, auth_headers, content, section_key='footer_content')
+        group_id = client.post('/api/groups', json={'name': '版本群組'}, headers=auth_headers).get_json()['data']['id']
+        client.post(f'/api/groups/{group_id}/images', data={'files': [(io.BytesIO(content), 'photo.jpg')]},
+                    headers=auth_headers, content_type='multipart/form-data')
+        client.post('/api/assignments', data={'section_key': 'carousel_top_left', 'type': 'group_reference',
+                                              'carousel_group_id': group_id}, headers=auth_headers)
+
+        media = {item['section_key']: item for item in client.get('/api/media_with_settings').get_json()['media']}
+        sha256 = single['filename'].split('.')[0]
+        assert media['footer_content']['url'] == f'/static/uploads/renditions/{sha256}.footer.webp'
+        assert media['carousel_top_left']['url'] == f'/static/uploads/renditions/{sha256}.carousel.webp'
+
+    def test_playlist_falls_back_to_original(self, client, auth_headers, upload_dirs):
+        """測試沒有尺寸版本的素材仍使用原始檔案"""
+        material = _upload(client, auth_headers, b'not an image', 'broken.jpg', section_key='header_video')
+        media = client.get('/api/media_with_settings').get_json()['media']
+        assert media[0]['url'] == material['url']
+
+
+class TestRenditionWorkerPool:
+    """測試以工作程序池在背景產生版本"""
+
+    @pytest.fixture
+    def worker_pool(self, test_app):
+        test_app.config['RENDITION_WORKERS'] = 1
+        yield
+        test_app.config['RENDITION_WORKERS'] = 0
+        if app_module._rendition_executor is not None:
+            app_module._rendition_executor.shutdown()
+            app_module._rendition_executor = None
+
+    def test_upload_returns_before_renditions(self, client, auth_headers, upload_dirs, worker_pool):
+        """測試上傳立即返回，版本完成後才寫入資料庫並更新播放清單"""
+        _upload(client, auth_headers, _camera_jpeg(), section_key='header_video')
+        assert MediaRendition.query.count() == 0
+
+        deadline = time.monotonic() + 30
+        while MediaRendition.query.count() == 0 and time.monotonic() < deadline:
+            socketio.sleep(0.1)
+            db.session.rollback()  # 讀取背景 greenlet 提交的資料
+
+        assert MediaRendition.query.count() == len(RENDITION_PROFILES)
+        media = client.get('/api/media_with_settings').get_json()['media']
+        assert '/renditions/' in media[0]['url']
@@ -0,0 +1,229 @@
+"""
+排程播放測試案例
+測試時間軸索引、排程指派在時段內取代全天候指派，以及時段邊界的內容切換與推送
+"""
+import datetime
+import time
+import pytest
+from zoneinfo import ZoneInfo
+from app import (db, socketio, Assignment, Material, ScheduleIndex, DaypartScheduler, playlist_cache,
+                 mark_content_changed, schedule_windows, _schedule_timezone)
+
+TAIPEI = ZoneInfo('Asia/Taipei')
+# 2026-10-19 (星期一) 00:00 台北時間
+MONDAY = datetime.datetime(2026, 10, 19, tzinfo=TAIPEI).timestamp()
+HOUR = 60 * 60
+DAY = 24 * HOUR
+
+
+def _rule(assignment_id, **schedule):
+    return Assignment(id=assignment_id, section_key='header_video', content_source_type='single_media', **schedule)
+
+
+def _utc(timestamp):
+    return datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc).replace(tzinfo=None)
+
+
+class TestScheduleIndex:
+    """測試時間軸索引的展開與查詢"""
+
+    def test_weekly_daypart(self):
+        """測試平日早上 6 點到 10 點半的時段"""
+        breakfast = _rule('breakfast', weekdays=0b0011111, daily_start=6 * 60, daily_end=10 * 60 + 30)
+        index = ScheduleIndex([breakfast], MONDAY, MONDAY + 7 * DAY, TAIPEI)
+
+        assert index.active_at(MONDAY + 5 * HOUR) == frozenset()
+        assert index.active_at(MONDAY + 6 * HOUR) == {'breakfast'}
+        assert index.active_at(MONDAY + 10 * HOUR + 29 * 60) == {'breakfast'}
+        assert index.active_at(MONDAY + 10 * HOUR + 30 * 60) == frozenset()
+        assert index.active_at(MONDAY + 5 * DAY + 7 * HOUR) == frozenset()  # 星期六
+        assert index.next_transition(MONDAY + HOUR) == MONDAY + 6 * HOUR
+        assert index.next_transition(MONDAY + 7 * HOUR) == MONDAY + 10 * HOUR + 30 * 60
+
+    def test_overnight_window(self):
+        """測試跨午夜的時段屬於開始的那一天，且涵蓋索引開始前一天延續過來的部分"""
+        late = _rule('late', weekdays=1 << 6, daily_start=22 * 60, daily_end=2 * 60)  # 星期日晚上
+        index = ScheduleIndex([late], MONDAY, MONDAY + 7 * DAY, TAIPEI)
+
+        assert index.active_at(MONDAY + HOUR) == {'late'}
+        assert index.active_at(MONDAY + 3 * HOUR) == frozenset()
+        assert index.active_at(MONDAY + 6 * DAY + 23 * HOUR) == {'late'}
+
+    def test_absolute_window_clips_recurrence(self):
+        """測試 starts_at / ends_at 限制每週規則的有效期間"""
+        promo = _rule('promo', daily_start=12 * 60, daily_end=14 * 60,
+                      starts_at=_utc(MONDAY + 2 * DAY), ends_at=_utc(MONDAY + 3 * DAY + 13 * HOUR))
+        index = ScheduleIndex([promo], MONDAY, MONDAY + 7 * DAY, TAIPEI)
+
+        assert index.active_at(MONDAY + 12 * HOUR) == frozenset()
+        assert index.active_at(MONDAY + 2 * DAY + 12 * HOUR) == {'promo'}
+        assert index.active_at(MONDAY + 3 * DAY + 12 * HOUR) == {'promo'}
+        assert index.active_at(MONDAY + 3 * DAY + 13 * HOUR) == frozenset()
+        assert index.next_transition(MONDAY + 3 * DAY + 13 * HOUR) is None
+
+    @pytest.mark.parametrize('day', [datetime.date(2026, 3, 8), datetime.date(2026, 11, 1)])
+    def test_daylight_saving_transition(self, test_app, day):
+        """測試日光節約切換當天 (紐約 3/8 撥快、11/1 撥慢) 的時段仍依當地牆上時間開始與結束"""
+        test_app.config['SCHEDULE_TIMEZONE'] = 'America/New_York'
+        try:
+            tz = _schedule_timezone()
+            start = datetime.datetime.combine(day, datetime.time(), tzinfo=tz).timestamp()
+            breakfast = _rule('breakfast', daily_start=6 * 60, daily_end=10 * 60)
+            windows = schedule_windows(breakfast, start, start + DAY, tz)
+        finally:
+            test_app.config['SCHEDULE_TIMEZONE'] = None
+
+        assert [tuple(datetime.datetime.fromtimestamp(edge, tz).time() for edge in window) for window in windows] \
+            == [(datetime.time(6), datetime.time(10))]
+
+    def test_adjacent_windows_do_not_transition(self):
+        """測試相鄰區間的交界處生效集合沒有改變，不算切換"""
+        first = _rule('a', ends_at=_utc(MONDAY + 2 * HOUR))
+        second = _rule('b', starts_at=_utc(MONDAY + HOUR))
+        index = ScheduleIndex([first, second], MONDAY, MONDAY + DAY, TAIPEI)
+
+        assert index.next_transition(MONDAY) == MONDAY + HOUR
+        assert index.next_transition(MONDAY + HOUR) == MONDAY + 2 * HOUR
+
+
+def _header_ids(client):
+    media = client.get('/api/media_with_settings').get_json()['media']
+    return [item['id'] for item in media if item['section_key'] == 'header_video']
+
+
+@pytest.fixture
+def promo_video(test_app):
+    video = Material(original_filename='promo.mp4', filename='promo.mp4', type='video', url='/static/uploads/promo.mp4')
+    db.session.add(video)
+    db.session.commit()
+    return video.id
+
+
+def _schedule_promo(promo_video, **schedule):
+    db.session.add(Assignment(section_key='header_video', content_source_type='single_media', media_id=promo_video,
+                              **schedule))
+    db.session.commit()
+    mark_content_changed()
+
+
+class TestScheduledResolution:
+    """測試排程指派在展示內容中的解析"""
+
+    def test_active_schedule_replaces_always_on(self, client, sample_content, promo_video):
+        """測試時段內的排程指派取代同區塊的全天候指派"""
+        now = time.time()
+        _schedule_promo(promo_video, starts_at=_utc(now - HOUR), ends_at=_utc(now + HOUR))
+        assert _header_ids(client) == [promo_video]
+
+    def test_inactive_schedule_falls_back(self, client, sample_content, promo_video):
+        """測試時段外回到全天候指派"""
+        now = time.time()
+        _schedule_promo(promo_video, starts_at=_utc(now + HOUR), ends_at=_utc(now + 2 * HOUR))
+        assert _header_ids(client) == [sample_content['video_id']]
+
+    def test_boundary_switches_on_next_request(self, client, sample_content, promo_video):
+        """測試排程器未啟用時，時段結束後的第一個請求也會遞增版本並回到全天候內容"""
+        _schedule_promo(promo_video, ends_at=_utc(time.time() + 0.3))
+        first = client.get('/api/media_with_settings')
+        assert [item['id'] for item in first.get_json()['media'] if item['section_key'] == 'header_video'] == [promo_video]
+
+        time.sleep(0.35)
+        second = client.get('/api/media_with_settings', headers={'If-None-Match': first.headers['ETag']})
+
+        assert second.status_code == 200
+        assert second.get_json()['version'] > first.get_json()['version']
+        assert _header_ids(client) == [sample_content['video_id']]
+
+
+class TestDaypartScheduler:
+    """測試排程器在邊界時間主動推送"""
+
+    def test_pushes_patch_at_boundary(self, test_app, client, sample_content, promo_video):
+        """測試沒有任何請求時，展示頁也會在時段開始的當下收到增量更新"""
+        _schedule_promo(promo_video, starts_at=_utc(time.time() + 0.3))
+        client.get('/api/media_with_settings')
+        display = socketio.test_client(test_app, auth={'client': 'display', 'sections': ['header_video']})
+        display.get_received()
+        scheduler = DaypartScheduler()
+        scheduler.start()
+        try:
+            socketio.sleep(0.2)
+            assert display.get_received() == []
+            socketio.sleep(0.4)
+            patches = [e['args'][0] for e in display.get_received() if e['name'] == 'playlist_patch']
+        finally:
+            scheduler.stop()
+            display.disconnect()
+
+        assert len(patches) == 1
+        assert [item['id'] for item in patches[0]['sections']['header_video']] == [promo_video]
+        assert patches[0]['version'] == playlist_cache.version
+
+
+class TestScheduleApi:
+    """測試指派排程的 API"""
+
+    @pytest.fixture
+    def taipei(self, test_app):
+        test_app.config['SCHEDULE_TIMEZONE'] = 'Asia/Taipei'
+        yield
+        test_app.config['SCHEDULE_TIMEZONE'] = None
+
+    def test_create_scheduled_assignment(self, client, auth_headers, sample_content, promo_video, taipei):
+        """測試以表單建立排程指派，並在列表中以當地時段表示"""
+        response = client.post('/api/assignments', headers=auth_headers, data={
+            'section_key': 'header_video', 'type': 'single_media', 'media_id': promo_video,
+            'weekdays': '0,1,2,3,4', 'daily_start': '06:00', 'daily_end': '10:30',
+            'starts_at': '2026-11-01T00:00'})
+        assert response.status_code == 200
+
+        scheduled = [a for a in client.get('/api/assignments').get_json()['data'] if a['schedule']]
+        assert scheduled[0]['schedule'] == {
+            'starts_at': '2026-10-31T16:00:00+00:00', 'ends_at': None,
+            'weekdays': [0, 1, 2, 3, 4], 'daily_start': '06:00', 'daily_end': '10:30'}
+
+    def test_scheduled_group_keeps_always_on_group(self, client, auth_headers, sample_content):
+        """測試指派排程輪播組時保留同區塊的全天候輪播組"""
+        response = client.post('/api/assignments', headers=auth_headers, data={
+            'section_key': 'carousel_top_left', 'type': 'group_reference',
+            'carousel_group_id': sample_content['group_id'], 'daily_start': '18:00', 'daily_end': '22:00'})
+        assert response.status_code == 200
+        carousel = [a for a in client.get('/api/assignments').get_json()['data']
+                    if a['section_key'] == 'carousel_top_left']
+        assert sorted(a['schedule'] is None for a in carousel) == [False, True]
+
+    @pytest.mark.parametrize('schedule', [
+        {'daily_start': '25:00'},
+        {'daily_start': '24:00'},
+        {'daily_start': '08:00', 'daily_end': '08:00'},
+        {'weekdays': '7'},
+        {'weekdays': 'monday'},
+        {'starts_at': 'tomorrow'},
+        {'starts_at': '2026-11-02T00:00', 'ends_at': '2026-11-01T00:00'},
+    ])
+    def test_invalid_schedule(self, client, auth_headers, sample_content, promo_video, schedule):
+        """測試格式錯誤或矛盾的排程回應 400"""
+        response = client.post('/api/assignments', headers=auth_headers, data={
+            'section_key': 'header_video', 'type': 'single_media', 'media_id': promo_video, **schedule})
+        assert response.status_code == 400
+
+    def test_update_clears_schedule(self, client, auth_headers, sample_content, promo_video):
+        """測試以 PUT 設定與清除排程"""
+        assignment_id = client.get('/api/assignments').get_json()['data'][0]['id']
+        response = client.put(f'/api/assignments/{assignment_id}', headers=auth_headers,
+                              json={'weekdays': [5, 6]})
+        assert response.get_json()['data']['schedule']['weekdays'] == [5, 6]
+
+        response = client.put(f'/api/assignments/{assignment_id}', headers=auth_headers, json={'weekdays': None})
+        assert response.get_json()['data']['schedule'] is None
+
+    def test_preview(self, client, auth_headers, sample_content, promo_video, taipei):
+        """測試預覽指定時間生效的排程與下一次切換，超出索引範圍的時間也能查詢"""
+        _schedule_promo(promo_video, weekdays=1 << 0, daily_start=6 * 60, daily_end=10 * 60)
+        promo_assignment = Assignment.query.filter(Assignment.weekdays.isnot(None)).one().id
+
+        response = client.get('/api/schedule?at=2030-01-07T07:00', headers=auth_headers)  # 星期一
+        data = response.get_json()['data']
+
+        assert data['active_assignment_ids'] == [promo_assignment]
+        assert data['next_transition'] == '2030-01-07T02:00:00+00:00'
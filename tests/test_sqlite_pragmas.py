@@ -0,0 +1,59 @@
+"""
+SQLite 連線設定測試案例
+測試每個新連線都會套用設定的 PRAGMA，以及依資料庫網址決定連線池參數
+"""
+import pytest
+from sqlalchemy import create_engine, event, text
+from app import _engine_options, _on_sqlite_connect
+
+
+@pytest.fixture
+def sqlite_engine(test_app, tmp_path):
+    """以臨時檔案建立獨立的引擎並掛上與 app 相同的連線設定，不影響測試共用的資料庫"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'pragmas.db'}")
+    event.listen(engine, 'connect', _on_sqlite_connect)
+    yield engine
+    engine.dispose()
+
+
+def _pragma(engine, name):
+    with engine.connect() as connection:
+        return connection.execute(text(f'PRAGMA {name}')).scalar()
+
+
+class TestSqlitePragmas:
+    """測試 SQLite 正式環境設定"""
+
+    def test_production_profile_applied(self, sqlite_engine):
+        """測試預設套用 WAL、busy_timeout 等正式環境設定"""
+        assert _pragma(sqlite_engine, 'journal_mode') == 'wal'
+        assert _pragma(sqlite_engine, 'busy_timeout') == 5000
+        assert _pragma(sqlite_engine, 'synchronous') == 1  # NORMAL
+        assert _pragma(sqlite_engine, 'temp_store') == 2  # MEMORY
+        assert _pragma(sqlite_engine, 'cache_size') == -64000
+
+    def test_profile_can_be_disabled(self, test_app, sqlite_engine):
+        """測試設定為空時新連線沿用 SQLite 預設值"""
+        original = test_app.config['SQLITE_PRAGMAS']
+        test_app.config['SQLITE_PRAGMAS'] = {}
+        try:
+            assert _pragma(sqlite_engine, 'journal_mode') == 'delete'
+            assert _pragma(sqlite_engine, 'synchronous') == 2  # FULL
+            assert _pragma(sqlite_engine, 'temp_store') == 0
+        finally:
+            test_app.config['SQLITE_PRAGMAS'] = original
+
+
+class TestEngineOptions:
+    """測試連線池參數只套用在支援的資料庫網址"""
+
+    @pytest.mark.parametrize('url', ['sqlite://', 'sqlite:///:memory:', 'sqlite:///file:demo?mode=memory&uri=true'])
+    def test_in_memory_sqlite_uses_default_pool(self, url):
+        """測試記憶體中的 SQLite 不帶連線池大小參數，引擎可以正常建立"""
+        assert _engine_options(url) == {}
+        create_engine(url, **_engine_options(url)).dispose()
+
+    @pytest.mark.parametrize('url', ['sqlite:///mq_cms.db', 'postgresql://user@db/mq_cms'])
+    def test_pooled_databases(self, url):
+        """測試檔案型 SQLite 與其他資料庫不限制連線池溢出"""
+        assert _engine_options(url) == {'pool_size': 10, 'max_overflow': -1}
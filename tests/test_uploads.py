@@ -0,0 +1,327 @@
+"""
+媒體上傳測試案例
+測試可續傳的分段上傳 API (/api/uploads)、內容定址的去重儲存與群組圖片的批次上傳
+"""
+import hashlib
+import io
+import os
+import pytest
+from werkzeug.security import generate_password_hash
+from app import db, socketio, User, Material, MediaBlob, Assignment, GroupImageAssociation, GROUP_ORDER_GAP
+
+
+def _create_session(client, auth_headers, size, filename='promo.mp4', **extra):
+    response = client.post('/api/uploads', json={'filename': filename, 'size': size, **extra},
+                           headers=auth_headers)
+    assert response.status_code == 201
+    return response.get_json()['data']['upload_id']
+
+
+def _put_chunk(client, auth_headers, upload_id, content, start, total):
+    headers = {**auth_headers, 'Content-Range': f'bytes {start}-{start + len(content) - 1}/{total}'}
+    return client.put(f'/api/uploads/{upload_id}', data=content, headers=headers)
+
+
+class TestResumableUpload:
+    """測試可續傳的分段上傳流程"""
+
+    def test_full_upload_flow(self, client, auth_headers, upload_dirs):
+        """測試建立、分段上傳、查詢位移到完成的完整流程"""
+        content = os.urandom(2500)
+        upload_id = _create_session(client, auth_headers, len(content), section_key='header_video')
+
+        for start in range(0, len(content), 1000):
+            response = _put_chunk(client, auth_headers, upload_id, content[start:start + 1000], start, len(content))
+            assert response.status_code == 200
+
+        status = client.get(f'/api/uploads/{upload_id}', headers=auth_headers).get_json()
+        assert status['data']['offset'] == len(content)
+
+        response = client.post(f'/api/uploads/{upload_id}/complete', headers=auth_headers)
+        assert response.status_code == 201
+        material = response.get_json()['data']
+        assert material['type'] == 'video'
+        assert material['original_filename'] == 'promo.mp4'
+
+        with open(upload_dirs / 'uploads' / material['filename'], 'rb') as f:
+            assert f.read() == content
+        assert Assignment.query.filter_by(media_id=material['id'], section_key='header_video').count() == 1
+        assert not os.listdir(upload_dirs / 'upload_sessions')
+
+    def test_resume_after_interruption(self, client, auth_headers, upload_dirs):
+        """測試中斷後依伺服器回報的位移續傳，重送重疊的分段不會破壞檔案"""
+        content = os.urandom(3000)
+        upload_id = _create_session(client, auth_headers, len(content))
+        _put_chunk(client, auth_headers, upload_id, content[:1200], 0, len(content))
+
+        # 跳過中間的範圍會被拒絕，並回報目前位移
+        response = _put_chunk(client, auth_headers, upload_id, content[2000:], 2000, len(content))
+        assert response.status_code == 409
+        offset = response.get_json()['data']['offset']
+        assert offset == 1200
+
+        # 從稍早的位置重送 (與已寫入範圍重疊)
+        _put_chunk(client, auth_headers, upload_id, content[1000:], 1000, len(content))
+        response = client.post(f'/api/uploads/{upload_id}/complete', headers=auth_headers)
+
+        assert response.status_code == 201
+        filename = response.get_json()['data']['filename']
+        with open(upload_dirs / 'uploads' / filename, 'rb') as f:
+            assert f.read() == content
+
+    def test_complete_before_all_bytes_arrive(self, client, auth_headers, upload_dirs):
+        """測試資料未傳完時無法完成上傳，也不會建立素材"""
+        upload_id = _create_session(client, auth_headers, 100)
+        _put_chunk(client, auth_headers, upload_id, b'x' * 50, 0, 100)
+
+        response = client.post(f'/api/uploads/{upload_id}/complete', headers=auth_headers)
+
+        assert response.status_code == 409
+        assert Material.query.count() == 0
+
+    def test_abort_removes_temporary_files(self, client, auth_headers, upload_dirs):
+        """測試取消上傳會刪除暫存檔"""
+        upload_id = _create_session(client, auth_headers, 10)
+
+        response = client.delete(f'/api/uploads/{upload_id}', headers=auth_headers)
+
+        assert response.status_code == 200
+        assert client.get(f'/api/uploads/{upload_id}', headers=auth_headers).status_code == 404
+        assert not os.listdir(upload_dirs / 'upload_sessions')
+
+    @pytest.mark.parametrize('payload', [
+        {'filename': 'virus.exe', 'size': 10},
+        {'filename': 'video.mp4', 'size': 0},
+        {'filename': 'video.mp4'},
+    ])
+    def test_invalid_session_request(self, client, auth_headers, upload_dirs, payload):
+        """測試不支援的檔案類型或無效大小"""
+        response = client.post('/api/uploads', json=payload, headers=auth_headers)
+        assert response.status_code == 400
+
+    def test_chunk_requires_content_range(self, client, auth_headers, upload_dirs):
+        """測試分段請求缺少 Content-Range 時回應 400"""
+        upload_id = _create_session(client, auth_headers, 10)
+        response = client.put(f'/api/uploads/{upload_id}', data=b'0123456789', headers=auth_headers)
+        assert response.status_code == 400
+
+    def test_requires_authentication(self, client, upload_dirs):
+        """測試未登入時無法建立上傳"""
+        response = client.post('/api/uploads', json={'filename': 'video.mp4', 'size': 10})
+        assert response.status_code == 401
+
+    def test_other_user_cannot_access_session(self, client, auth_headers, upload_dirs):
+        """測試其他使用者無法查詢、續傳、完成或取消不屬於自己的上傳"""
+        content = b'0123456789'
+        upload_id = _create_session(client, auth_headers, len(content))
+        _put_chunk(client, auth_headers, upload_id, content[:5], 0, len(content))
+
+        db.session.add(User(username='otheruser', password_hash=generate_password_hash('otherpassword'),
+                            role='admin', is_active=True))
+        db.session.commit()
+        token = client.post('/api/auth/login', json={'username': 'otheruser', 'password': 'otherpassword'}) \
+            .get_json()['access_token']
+        other_headers = {'Authorization': f'Bearer {token}'}
+
+        assert client.get(f'/api/uploads/{upload_id}', headers=other_headers).status_code == 404
+        assert _put_chunk(client, other_headers, upload_id, content[5:], 5, len(content)).status_code == 404
+        assert client.post(f'/api/uploads/{upload_id}/complete', headers=other_headers).status_code == 404
+        assert client.delete(f'/api/uploads/{upload_id}', headers=other_headers).status_code == 404
+
+        # 建立者的上傳未受影響
+        status = client.get(f'/api/uploads/{upload_id}', headers=auth_headers)
+        assert status.status_code == 200
+        assert status.get_json()['data']['offset'] == 5
+        assert Material.query.count() == 0
+
+
+def _upload_material(client, auth_headers, content, filename='photo.jpg'):
+    response = client.post('/api/materials', data={'file': (io.BytesIO(content), filename)},
+                           headers=auth_headers, content_type='multipart/form-data')
+    assert response.status_code == 201
+    return response.get_json()['data']
+
+
+class TestContentAddressedStorage:
+    """測試以內容雜湊儲存上傳檔案並以參照計數去重"""
+
+    def test_identical_uploads_share_one_blob(self, client, auth_headers, upload_dirs):
+        """測試內容相同的上傳共用同一個以雜湊命名的檔案"""
+        content = os.urandom(4096)
+        first = _upload_material(client, auth_headers, content, 'a.jpg')
+        second = _upload_material(client, auth_headers, content, 'b.jpg')
+
+        sha256 = hashlib.sha256(content).hexdigest()
+        assert first['id'] != second['id']
+        assert first['filename'] == second['filename'] == f'{sha256}.jpg'
+        assert os.listdir(upload_dirs / 'uploads') == [f'{sha256}.jpg']
+        assert db.session.get(MediaBlob, sha256).ref_count == 2
+
+    def test_blob_removed_with_last_reference(self, client, auth_headers, upload_dirs):
+        """測試只有最後一筆引用的素材刪除後才刪除實體檔案"""
+        content = os.urandom(2048)
+        first = _upload_material(client, auth_headers, content)
+        second = _upload_material(client, auth_headers, content)
+        blob_path = upload_dirs / 'uploads' / first['filename']
+
+        assert client.delete(f"/api/materials/{first['id']}", headers=auth_headers).status_code == 200
+        assert blob_path.exists()
+        assert db.session.get(MediaBlob, hashlib.sha256(content).hexdigest()).ref_count == 1
+
+        assert client.delete(f"/api/materials/{second['id']}", headers=auth_headers).status_code == 200
+        assert not blob_path.exists()
+        assert MediaBlob.query.count() == 0
+
+    def test_resumable_and_group_uploads_deduplicate(self, client, auth_headers, upload_dirs):
+        """測試分段上傳與群組圖片上傳也會沿用既有的檔案"""
+        content = os.urandom(1500)
+        existing = _upload_material(client, auth_headers, content, 'poster.png')
+
+        upload_id = _create_session(client, auth_headers, len(content), filename='poster.png')
+        _put_chunk(client, auth_headers, upload_id, content, 0, len(content))
+        completed = client.post(f'/api/uploads/{upload_id}/complete', headers=auth_headers).get_json()['data']
+
+        group_id = client.post('/api/groups', json={'name': '去重群組'}, headers=auth_headers).get_json()['data']['id']
+        response = client.post(f'/api/groups/{group_id}/images',
+                               data={'files': [(io.BytesIO(content), 'poster.png')]},
+                               headers=auth_headers, content_type='multipart/form-data')
+        assert response.status_code == 201
+
+        assert completed['filename'] == existing['filename']
+        assert response.get_json()['data'][0]['filename'] == existing['filename']
+        assert len(os.listdir(upload_dirs / 'uploads')) == 1
+        assert db.session.get(MediaBlob, hashlib.sha256(content).hexdigest()).ref_count == 3
+
+        # 刪除群組只釋放群組專屬圖片的參照
+        assert client.delete(f'/api/groups/{group_id}', headers=auth_headers).status_code == 200
+        assert db.session.get(MediaBlob, hashlib.sha256(content).hexdigest()).ref_count == 2
+        assert len(os.listdir(upload_dirs / 'uploads')) == 1
+
+    def test_concurrent_identical_upload_keeps_winner_file(self, client, auth_headers, upload_dirs, monkeypatch):
+        """測試同時上傳相同內容時，較慢的請求沿用先提交的記錄，不會刪除對方的檔案"""
+        content = os.urandom(3072)
+        sha256 = hashlib.sha256(content).hexdigest()
+        first = _upload_material(client, auth_headers, content)
+
+        # 模擬第二個請求在第一個請求提交之前查詢 blob，因此沒有看到既有記錄
+        db.session.expunge_all()
+        original_get = db.session.get
+        stale_lookups = []
+
+        def stale_get(entity, ident, **kwargs):
+            if entity is MediaBlob and not stale_lookups:
+                stale_lookups.append(ident)
+                return None
+            return original_get(entity, ident, **kwargs)
+        monkeypatch.setattr(db.session, 'get', stale_get)
+
+        second = _upload_material(client, auth_headers, content)
+
+        assert stale_lookups == [sha256]
+        assert second['filename'] == first['filename']
+        assert (upload_dirs / 'uploads' / first['filename']).read_bytes() == content
+        assert os.listdir(upload_dirs / 'uploads') == [first['filename']]
+        assert original_get(MediaBlob, sha256).ref_count == 2
+
+    def test_legacy_material_file_still_deleted(self, client, auth_headers, upload_dirs):
+        """測試沒有內容雜湊的舊素材刪除時仍直接刪除自己的檔案"""
+        os.makedirs(upload_dirs / 'uploads')
+        (upload_dirs / 'uploads' / 'legacy.jpg').write_bytes(b'old')
+        material = Material(original_filename='legacy.jpg', filename='legacy.jpg', type='image',
+                            url='/static/uploads/legacy.jpg')
+        db.session.add(material)
+        db.session.commit()
+
+        assert client.delete(f'/api/materials/{material.id}', headers=auth_headers).status_code == 200
+        assert not (upload_dirs / 'uploads' / 'legacy.jpg').exists()
+
+
+class TestGroupBatchUpload:
+    """測試一次上傳多張圖片到群組"""
+
+    @pytest.fixture
+    def group_id(self, client, auth_headers, upload_dirs):
+        return client.post('/api/groups', json={'name': '批次群組'}, headers=auth_headers).get_json()['data']['id']
+
+    def _upload(self, client, auth_headers, group_id, files):
+        return client.post(f'/api/groups/{group_id}/images', data={'files': files},
+                           headers=auth_headers, content_type='multipart/form-data')
+
+    def test_hundred_images_in_constant_statements(self, client, auth_headers, group_id, upload_dirs, sql_statements):
+        """測試上傳 100 張圖片時以批次寫入完成，依上傳順序接在群組末尾"""
+        contents = [os.urandom(2048) for _ in range(100)]
+        sql_statements.clear()
+        response = self._upload(client, auth_headers, group_id,
+                                [(io.BytesIO(content), f'{index}.jpg') for index, content in enumerate(contents)])
+        statements = list(sql_statements)
+
+        assert response.status_code == 201
+        assert len(response.get_json()['data']) == 100
+        inserts = [statement for statement in statements if statement.startswith('INSERT')]
+        assert len(inserts) == 3  # media_blob、material、group_image_association 各一次
+        assert len([statement for statement in statements if 'max(group_image_association' in statement]) == 1
+
+        orders = [(assoc.material.original_filename, assoc.order) for assoc in
+                  GroupImageAssociation.query.filter_by(group_id=group_id).order_by(GroupImageAssociation.order)]
+        assert orders == [(f'{index}.jpg', (index + 1) * GROUP_ORDER_GAP) for index in range(100)]
+        assert len(os.listdir(upload_dirs / 'uploads')) == 100
+
+    def test_appends_after_existing_images(self, client, auth_headers, group_id):
+        """測試第二批上傳接在既有圖片之後"""
+        self._upload(client, auth_headers, group_id, [(io.BytesIO(os.urandom(100)), 'first.png')])
+        self._upload(client, auth_headers, group_id, [(io.BytesIO(os.urandom(100)), 'second.png'),
+                                                      (io.BytesIO(os.urandom(100)), 'third.png')])
+        names = [assoc.material.original_filename for assoc in
+                 GroupImageAssociation.query.filter_by(group_id=group_id).order_by(GroupImageAssociation.order)]
+        assert names == ['first.png', 'second.png', 'third.png']
+
+    def test_duplicate_content_in_one_batch(self, client, auth_headers, group_id, upload_dirs):
+        """測試同一批中內容相同的檔案共用一個 blob，也會沿用既有的 blob"""
+        content = os.urandom(512)
+        existing = _upload_material(client, auth_headers, content, 'poster.jpg')
+
+        response = self._upload(client, auth_headers, group_id, [(io.BytesIO(content), 'a.jpg'),
+                                                                 (io.BytesIO(content), 'b.jpg')])
+
+        assert response.status_code == 201
+        assert {image['filename'] for image in response.get_json()['data']} == {existing['filename']}
+        assert db.session.get(MediaBlob, hashlib.sha256(content).hexdigest()).ref_count == 3
+        assert len(os.listdir(upload_dirs / 'uploads')) == 1
+
+    def test_invalid_files_are_skipped(self, client, auth_headers, group_id, test_app, upload_dirs):
+        """測試副檔名、類型與大小不符的檔案被略過並回報原因"""
+        test_app.config['MAX_GROUP_IMAGE_SIZE'] = 1000
+        try:
+            response = self._upload(client, auth_headers, group_id, [
+                (io.BytesIO(os.urandom(100)), 'ok.jpg'),
+                (io.BytesIO(os.urandom(100)), 'clip.mp4'),
+                (io.BytesIO(os.urandom(100)), 'fake.png', 'text/html'),
+                (io.BytesIO(os.urandom(2000)), 'huge.jpg'),
+            ])
+        finally:
+            test_app.config['MAX_GROUP_IMAGE_SIZE'] = 50 * 1024 * 1024
+
+        body = response.get_json()
+        assert response.status_code == 201
+        assert [image['original_filename'] for image in body['data']] == ['ok.jpg']
+        assert [item['filename'] for item in body['skipped']] == ['clip.mp4', 'fake.png', 'huge.jpg']
+        # 超過大小的暫存檔已刪除
+        assert len(os.listdir(upload_dirs / 'uploads')) == 1
+
+    def test_all_files_rejected(self, client, auth_headers, group_id):
+        """測試沒有任何有效圖片時回應 400"""
+        response = self._upload(client, auth_headers, group_id, [(io.BytesIO(b'x'), 'notes.txt')])
+        assert response.status_code == 400
+        assert response.get_json()['skipped'][0]['filename'] == 'notes.txt'
+
+    def test_single_media_updated_broadcast(self, client, auth_headers, admin_socket_auth, group_id, test_app):
+        """測試一批上傳只送出一則 media_updated"""
+        socket_client = socketio.test_client(test_app, auth=admin_socket_auth)
+        socket_client.get_received()
+        self._upload(client, auth_headers, group_id,
+                     [(io.BytesIO(os.urandom(100)), f'{index}.jpg') for index in range(5)])
+
+        events = [event for event in socket_client.get_received() if event['name'] == 'media_updated']
+        assert len(events) == 1
+        assert '5 張' in events[0]['args'][0]['message']
+        socket_client.disconnect()